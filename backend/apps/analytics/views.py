@@ -4,8 +4,11 @@ from rest_framework.response import Response
 from django.db.models import Avg, Count, Q, F
 from django.db.models.functions import TruncMonth, ExtractYear
 from django.utils import timezone
-from apps.internships.models import Internship, Report, Evaluation
+from apps.internships.models import Internship, Evaluation
+from apps.reports.models import Report
 from apps.users.models import User
+from apps.dashboard.services import AnalyticsRollupService
+from core.aggregates import conditional_counts
 from .serializers import (
     InternshipAnalyticsSerializer,
     ReportAnalyticsSerializer,
@@ -14,19 +17,173 @@ from .serializers import (
 )
 
 class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Analytics endpoints.
+    Served from the AnalyticsRollup tables by default; pass ``?fresh=1`` to
+    run the aggregations against the live tables instead.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
+    def _wants_fresh(self, request):
+        return request.query_params.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+    def _dispatch(self, request, name):
+        handler = getattr(self, f'_live_{name}' if self._wants_fresh(request) else f'_rollup_{name}')
+        return handler(request)
+
     @action(detail=False)
     def overview(self, request):
+        """Get overview statistics"""
+        return self._dispatch(request, 'overview')
+
+    @action(detail=False)
+    def internships(self, request):
+        """Get internship analytics"""
+        return self._dispatch(request, 'internships')
+
+    @action(detail=False)
+    def reports(self, request):
+        """Get report analytics"""
+        return self._dispatch(request, 'reports')
+
+    @action(detail=False)
+    def evaluations(self, request):
+        """Get evaluation analytics"""
+        return self._dispatch(request, 'evaluations')
+
+    @action(detail=False)
+    def users(self, request):
+        """Get user analytics"""
+        return self._dispatch(request, 'users')
+
+    def _format_months(self, monthly_counts):
+        return [
+            {
+                'month': item['month'].strftime('%Y-%m'),
+                'count': item['count']
+            }
+            for item in monthly_counts
+        ]
+
+    def _rollup_overview(self, request):
+        users_by_type = AnalyticsRollupService.histogram('users.by_type')
+        internships_by_status = AnalyticsRollupService.histogram('internships.by_status')
+        reports_by_status = AnalyticsRollupService.histogram('reports.by_status')
+        avg_scores = AnalyticsRollupService.averages('evaluations.scores')
+
+        total_internships = sum(internships_by_status.values())
+        active_internships = internships_by_status.get('active', 0)
+        total_reports = sum(reports_by_status.values())
+        pending_reports = reports_by_status.get('pending', 0)
+
+        data = {
+            'users': {
+                'total_students': users_by_type.get('student', 0),
+                'total_mentors': users_by_type.get('mentor', 0)
+            },
+            'internships': {
+                'total': total_internships,
+                'active': active_internships,
+                'completion_rate': round(
+                    (total_internships - active_internships) / total_internships * 100
+                    if total_internships > 0 else 0,
+                    2
+                )
+            },
+            'reports': {
+                'total': total_reports,
+                'pending': pending_reports,
+                'completion_rate': round(
+                    (total_reports - pending_reports) / total_reports * 100
+                    if total_reports > 0 else 0,
+                    2
+                )
+            },
+            'scores': {
+                'performance': round(avg_scores.get('Performance', 0), 2),
+                'attendance': round(avg_scores.get('Attendance', 0), 2),
+                'initiative': round(avg_scores.get('Initiative', 0), 2)
+            }
+        }
+        return Response(data)
+
+    def _rollup_internships(self, request):
+        data = {
+            'by_status': AnalyticsRollupService.histogram('internships.by_status'),
+            'by_month': self._format_months(
+                AnalyticsRollupService.monthly('internships.by_status')
+            ),
+            'avg_duration': int(AnalyticsRollupService.totals('internships.by_status')['average'])
+        }
+        return Response(data)
+
+    def _rollup_reports(self, request):
+        data = {
+            'by_status': AnalyticsRollupService.histogram('reports.by_status'),
+            'by_type': AnalyticsRollupService.histogram('reports.by_type'),
+            'by_month': self._format_months(
+                AnalyticsRollupService.monthly('reports.by_status')
+            ),
+            'avg_review_time': int(AnalyticsRollupService.totals('reports.review_time')['average'])
+        }
+        return Response(data)
+
+    def _rollup_evaluations(self, request):
+        data = {
+            'by_type': AnalyticsRollupService.histogram('evaluations.by_type'),
+            'avg_scores': {
+                name: round(score, 2)
+                for name, score in AnalyticsRollupService.averages('evaluations.scores').items()
+                if name
+            },
+            'by_month': self._format_months(
+                AnalyticsRollupService.monthly('evaluations.by_type')
+            )
+        }
+        return Response(data)
+
+    def _rollup_users(self, request):
+        # last_login moves on every login, so active users stay a live count
+        active_users = User.objects.filter(
+            last_login__gte=timezone.now() - timezone.timedelta(days=30)
+        ).count()
+        by_type = AnalyticsRollupService.histogram('users.by_type')
+
+        data = {
+            'by_type': by_type,
+            'by_month': self._format_months(
+                AnalyticsRollupService.monthly('users.by_type')
+            ),
+            'active_users': active_users,
+            'total_users': sum(by_type.values())
+        }
+        return Response(data)
+
+    def _live_overview(self, request):
         """Get overview statistics"""
         try:
-            # Get counts
-            total_students = User.objects.filter(user_type='student').count()
-            total_mentors = User.objects.filter(user_type='mentor').count()
-            total_internships = Internship.objects.count()
-            active_internships = Internship.objects.filter(status='active').count()
-            total_reports = Report.objects.count()
-            pending_reports = Report.objects.filter(status='pending').count()
+            # Get counts, one query per model
+            user_counts = conditional_counts(
+                User.objects.all(),
+                students=Q(user_type='student'),
+                mentors=Q(user_type='mentor')
+            )
+            internship_counts = conditional_counts(
+                Internship.objects.all(),
+                total=None,
+                active=Q(status='active')
+            )
+            report_counts = conditional_counts(
+                Report.objects.all(),
+                total=None,
+                pending=Q(status='pending')
+            )
+            total_students = user_counts['students']
+            total_mentors = user_counts['mentors']
+            total_internships = internship_counts['total']
+            active_internships = internship_counts['active']
+            total_reports = report_counts['total']
+            pending_reports = report_counts['pending']
 
             # Get average scores
             avg_scores = Evaluation.objects.aggregate(
@@ -78,8 +235,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
-    def internships(self, request):
+    def _live_internships(self, request):
         """Get internship analytics"""
         try:
             # Get internships by status
@@ -127,8 +283,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
-    def reports(self, request):
+    def _live_reports(self, request):
         """Get report analytics"""
         try:
             # Get reports by status
@@ -189,8 +344,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
-    def evaluations(self, request):
+    def _live_evaluations(self, request):
         """Get evaluation analytics"""
         try:
             # Get evaluations by type
@@ -242,8 +396,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False)
-    def users(self, request):
+    def _live_users(self, request):
         """Get user analytics"""
         try:
             # Get users by type
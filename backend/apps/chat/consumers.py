@@ -3,6 +3,7 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
+from core.metrics import websocket_connections
 from .models import ChatRoom, Message, ChatRoomParticipant
 from .serializers import MessageSerializer
 
@@ -38,6 +39,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         # Accept the connection
         await self.accept()
+        websocket_connections.labels('chat').inc()
+        self.counted = True
 
         # Update user's online status
         await self.update_user_status(True)
@@ -53,6 +56,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def disconnect(self, close_code):
+        if getattr(self, 'counted', False):
+            websocket_connections.labels('chat').dec()
+            self.counted = False
+
         if hasattr(self, 'room_group_name'):
             # Update user's online status
             await self.update_user_status(False)
@@ -147,6 +154,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'user': event['user']
         }))
 
+    async def notification_unread(self, event):
+        # Delivered through the user_{id} group joined in connect()
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': event['count']
+        }))
+
     @database_sync_to_async
     def verify_participant(self):
         return ChatRoomParticipant.objects.select_related('chat_room').get(
@@ -33,17 +33,15 @@ def message_post_save(sender, instance, created, **kwargs):
             }
         )
 
-        # Send notifications to other participants
+        # Notify the other participants with a single bulk INSERT on commit
         participants = instance.room.participants.exclude(id=instance.sender.id)
-        for participant in participants:
-            NotificationService.create_notification(
-                recipient=participant,
-                title=f'New message from {instance.sender.get_full_name()}',
-                message=instance.content[:100] + '...' if len(instance.content) > 100 else instance.content,
-                notification_type='message',
-                related_object_id=instance.room.id,
-                related_object_type='chatroom'
-            )
+        NotificationService.notify_many(
+            participants,
+            title=f'New message from {instance.sender.get_full_name()}',
+            message=instance.content[:100] + '...' if len(instance.content) > 100 else instance.content,
+            notification_type='message',
+            idempotency_key=f'chat.message:{instance.pk}'
+        )
 
 @receiver([post_save, post_delete], sender=ChatRoom)
 def chatroom_update(sender, instance, **kwargs):
@@ -1,3 +1,65 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from .models import ChatRoom, Message
+from apps.notifications.models import Notification
+from apps.notifications.services import notification_buffer
+from .views import ChatRoomViewSet
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ChatHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(username='talker', password='pass')
+        self.room = ChatRoom.objects.create(name='Room')
+        self.room.participants.add(self.user)
+        self.messages = [
+            Message.objects.create(room=self.room, sender=self.user, content=f'm{i}')
+            for i in range(5)
+        ]
+        self.view = ChatRoomViewSet.as_view({'get': 'messages'})
+
+    def get(self, **params):
+        request = self.factory.get('/chat/rooms/messages/', params)
+        force_authenticate(request, user=self.user)
+        response = self.view(request, pk=self.room.pk)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_latest_page_is_oldest_first(self):
+        data = self.get(page_size=2)
+        self.assertEqual([row['content'] for row in data['results']], ['m3', 'm4'])
+        self.assertTrue(data['has_before'])
+
+    def test_scrollback_with_before_cursor(self):
+        data = self.get(page_size=2)
+        data = self.get(page_size=2, before=data['before'])
+        self.assertEqual([row['content'] for row in data['results']], ['m1', 'm2'])
+        data = self.get(page_size=2, before=data['before'])
+        self.assertEqual([row['content'] for row in data['results']], ['m0'])
+        self.assertFalse(data['has_before'])
+
+    def test_poll_with_after_cursor(self):
+        data = self.get(page_size=5)
+        self.assertEqual(self.get(after=data['after'])['results'], [])
+        Message.objects.create(room=self.room, sender=self.user, content='m5')
+        data = self.get(after=data['after'])
+        self.assertEqual([row['content'] for row in data['results']], ['m5'])
+
+    def test_message_notifies_other_participants_in_one_insert(self):
+        others = [User.objects.create_user(username=f'member{i}', password='pass') for i in range(3)]
+        self.room.participants.add(*others)
+        notification_buffer.discard()
+        Notification.objects.all().delete()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Message.objects.create(room=self.room, sender=self.user, content='hello')
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            {user.id for user in others}
+        )
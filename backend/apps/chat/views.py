@@ -10,6 +10,7 @@ from .serializers import (
     MessageAttachmentSerializer
 )
 from .permissions import IsChatParticipant
+from core.pagination import MessageKeysetPagination
 from rest_framework.exceptions import PermissionDenied
 
 # Create your views here.
@@ -56,16 +57,15 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     @action(detail=True)
     def messages(self, request, pk=None):
         chat_room = self.get_object()
-        messages = Message.objects.filter(room=chat_room)
-        
-        # Optional pagination
-        page = self.paginate_queryset(messages)
-        if page is not None:
-            serializer = MessageSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        messages = Message.objects.filter(
+            room=chat_room
+        ).select_related('sender').prefetch_related('attachments')
 
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        # Keyset pagination: scroll back with ?before=, poll with ?after=
+        paginator = MessageKeysetPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
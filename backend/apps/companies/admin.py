@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Organization
+from .models import Organization, WebhookDelivery
+from .retries import WebhookRetryScheduler
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
@@ -7,3 +8,23 @@ class OrganizationAdmin(admin.ModelAdmin):
     search_fields = ('name', 'contact_person__username', 'contact_person__email')
     list_filter = ('created_at',)
     date_hierarchy = 'created_at'
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('webhook', 'event_type', 'status', 'retry_count', 'next_retry_at', 'created_at')
+    list_filter = ('status', 'event_type')
+    list_select_related = ('webhook',)
+    # The payload lives on the shared WebhookEvent; the column is legacy
+    exclude = ('payload',)
+    readonly_fields = ('event', 'sent_payload')
+    actions = ['replay_dead_letters']
+
+    @admin.display(description='Payload')
+    def sent_payload(self, obj):
+        return obj.get_payload()
+
+    @admin.action(description='Replay selected dead-letter deliveries')
+    def replay_dead_letters(self, request, queryset):
+        replayed = WebhookRetryScheduler.replay(queryset)
+        self.message_user(request, f'{replayed} deliveries queued for retry.')
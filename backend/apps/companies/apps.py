@@ -5,3 +5,6 @@ class CompaniesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.companies'
     #label = 'companies'
+
+    def ready(self):
+        import apps.companies.signals
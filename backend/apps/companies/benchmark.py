@@ -0,0 +1,113 @@
+"""
+Load-test helpers for webhook delivery.
+
+``StandInReceiver`` is a local aiohttp server standing in for customer
+endpoints, with configurable latency and error rate. It runs on its own event
+loop in a background thread and records, for every request it receives, the
+end-to-end latency from the ``sent_at`` timestamp that the benchmark puts in
+the event data. See the ``benchmark_webhooks`` management command.
+"""
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from aiohttp import web
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """``{'p50': ..., ...}`` of ``values`` (None when there are no values)"""
+    if not values:
+        return {f'p{point}': None for point in points}
+    if len(values) == 1:
+        return {f'p{point}': values[0] for point in points}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {f'p{point}': cuts[point - 1] for point in points}
+
+
+class StandInReceiver:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.received = []
+        self._lock = threading.Lock()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def endpoint_url(self, name):
+        return f'{self.url}/hook/{name}'
+
+    async def handle(self, request):
+        body = await request.read()
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        failed = random.random() < self.error_rate
+        try:
+            sent_at = json.loads(body)['data']['sent_at']
+        except (ValueError, KeyError, TypeError):
+            sent_at = None
+        with self._lock:
+            self.received.append({
+                'endpoint': request.match_info['name'],
+                'ok': not failed,
+                # From emission until the response is sent
+                'latency': time.time() - sent_at if sent_at else None,
+            })
+        if failed:
+            return web.Response(status=503, text='unavailable')
+        return web.Response(text='ok')
+
+    def drain(self):
+        """Return and forget everything received so far"""
+        with self._lock:
+            received, self.received = self.received, []
+        return received
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/hook/{name}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='webhook-stand-in', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,263 @@
+"""
+Worker-side webhook delivery engine.
+
+Each worker process keeps one pooled ``httpx.AsyncClient`` per event loop
+(keep-alive, HTTP/2 when the ``h2`` package is installed) and delivers a whole
+batch of webhooks concurrently on it, bounded per destination host. Batches
+run on the engine's own loop in a background thread, so ``deliver`` works the
+same whether or not the calling thread already runs an event loop. Failed
+attempts are not retried in-process: they only record when they are next due,
+and ``retries.WebhookRetryScheduler`` publishes them again, so a slow endpoint
+never holds a worker slot while it backs off. Deliveries for endpoints whose
+circuit breaker is open are parked without an attempt (see ``health``).
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+
+from .health import endpoint_health
+from .models import WebhookDelivery
+from .retries import WebhookRetryScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_DELAY = 60
+DEFAULT_RETRY_MAX_DELAY = 6 * 60 * 60
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30
+
+RESULT_FIELDS = [
+    'status', 'response_status', 'response_content', 'error_message',
+    'retry_count', 'next_retry_at', 'updated_at',
+]
+
+
+class BatchDeliveryError(Exception):
+    """The attempts of a batch were made but could not be recorded"""
+
+    def __init__(self, retry_ids):
+        super().__init__(f"{len(retry_ids)} deliveries to retry")
+        self.retry_ids = retry_ids
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def http2_available():
+    return _setting('WEBHOOK_HTTP2', True) and importlib.util.find_spec('h2') is not None
+
+
+def sign_payload(payload: str, secret_key: str) -> str:
+    from .services import WebhookService
+    return WebhookService._generate_signature(payload, secret_key)
+
+
+class _LoopState:
+    """Client and per-host semaphores bound to one event loop"""
+
+    def __init__(self, transport=None):
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            http2=http2_available(),
+            limits=httpx.Limits(
+                max_connections=_setting('WEBHOOK_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS),
+                max_keepalive_connections=_setting('WEBHOOK_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS),
+                keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=_setting('WEBHOOK_TIMEOUT', DEFAULT_TIMEOUT),
+        )
+        self.host_limits = defaultdict(
+            lambda: asyncio.Semaphore(
+                _setting('WEBHOOK_MAX_CONNECTIONS_PER_HOST', DEFAULT_MAX_CONNECTIONS_PER_HOST)
+            )
+        )
+
+
+class WebhookDeliveryEngine:
+    """One per worker process; see the module docstring"""
+
+    def __init__(self, transport=None):
+        # ``transport`` replaces the network layer (httpx.MockTransport in tests)
+        self.transport = transport
+        self._pid = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._states = weakref.WeakKeyDictionary()
+
+    def _check_fork(self):
+        # A forked worker child must not reuse the parent's loop, thread or sockets
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._loop = None
+            self._lock = threading.Lock()
+            self._states = weakref.WeakKeyDictionary()
+
+    @property
+    def loop(self):
+        """The engine's event loop, running in a daemon thread of this process"""
+        self._check_fork()
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name='webhook-delivery', daemon=True
+                ).start()
+        return self._loop
+
+    def run(self, coroutine):
+        """Run ``coroutine`` on the engine's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def _state(self):
+        self._check_fork()
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self.transport)
+        return state
+
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client for the running event loop"""
+        return self._state().client
+
+    async def post(self, delivery: WebhookDelivery, payload: str, client=None) -> dict:
+        """Make one delivery attempt; never raises"""
+        state = self._state()
+        client = client or state.client
+        url = delivery.webhook.url
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Webhook-Signature': sign_payload(payload, delivery.webhook.secret_key),
+            'X-Event-Type': delivery.event_type,
+        }
+        started = time.monotonic()
+        result = {'delivery': delivery, 'status_code': None, 'text': '', 'error': None}
+        try:
+            async with state.host_limits[urlsplit(url).netloc]:
+                # Send the exact signed bytes rather than re-serialising them
+                response = await client.post(url, content=payload.encode(), headers=headers)
+            result['status_code'] = response.status_code
+            result['text'] = response.text
+            if not response.is_success:
+                result['error'] = f"HTTP {response.status_code}: {response.text[:200]}"
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            result['error'] = str(e) or e.__class__.__name__
+        result['elapsed'] = time.monotonic() - started
+        return result
+
+    async def post_many(self, deliveries) -> list:
+        return await asyncio.gather(*[
+            self.post(delivery, delivery.get_payload()) for delivery in deliveries
+        ])
+
+    def deliver(self, delivery_ids) -> dict:
+        """Deliver a batch concurrently and record the results"""
+        deliveries = list(
+            WebhookDelivery.objects.filter(
+                id__in=delivery_ids,
+                webhook__is_active=True
+            ).exclude(status='success').select_related('webhook').prefetch_related('event')
+        )
+        if not deliveries:
+            return {'delivered': 0, 'retrying': 0, 'failed': 0, 'parked': 0}
+
+        # Breakers may have opened since the batch was published
+        states = endpoint_health.classify(delivery.webhook_id for delivery in deliveries)
+        ready, parked = [], defaultdict(list)
+        for delivery in deliveries:
+            state, open_until = states[delivery.webhook_id]
+            if endpoint_health.allow(delivery.webhook_id, state):
+                ready.append(delivery)
+            else:
+                # Open: wait out the cooldown; half-open: wait for the probe
+                parked[open_until or time.time() + 2 * _setting('WEBHOOK_TIMEOUT', DEFAULT_TIMEOUT)].append(delivery.id)
+        for until, parked_ids in parked.items():
+            WebhookRetryScheduler.park(parked_ids, until)
+
+        results = self.run(self.post_many(ready)) if ready else []
+        # Nothing below may raise with the attempts unrecorded: the batch would
+        # be retried and every endpoint called again
+        try:
+            endpoint_health.record_many(results)
+        except Exception:
+            logger.exception("Failed to record webhook endpoint health")
+        try:
+            stats = self.record_results(results)
+        except Exception as e:
+            failed_ids = [result['delivery'].id for result in results if result['error'] is not None]
+            logger.exception(
+                f"Failed to record {len(results)} webhook attempts; "
+                f"retrying the {len(failed_ids)} that failed"
+            )
+            raise BatchDeliveryError(failed_ids) from e
+        stats['parked'] = sum(len(parked_ids) for parked_ids in parked.values())
+        return stats
+
+    @staticmethod
+    def retry_delay(retry_count: int) -> float:
+        """
+        Exponential backoff with "equal jitter": half the capped delay is fixed,
+        the other half random, so endpoints that failed together do not all
+        come due in the same scheduler run
+        """
+        delay = min(
+            _setting('WEBHOOK_RETRY_DELAY', DEFAULT_RETRY_DELAY) * (2 ** retry_count),
+            _setting('WEBHOOK_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_results(self, results) -> dict:
+        """Persist attempt outcomes in one bulk UPDATE, with the next due time for failures"""
+        now = timezone.now()
+        max_retries = _setting('WEBHOOK_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+        stats = {'delivered': 0, 'retrying': 0, 'failed': 0}
+        deliveries = []
+
+        for result in results:
+            delivery = result['delivery']
+            delivery.response_status = result['status_code']
+            delivery.response_content = (result['text'] or '')[:1000]
+            delivery.updated_at = now
+            if result['error'] is None:
+                delivery.status = 'success'
+                delivery.error_message = ''
+                delivery.next_retry_at = None
+                stats['delivered'] += 1
+            elif delivery.retry_count < max_retries:
+                delivery.status = 'retrying'
+                delivery.error_message = result['error']
+                delivery.next_retry_at = now + timezone.timedelta(
+                    seconds=self.retry_delay(delivery.retry_count)
+                )
+                delivery.retry_count += 1
+                stats['retrying'] += 1
+            else:
+                # Dead letter: kept out of the retry scan until replayed
+                delivery.status = 'dead'
+                delivery.error_message = result['error']
+                delivery.next_retry_at = None
+                stats['failed'] += 1
+                logger.error(f"Max retries exceeded for webhook: {delivery}")
+            deliveries.append(delivery)
+
+        if deliveries:
+            WebhookDelivery.objects.bulk_update(deliveries, RESULT_FIELDS)
+        return stats
+
+
+delivery_engine = WebhookDeliveryEngine()
@@ -0,0 +1,250 @@
+"""
+Per-endpoint webhook health and circuit breaking.
+
+Every delivery attempt is counted in the cache (Redis in production) in short
+time buckets per endpoint: attempts, failures and total latency. Summed over
+the rolling window these give each endpoint a failure rate and mean latency,
+shared by every worker.
+
+An endpoint whose failure rate crosses ``WEBHOOK_BREAKER_FAILURE_RATE`` has its
+breaker opened for a cooldown that doubles on every consecutive trip. While it
+is open its deliveries are parked (left due at the end of the cooldown, without
+spending an attempt) instead of being published. Once the cooldown ends the
+breaker is half-open: a single probe delivery goes out, and its outcome closes
+the breaker or opens it again.
+
+Endpoints that are slow or failing but not tripped are "degraded" and are
+published to a separate queue, so they cannot hold up healthy endpoints.
+"""
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+DEFAULT_BUCKET_SECONDS = 10
+DEFAULT_WINDOW_BUCKETS = 6
+DEFAULT_MIN_ATTEMPTS = 10
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_DEGRADED_FAILURE_RATE = 0.2
+DEFAULT_DEGRADED_LATENCY = 2.0
+DEFAULT_COOLDOWN = 30
+DEFAULT_MAX_COOLDOWN = 30 * 60
+
+METRICS = ('attempts', 'failures', 'latency_ms')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class EndpointHealth:
+    @staticmethod
+    def _bucket(now=None):
+        return int((now or time.time()) // _setting('WEBHOOK_HEALTH_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS))
+
+    @staticmethod
+    def _metric_key(endpoint_id, bucket, metric):
+        return f'webhooks:health:{endpoint_id}:{bucket}:{metric}'
+
+    @staticmethod
+    def _open_key(endpoint_id):
+        return f'webhooks:breaker:{endpoint_id}:open'
+
+    @staticmethod
+    def _trips_key(endpoint_id):
+        return f'webhooks:breaker:{endpoint_id}:trips'
+
+    @staticmethod
+    def _probe_key(endpoint_id):
+        return f'webhooks:breaker:{endpoint_id}:probe'
+
+    def _window_keys(self, endpoint_id, now=None):
+        current = self._bucket(now)
+        buckets = range(current - _setting('WEBHOOK_HEALTH_WINDOW_BUCKETS', DEFAULT_WINDOW_BUCKETS) + 1, current + 1)
+        return {
+            (bucket, metric): self._metric_key(endpoint_id, bucket, metric)
+            for bucket in buckets for metric in METRICS
+        }
+
+    def stats(self, endpoint_ids, now=None) -> dict:
+        """Rolling-window attempts, failure rate and mean latency per endpoint, in one cache read"""
+        keys = {
+            endpoint_id: self._window_keys(endpoint_id, now)
+            for endpoint_id in set(endpoint_ids)
+        }
+        values = cache.get_many([key for window in keys.values() for key in window.values()])
+        stats = {}
+        for endpoint_id, window in keys.items():
+            totals = defaultdict(int)
+            for (_bucket, metric), key in window.items():
+                totals[metric] += values.get(key, 0)
+            attempts = totals['attempts']
+            stats[endpoint_id] = {
+                'attempts': attempts,
+                'failures': totals['failures'],
+                'failure_rate': totals['failures'] / attempts if attempts else 0.0,
+                'latency': totals['latency_ms'] / attempts / 1000 if attempts else 0.0,
+            }
+        return stats
+
+    def classify(self, endpoint_ids, now=None) -> dict:
+        """Map endpoint ids to ``(state, open_until)``; open_until is None unless open"""
+        return self._classify(set(endpoint_ids), now)[0]
+
+    def _classify(self, endpoint_ids, now=None):
+        breaker_keys = [
+            key for endpoint_id in endpoint_ids
+            for key in (self._open_key(endpoint_id), self._trips_key(endpoint_id))
+        ]
+        breakers = cache.get_many(breaker_keys)
+        stats = self.stats(endpoint_ids, now)
+        min_attempts = _setting('WEBHOOK_BREAKER_MIN_ATTEMPTS', DEFAULT_MIN_ATTEMPTS)
+
+        states = {}
+        for endpoint_id in endpoint_ids:
+            open_until = breakers.get(self._open_key(endpoint_id))
+            if open_until is not None:
+                states[endpoint_id] = (OPEN, open_until)
+            elif self._trips_key(endpoint_id) in breakers:
+                states[endpoint_id] = (HALF_OPEN, None)
+            else:
+                endpoint_stats = stats[endpoint_id]
+                degraded = endpoint_stats['attempts'] >= min_attempts and (
+                    endpoint_stats['failure_rate'] >= _setting('WEBHOOK_DEGRADED_FAILURE_RATE', DEFAULT_DEGRADED_FAILURE_RATE)
+                    or endpoint_stats['latency'] >= _setting('WEBHOOK_DEGRADED_LATENCY', DEFAULT_DEGRADED_LATENCY)
+                )
+                states[endpoint_id] = (DEGRADED if degraded else HEALTHY, None)
+        return states, stats
+
+    def allow(self, endpoint_id, state) -> bool:
+        """Whether a delivery to an endpoint in ``state`` may be attempted now"""
+        if state == OPEN:
+            return False
+        if state == HALF_OPEN:
+            # One probe per half-open period across all workers
+            return cache.add(
+                self._probe_key(endpoint_id), 1,
+                timeout=_setting('WEBHOOK_TIMEOUT', 5) * 2
+            )
+        return True
+
+    def record_many(self, results, now=None):
+        """Count attempt outcomes and trip or reset breakers accordingly"""
+        now = now or time.time()
+        bucket = self._bucket(now)
+        ttl = _setting('WEBHOOK_HEALTH_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS) * (
+            _setting('WEBHOOK_HEALTH_WINDOW_BUCKETS', DEFAULT_WINDOW_BUCKETS) + 1
+        )
+
+        totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        for result in results:
+            endpoint_totals = totals[result['delivery'].webhook_id]
+            endpoint_totals['attempts'] += 1
+            endpoint_totals['failures'] += result['error'] is not None
+            endpoint_totals['latency_ms'] += int(result.get('elapsed', 0) * 1000)
+
+        for endpoint_id, endpoint_totals in totals.items():
+            for metric, value in endpoint_totals.items():
+                if value:
+                    key = self._metric_key(endpoint_id, bucket, metric)
+                    cache.add(key, 0, timeout=ttl)
+                    try:
+                        cache.incr(key, value)
+                    except ValueError:
+                        # Expired between add() and incr()
+                        cache.set(key, value, timeout=ttl)
+
+        states, stats = self._classify(set(totals), now)
+        for endpoint_id, endpoint_totals in totals.items():
+            state, _open_until = states[endpoint_id]
+            if state == HALF_OPEN:
+                if endpoint_totals['failures']:
+                    self.trip(endpoint_id, now)
+                else:
+                    self.reset(endpoint_id, now)
+            elif state != OPEN and endpoint_totals['failures']:
+                endpoint_stats = stats[endpoint_id]
+                if (
+                    endpoint_stats['attempts'] >= _setting('WEBHOOK_BREAKER_MIN_ATTEMPTS', DEFAULT_MIN_ATTEMPTS)
+                    and endpoint_stats['failure_rate'] >= _setting('WEBHOOK_BREAKER_FAILURE_RATE', DEFAULT_FAILURE_RATE)
+                ):
+                    self.trip(endpoint_id, now)
+
+    def trip(self, endpoint_id, now=None) -> float:
+        """Open the breaker; returns the time (epoch seconds) it stays open until"""
+        now = now or time.time()
+        max_cooldown = _setting('WEBHOOK_BREAKER_MAX_COOLDOWN', DEFAULT_MAX_COOLDOWN)
+        trips_key = self._trips_key(endpoint_id)
+        # Atomic on Redis, so workers tripping at once each count a trip
+        cache.add(trips_key, 0, timeout=2 * max_cooldown)
+        try:
+            trips = cache.incr(trips_key)
+        except ValueError:
+            # Expired between add() and incr()
+            trips = 1
+            cache.set(trips_key, trips, timeout=2 * max_cooldown)
+        cooldown = min(_setting('WEBHOOK_BREAKER_COOLDOWN', DEFAULT_COOLDOWN) * 2 ** (trips - 1), max_cooldown)
+        open_until = now + cooldown
+        cache.set(self._open_key(endpoint_id), open_until, timeout=cooldown)
+        # Outlives the open period so the endpoint is half-open afterwards
+        cache.touch(trips_key, timeout=cooldown + max_cooldown)
+        cache.delete(self._probe_key(endpoint_id))
+        return open_until
+
+    def reset(self, endpoint_id, now=None):
+        """Close the breaker and forget the failures that tripped it"""
+        cache.delete_many([
+            self._open_key(endpoint_id),
+            self._trips_key(endpoint_id),
+            self._probe_key(endpoint_id),
+            *self._window_keys(endpoint_id, now).values(),
+        ])
+
+
+def pack_by_endpoint(deliveries, batch_size):
+    """
+    Split ``(delivery_id, endpoint_id)`` pairs into batches of delivery ids
+    that keep each endpoint's deliveries together, ordered so endpoints take
+    turns. A batch waits for its slowest request, so a slow endpoint only
+    holds up the batches it is in rather than one delivery in every batch.
+    Endpoints with more than ``batch_size`` deliveries fill batches of their
+    own, which are interleaved round-robin with everyone else's: a backlogged
+    endpoint gets one batch per turn instead of the front of the queue.
+    """
+    per_endpoint = defaultdict(list)
+    for delivery_id, endpoint_id in deliveries:
+        per_endpoint[endpoint_id].append(delivery_id)
+
+    # One list of batches per turn-taker: an endpoint's full batches, or one
+    # batch of several endpoints' remainders
+    turns = []
+    current = []
+    for delivery_ids in per_endpoint.values():
+        full = [
+            delivery_ids[start:start + batch_size]
+            for start in range(0, len(delivery_ids) - batch_size + 1, batch_size)
+        ]
+        if full:
+            turns.append(full)
+        delivery_ids = delivery_ids[len(full) * batch_size:]
+        if not delivery_ids:
+            continue
+        if len(current) + len(delivery_ids) > batch_size:
+            turns.append([current])
+            current = []
+        current.extend(delivery_ids)
+    if current:
+        turns.append([current])
+
+    batches = []
+    for turn in range(max((len(own) for own in turns), default=0)):
+        batches.extend(own[turn] for own in turns if turn < len(own))
+    return batches
+
+
+endpoint_health = EndpointHealth()
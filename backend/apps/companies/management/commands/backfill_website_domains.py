@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from apps.companies.models import Organization, normalize_domain
+from apps.companies.services import DomainStatistics
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills Organization.website_domain from website for existing rows, '
+        'walking the table in primary key order, and drops the cached domain '
+        'histogram.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every row, not only rows without a domain')
+
+    def handle(self, *args, **options):
+        queryset = Organization.objects.order_by('pk').only('pk', 'website', 'website_domain')
+        if not options['all']:
+            queryset = queryset.filter(website_domain='').exclude(website='')
+
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for organization in batch:
+                domain = normalize_domain(organization.website)
+                if domain != organization.website_domain:
+                    organization.website_domain = domain
+                    changed.append(organization)
+            # bulk_update skips save() and signals: one UPDATE per batch
+            Organization.objects.bulk_update(changed, ['website_domain'])
+            updated += len(changed)
+
+        cache.delete(DomainStatistics.cache_key())
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} organizations'))
@@ -0,0 +1,72 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.companies.models import Organization
+from apps.companies.services import BatchProcessor
+
+# Time budget asserted by test_bulk_activate_performance
+BUDGET_SECONDS = 5.0
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks BatchProcessor.bulk_activate on freshly created inactive '
+        'organizations. Everything runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000',
+                            help='Comma separated organization counts')
+        parser.add_argument('--json', action='store_true',
+                            help='Print one JSON object per size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+        for size in sizes:
+            result = self.run_size(size)
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                status = self.style.SUCCESS('ok') if result['within_budget'] else self.style.ERROR('slow')
+                self.stdout.write(
+                    f"{size:>8} orgs: {result['seconds']:.3f}s "
+                    f"({result['orgs_per_second']:.0f}/s, {result['batches']} batches, "
+                    f"{result['queries']} queries) {status}"
+                )
+
+    def run_size(self, size):
+        result = {}
+        try:
+            with transaction.atomic():
+                created = Organization.objects.bulk_create(
+                    [Organization(name=f'Benchmark {i}', is_active=False) for i in range(size)],
+                    batch_size=1000
+                )
+                ids = [org.id for org in created]
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    stats = BatchProcessor.bulk_activate(ids)
+                    elapsed = time.perf_counter() - started
+
+                result = {
+                    'size': size,
+                    'seconds': round(elapsed, 4),
+                    'orgs_per_second': size / elapsed if elapsed else None,
+                    'activated': stats['activated_count'],
+                    'batches': stats['batches_count'],
+                    'queries': len(queries),
+                    'budget_seconds': BUDGET_SECONDS,
+                    'within_budget': elapsed < BUDGET_SECONDS,
+                }
+                # Discard the organizations, webhook events and deliveries
+                raise Rollback
+        except Rollback:
+            pass
+        return result
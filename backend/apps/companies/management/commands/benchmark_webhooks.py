@@ -0,0 +1,181 @@
+import json
+import time
+from contextlib import contextmanager
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from apps.companies.benchmark import StandInReceiver, percentiles
+from apps.companies.models import WebhookEndpoint, WebhookDelivery, WebhookEvent
+from apps.companies.services import WebhookService, AsyncWebhookService
+from apps.companies.tasks import send_webhook, send_webhook_batch
+
+EVENT_TYPE = 'benchmark.event'
+MODES = ('service', 'async', 'task')
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+@contextmanager
+def eager_tasks():
+    """Run Celery tasks inline so a stage measures delivery, not the broker"""
+    conf = send_webhook_batch.app.conf
+    previous = conf.task_always_eager
+    conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        conf.task_always_eager = previous
+
+
+class WriteCounter:
+    """connection.execute_wrapper counting data-modifying statements"""
+
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests webhook delivery against a local stand-in receiver. For '
+        'every endpoint count and event rate, emits events for --duration '
+        'seconds through WebhookService (service), AsyncWebhookService (async) '
+        'or one tasks.send_webhook per delivery (task), and reports '
+        'deliveries/sec, end-to-end latency percentiles, error rate and DB '
+        'writes per delivery. Celery tasks run inline. The endpoints, events '
+        'and deliveries it creates are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES, default='service')
+        parser.add_argument('--rates', default='10,50,200',
+                            help='Comma separated offered event rates (events/sec)')
+        parser.add_argument('--endpoints', default='1,10,50',
+                            help='Comma separated subscribed endpoint counts')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Seconds per stage')
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help='Receiver base latency in seconds')
+        parser.add_argument('--jitter', type=float, default=0.01,
+                            help='Receiver extra uniform random latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of requests the receiver answers with 503')
+        parser.add_argument('--per-host-limit', type=int, default=None,
+                            help='WEBHOOK_MAX_CONNECTIONS_PER_HOST for the run; every '
+                                 'stand-in endpoint shares one host')
+        parser.add_argument('--json', action='store_true',
+                            help='Print one JSON object per stage')
+
+    def handle(self, *args, **options):
+        rates = [float(rate) for rate in options['rates'].split(',') if rate]
+        endpoint_counts = [int(count) for count in options['endpoints'].split(',') if count]
+        overrides = {}
+        if options['per_host_limit']:
+            overrides['WEBHOOK_MAX_CONNECTIONS_PER_HOST'] = options['per_host_limit']
+
+        receiver = StandInReceiver(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+        )
+        with receiver, override_settings(**overrides), eager_tasks():
+            for endpoint_count in endpoint_counts:
+                for rate in rates:
+                    result = self.run_stage(
+                        receiver, options['mode'], endpoint_count, rate, options['duration']
+                    )
+                    self.report(result, options['json'])
+
+    def report(self, result, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(result))
+            return
+        latency = result['latency']
+        fmt = lambda value: f'{value * 1000:.1f}ms' if value is not None else '-'
+        self.stdout.write(
+            f"{result['mode']:>7} {result['endpoints']:>4} endpoints @ {result['offered_rate']:>6.0f} ev/s: "
+            f"{result['deliveries_per_second']:.1f} deliveries/s, "
+            f"p50 {fmt(latency['p50'])} p95 {fmt(latency['p95'])} p99 {fmt(latency['p99'])}, "
+            f"errors {result['error_rate']:.1%}, "
+            f"{result['db_writes_per_delivery']:.2f} writes/delivery"
+        )
+
+    def run_stage(self, receiver, mode, endpoint_count, rate, duration):
+        # Created one by one so the subscription registry is invalidated
+        endpoints = [
+            WebhookEndpoint.objects.create(
+                name=f'Benchmark {i}',
+                url=receiver.endpoint_url(i),
+                secret_key='benchmark',
+                events=[EVENT_TYPE],
+                is_active=True
+            )
+            for i in range(endpoint_count)
+        ]
+        receiver.drain()
+
+        counter = WriteCounter()
+        emitted = 0
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                while time.perf_counter() - started < duration:
+                    # Open-loop pacing: never sleep once behind schedule
+                    delay = started + emitted / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    self.emit(mode, endpoints, {'seq': emitted, 'sent_at': time.time()})
+                    emitted += 1
+            elapsed = time.perf_counter() - started
+        finally:
+            self.cleanup(endpoints)
+
+        received = receiver.drain()
+        latencies = sorted(item['latency'] for item in received if item['ok'] and item['latency'] is not None)
+        attempts = len(received)
+        return {
+            'mode': mode,
+            'endpoints': endpoint_count,
+            'offered_rate': rate,
+            'events': emitted,
+            'event_rate': emitted / elapsed,
+            'seconds': round(elapsed, 4),
+            'attempts': attempts,
+            'delivered': len(latencies),
+            'deliveries_per_second': len(latencies) / elapsed,
+            'error_rate': (attempts - len(latencies)) / attempts if attempts else 0.0,
+            'latency': percentiles(latencies),
+            'db_writes': counter.writes,
+            'db_writes_per_delivery': counter.writes / attempts if attempts else 0.0,
+        }
+
+    def emit(self, mode, endpoints, data):
+        if mode == 'service':
+            WebhookService.send_webhook(EVENT_TYPE, data)
+        elif mode == 'async':
+            async_to_sync(AsyncWebhookService.send_webhook)(EVENT_TYPE, data)
+        else:
+            # Legacy path: one task per delivery
+            payload = json.dumps(WebhookService._prepare_payload(EVENT_TYPE, data))
+            with transaction.atomic():
+                event = WebhookEvent.build(EVENT_TYPE, payload)
+                event.save()
+                deliveries = WebhookDelivery.objects.bulk_create([
+                    WebhookDelivery(webhook=endpoint, event=event, event_type=EVENT_TYPE)
+                    for endpoint in endpoints
+                ])
+            for delivery in deliveries:
+                send_webhook(delivery.id)
+
+    @staticmethod
+    def cleanup(endpoints):
+        endpoint_ids = [endpoint.id for endpoint in endpoints]
+        event_ids = set(
+            WebhookDelivery.objects.filter(webhook_id__in=endpoint_ids).values_list('event_id', flat=True)
+        )
+        WebhookEndpoint.objects.filter(id__in=endpoint_ids).delete()
+        WebhookEvent.objects.filter(id__in=event_ids).delete()
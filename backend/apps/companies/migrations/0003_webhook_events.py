@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhookdelivery',
+            name='payload',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=100)),
+                ('payload_compressed', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event_type', 'created_at'], name='companies_w_event_t_28b7c9_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='webhookdelivery',
+            name='event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='companies.webhookevent'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_webhook_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhookdelivery',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed'), ('retrying', 'Retrying'), ('dead', 'Dead letter')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='webhookdelivery',
+            index=models.Index(fields=['status', 'next_retry_at', 'id'], name='companies_w_status_0c2c7a_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_webhook_dead_letters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='website_domain',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['website_domain'], name='org_website_domain_idx'),
+        ),
+    ]
@@ -1,9 +1,29 @@
+import zlib
+from urllib.parse import urlsplit
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import URLValidator
+from django.utils.functional import cached_property
 
 User = get_user_model()
 
+
+def normalize_domain(website: str) -> str:
+    """Lowercased host of ``website`` without port or leading ``www.``"""
+    if not website:
+        return ''
+    if '//' not in website:
+        website = f'//{website}'
+    try:
+        host = urlsplit(website.strip()).hostname or ''
+    except ValueError:
+        return ''
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host[:255]
+
+
 class Organization(models.Model):
     name = models.CharField(max_length=255, db_index=True)
     address = models.TextField(blank=True)
@@ -15,6 +35,8 @@ class Organization(models.Model):
         db_index=True
     )
     website = models.URLField(blank=True)
+    # Derived from ``website`` on save; grouped by for domain statistics
+    website_domain = models.CharField(max_length=255, blank=True, editable=False)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
 
@@ -26,11 +48,26 @@ class Organization(models.Model):
         indexes = [
             models.Index(fields=['name'], name='organization_name_idx'),
             models.Index(fields=['contact_person'], name='org_contact_person_idx'),
+            models.Index(fields=['website_domain'], name='org_website_domain_idx'),
         ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets signal handlers see which domain a save moved away from
+        instance._loaded_website_domain = instance.__dict__.get('website_domain')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.website_domain = normalize_domain(self.website)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'website' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'website_domain'}
+        super().save(*args, **kwargs)
+
 class WebhookEndpoint(models.Model):
     """Model to store webhook endpoints for organization events"""
     EVENTS = [
@@ -66,6 +103,29 @@ class WebhookEndpoint(models.Model):
     def __str__(self):
         return f"{self.name} - {self.url}"
 
+class WebhookEvent(models.Model):
+    """One emitted webhook event; its JSON payload is stored once, zlib-compressed"""
+    event_type = models.CharField(max_length=100)
+    payload_compressed = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event_type', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
+    @classmethod
+    def build(cls, event_type, payload):
+        """Unsaved event for the JSON text ``payload``"""
+        return cls(event_type=event_type, payload_compressed=zlib.compress(payload.encode()))
+
+    @cached_property
+    def payload(self):
+        return zlib.decompress(bytes(self.payload_compressed)).decode()
+
 class WebhookDelivery(models.Model):
     """Model to track webhook delivery attempts and status"""
     STATUS_CHOICES = [
@@ -73,6 +133,7 @@ class WebhookDelivery(models.Model):
         ('success', 'Success'),
         ('failed', 'Failed'),
         ('retrying', 'Retrying'),
+        ('dead', 'Dead letter'),
     ]
 
     webhook = models.ForeignKey(
@@ -80,8 +141,16 @@ class WebhookDelivery(models.Model):
         on_delete=models.CASCADE,
         related_name='deliveries'
     )
+    event = models.ForeignKey(
+        WebhookEvent,
+        on_delete=models.CASCADE,
+        related_name='deliveries',
+        null=True,
+        blank=True
+    )
     event_type = models.CharField(max_length=100)
-    payload = models.TextField()
+    # Only set on deliveries created before payloads moved to WebhookEvent
+    payload = models.TextField(blank=True)
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
@@ -102,7 +171,15 @@ class WebhookDelivery(models.Model):
             models.Index(fields=['event_type']),
             models.Index(fields=['created_at']),
             models.Index(fields=['next_retry_at']),
+            # Keyset scan of due retries
+            models.Index(fields=['status', 'next_retry_at', 'id']),
         ]
 
     def __str__(self):
-        return f"{self.webhook.name} - {self.event_type} - {self.status}"
\ No newline at end of file
+        return f"{self.webhook.name} - {self.event_type} - {self.status}"
+
+    def get_payload(self):
+        """JSON text to send, from the shared event or the legacy column"""
+        if self.event_id is not None:
+            return self.event.payload
+        return self.payload
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+In-process index of webhook subscriptions.
+
+Dispatching an event looks its subscribers up in a dict keyed by event type
+and organization instead of querying WebhookEndpoint and filtering the
+``events`` JSON in Python. Each process builds the index with one query and
+keeps it until the shared version number in the cache (Redis in production)
+changes; saving or deleting an endpoint bumps that version.
+"""
+import threading
+import time
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import transaction
+from .models import WebhookEndpoint
+
+VERSION_KEY = 'webhooks:registry:version'
+
+
+class SubscriptionRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._global = {}
+        self._by_org = {}
+
+    @staticmethod
+    def _seed():
+        # A version lost to eviction restarts above any number handed out
+        # before, so a process cannot mistake it for the one it built at
+        return int(time.time() * 1000)
+
+    @classmethod
+    def current_version(cls):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            seed = cls._seed()
+            cache.add(VERSION_KEY, seed, timeout=None)
+            version = cache.get(VERSION_KEY, seed)
+        return version
+
+    def _build(self):
+        global_index = defaultdict(list)
+        org_index = defaultdict(lambda: defaultdict(list))
+        for endpoint in WebhookEndpoint.objects.filter(is_active=True).order_by('id'):
+            for event_type in endpoint.events or []:
+                if endpoint.organization_id is None:
+                    global_index[event_type].append(endpoint)
+                else:
+                    org_index[event_type][endpoint.organization_id].append(endpoint)
+        return dict(global_index), {event: dict(orgs) for event, orgs in org_index.items()}
+
+    def _ensure_current(self):
+        version = self.current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._global, self._by_org = self._build()
+                self._version = version
+
+    def endpoints_for(self, event_type, organization_id=None):
+        """
+        Active endpoints subscribed to ``event_type``. With an organization,
+        global endpoints plus that organization's; without one, all of them.
+        """
+        self._ensure_current()
+        endpoints = list(self._global.get(event_type, []))
+        by_org = self._by_org.get(event_type, {})
+        if organization_id:
+            endpoints.extend(by_org.get(organization_id, []))
+        else:
+            for org_endpoints in by_org.values():
+                endpoints.extend(org_endpoints)
+        return endpoints
+
+    def invalidate(self):
+        """Force every process to rebuild once the current transaction commits"""
+        self._version = None
+        transaction.on_commit(self._bump_version)
+
+    @classmethod
+    def _bump_version(cls):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, cls._seed(), timeout=None)
+
+
+subscription_registry = SubscriptionRegistry()
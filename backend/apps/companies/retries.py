@@ -0,0 +1,135 @@
+"""
+Retry scheduling for webhook deliveries.
+
+A failed attempt only records when it is next due (``next_retry_at``, with
+jittered exponential backoff, see ``WebhookDeliveryEngine.record_results``).
+The periodic ``retry_failed_webhooks`` task then walks due deliveries in
+keyset chunks, leases each chunk by pushing ``next_retry_at`` forward and
+publishes it as batch tasks, stopping at a per-run cap so that a long
+downstream outage drains gradually instead of flooding the ``webhooks`` queue.
+
+Deliveries that run out of attempts are parked in the ``dead`` state until
+they are replayed in bulk.
+"""
+import datetime
+import logging
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_SCAN_SIZE = 500
+DEFAULT_RETRY_MAX_PER_RUN = 2000
+DEFAULT_RETRY_LEASE = 300
+
+# 'failed' rows predate the retry scheduler; they keep their old attempt cap
+LEGACY_RETRYABLE_STATUS = 'failed'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class WebhookRetryScheduler:
+    @staticmethod
+    def due(now=None):
+        """Deliveries waiting for a retry whose time has come"""
+        from .delivery import DEFAULT_MAX_RETRIES
+
+        max_retries = _setting('WEBHOOK_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+        return WebhookDelivery.objects.filter(
+            Q(status='retrying') | Q(status=LEGACY_RETRYABLE_STATUS, retry_count__lt=max_retries),
+            next_retry_at__lte=now or timezone.now(),
+            webhook__is_active=True
+        )
+
+    @classmethod
+    def scan(cls, now=None, limit=None):
+        """
+        Yield lists of due ``(delivery_id, endpoint_id)`` pairs, oldest first,
+        by keyset on (next_retry_at, id)
+        """
+        now = now or timezone.now()
+        chunk_size = _setting('WEBHOOK_RETRY_SCAN_SIZE', DEFAULT_RETRY_SCAN_SIZE)
+        remaining = limit
+        cursor = None
+        while remaining is None or remaining > 0:
+            queryset = cls.due(now)
+            if cursor is not None:
+                due_at, pk = cursor
+                queryset = queryset.filter(
+                    Q(next_retry_at__gt=due_at) | Q(next_retry_at=due_at, pk__gt=pk)
+                )
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = list(
+                queryset.order_by('next_retry_at', 'pk').values_list(
+                    'pk', 'next_retry_at', 'webhook_id'
+                )[:size]
+            )
+            if not rows:
+                return
+            yield [(pk, endpoint_id) for pk, _due_at, endpoint_id in rows]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                return
+            cursor = rows[-1][1], rows[-1][0]
+
+    @classmethod
+    def run(cls, now=None) -> int:
+        """Publish due retries, at most WEBHOOK_RETRY_MAX_PER_RUN; returns how many"""
+        from .services import WebhookService
+
+        now = now or timezone.now()
+        cap = _setting('WEBHOOK_RETRY_MAX_PER_RUN', DEFAULT_RETRY_MAX_PER_RUN)
+        lease_until = now + timezone.timedelta(
+            seconds=_setting('WEBHOOK_RETRY_LEASE', DEFAULT_RETRY_LEASE)
+        )
+
+        scheduled = 0
+        for deliveries in cls.scan(now, limit=cap):
+            # Lease the chunk so the next run does not publish it again while it
+            # is queued; a worker that dies mid-batch only delays it by the lease
+            WebhookDelivery.objects.filter(pk__in=[pk for pk, _endpoint in deliveries]).update(
+                status='retrying',
+                next_retry_at=lease_until,
+                updated_at=now
+            )
+            WebhookService.enqueue(deliveries)
+            scheduled += len(deliveries)
+
+        if scheduled >= cap:
+            logger.warning(f"Webhook retry cap of {cap} reached; remaining retries wait for the next run")
+        return scheduled
+
+    @staticmethod
+    def park(delivery_ids, until):
+        """Hold deliveries until ``until`` (epoch seconds) without spending an attempt"""
+        until = datetime.datetime.fromtimestamp(until, tz=datetime.timezone.utc)
+        return WebhookDelivery.objects.filter(pk__in=delivery_ids).update(
+            status='retrying',
+            next_retry_at=until,
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def dead_letters():
+        return WebhookDelivery.objects.filter(status='dead')
+
+    @classmethod
+    def replay(cls, queryset=None, now=None) -> int:
+        """
+        Give dead-lettered deliveries a fresh set of attempts. They become due
+        immediately and are picked up by the next scheduler run.
+        """
+        now = now or timezone.now()
+        if queryset is None:
+            queryset = cls.dead_letters()
+        return queryset.filter(status='dead').update(
+            status='retrying',
+            retry_count=0,
+            next_retry_at=now,
+            updated_at=now
+        )
@@ -1 +1,212 @@
- 
\ No newline at end of file
+"""
+GraphQL API for organizations.
+
+Related objects (contact person, webhook endpoints, internships) are resolved
+through per-request batch loaders that the organization resolvers prime with
+every organization they return, so a page of organizations costs one query
+per relation no matter how many rows it holds. Page sizes are capped and the
+view applies depth and cost limits (see ``core.graphql_tools``).
+"""
+from collections import defaultdict
+import graphene
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+from graphene.types.generic import GenericScalar
+from graphene_django import DjangoObjectType
+from graphql import GraphQLError
+from apps.internships.models import Internship
+from core.aggregates import conditional_counts
+from core.graphql_tools import MAX_PAGE_SIZE, BatchLoader, get_context_user, get_loader
+from .models import Organization, WebhookEndpoint
+from .serializers import OrganizationSerializer
+from .services import BatchProcessor, DomainStatistics, WebhookService
+
+User = get_user_model()
+
+DEFAULT_PAGE_SIZE = 20
+PERMISSION_DENIED = 'You do not have permission to perform this action'
+
+
+def require_user(info):
+    user = get_context_user(info)
+    if user is None or not user.is_authenticated:
+        raise GraphQLError(PERMISSION_DENIED)
+    return user
+
+
+def _group_by(rows, key):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, key)].append(row)
+    return grouped
+
+
+class OrganizationLoaders:
+    """Batch loaders for the relations of the organizations in one request"""
+
+    def __init__(self):
+        self.users = BatchLoader(lambda ids: User.objects.in_bulk(ids))
+        self.webhooks = BatchLoader(
+            lambda ids: _group_by(
+                WebhookEndpoint.objects.filter(organization_id__in=ids).order_by('id'),
+                'organization_id'
+            ),
+            default=list
+        )
+        self.internships = BatchLoader(
+            lambda ids: _group_by(
+                Internship.objects.filter(agreement__organization_id__in=ids).annotate(
+                    organization_key=F('agreement__organization_id')
+                ).order_by('-created_at'),
+                'organization_key'
+            ),
+            default=list
+        )
+
+    def prime(self, organizations):
+        self.users.prime(org.contact_person_id for org in organizations)
+        self.webhooks.prime(org.id for org in organizations)
+        self.internships.prime(org.id for org in organizations)
+        return organizations
+
+
+def organization_loaders(info) -> OrganizationLoaders:
+    return get_loader(info, 'organizations', OrganizationLoaders)
+
+
+class UserType(DjangoObjectType):
+    full_name = graphene.String()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'email')
+
+    def resolve_full_name(self, info):
+        return self.get_full_name()
+
+
+class WebhookEndpointType(DjangoObjectType):
+    class Meta:
+        model = WebhookEndpoint
+        fields = ('id', 'name', 'url', 'events', 'is_active', 'created_at')
+
+
+class InternshipType(DjangoObjectType):
+    class Meta:
+        model = Internship
+        fields = ('id', 'title', 'status', 'start_date', 'end_date', 'city', 'country')
+
+
+class OrganizationType(DjangoObjectType):
+    contact_person = graphene.Field(UserType)
+    webhooks = graphene.List(graphene.NonNull(WebhookEndpointType), required=True)
+    internships = graphene.List(graphene.NonNull(InternshipType), required=True)
+
+    class Meta:
+        model = Organization
+        fields = (
+            'id', 'name', 'address', 'website', 'website_domain', 'description',
+            'is_active', 'created_at', 'updated_at',
+        )
+
+    def resolve_contact_person(self, info):
+        return organization_loaders(info).users.load(self.contact_person_id)
+
+    def resolve_webhooks(self, info):
+        # Endpoint URLs are only shown to staff
+        if not getattr(get_context_user(info), 'is_staff', False):
+            return []
+        return organization_loaders(info).webhooks.load(self.id)
+
+    def resolve_internships(self, info):
+        return organization_loaders(info).internships.load(self.id)
+
+
+class Query(graphene.ObjectType):
+    organizations = graphene.List(
+        graphene.NonNull(OrganizationType),
+        required=True,
+        first=graphene.Int(),
+        offset=graphene.Int(),
+        name=graphene.String(),
+        is_active=graphene.Boolean(),
+    )
+    organization = graphene.Field(OrganizationType, id=graphene.ID(required=True))
+    organization_statistics = GenericScalar()
+
+    def resolve_organizations(root, info, first=None, offset=None, name=None, is_active=None):
+        require_user(info)
+        queryset = Organization.objects.all()
+        if name:
+            queryset = queryset.filter(name__icontains=name)
+        if is_active is not None:
+            queryset = queryset.filter(is_active=is_active)
+        first = min(max(first or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        offset = max(offset or 0, 0)
+        return organization_loaders(info).prime(list(queryset[offset:offset + first]))
+
+    def resolve_organization(root, info, id):
+        require_user(info)
+        organization = Organization.objects.filter(pk=id).first()
+        if organization is not None:
+            organization_loaders(info).prime([organization])
+        return organization
+
+    def resolve_organization_statistics(root, info):
+        require_user(info)
+        counts = conditional_counts(
+            Organization.objects.all(),
+            total=None,
+            active=Q(is_active=True),
+            inactive=Q(is_active=False)
+        )
+        counts['by_domain'] = DomainStatistics.histogram()
+        return counts
+
+
+class ActivateOrganization(graphene.Mutation):
+    class Arguments:
+        id = graphene.ID(required=True)
+
+    organization = graphene.Field(OrganizationType)
+    success = graphene.Boolean()
+
+    def mutate(root, info, id):
+        require_user(info)
+        organization = Organization.objects.filter(pk=id).first()
+        if organization is None:
+            raise GraphQLError('Organization not found')
+        if not organization.is_active:
+            organization.is_active = True
+            organization.save(update_fields=['is_active', 'updated_at'])
+            WebhookService.send_webhook(
+                'organization.activated',
+                OrganizationSerializer(organization).data,
+                organization.id
+            )
+        return ActivateOrganization(organization=organization, success=True)
+
+
+class BulkActivateOrganizations(graphene.Mutation):
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+
+    total_processed = graphene.Int()
+    activated_count = graphene.Int()
+    failed_ids = graphene.List(graphene.NonNull(graphene.ID))
+    batches_count = graphene.Int()
+    processing_time = graphene.Float()
+
+    def mutate(root, info, ids):
+        require_user(info)
+        try:
+            organization_ids = [int(pk) for pk in ids]
+        except ValueError:
+            raise GraphQLError('Organization ids must be integers')
+        # BatchProcessor emits the organization.activated webhooks itself
+        return BulkActivateOrganizations(**BatchProcessor.bulk_activate(organization_ids))
+
+
+class Mutation(graphene.ObjectType):
+    activate_organization = ActivateOrganization.Field()
+    bulk_activate_organizations = BulkActivateOrganizations.Field()
@@ -1,25 +1,166 @@
 import json
 import hmac
 import hashlib
+import uuid
 import requests
 import httpx
-import asyncio
 from django.conf import settings
 from django.core.cache import cache
-from django.db import transaction
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
 from django.utils import timezone
-from django.db.models import Q
 from typing import List, Dict, Any, Optional
-from .models import WebhookEndpoint, Organization, WebhookDelivery
+from .models import Organization, WebhookDelivery, WebhookEvent
+from .registry import subscription_registry
+from core.cache import CacheNamespace
 import logging
+from collections import defaultdict
 from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WEBHOOK_BATCH_SIZE = 50
+DEFAULT_WEBHOOK_DEGRADED_QUEUE = 'webhooks_degraded'
+
+# Every cached organization list, detail and statistics entry; bumped on any
+# organization write, so entries can live for ORGANIZATION_CACHE_TTL
+organization_cache = CacheNamespace('org', timeout_setting='ORGANIZATION_CACHE_TTL', default_timeout=60 * 60)
+
+class DomainStatistics:
+    """
+    Organization counts per ``website_domain``.
+
+    The histogram of the whole table is computed with one GROUP BY and cached
+    outside the versioned organization namespace, because organization
+    writes adjust it in place (see ``apply``) instead of discarding it. Each
+    build gets an id; the count of every domain is its own counter under that
+    id, changed only through ``cache.incr``, so concurrent writes cannot
+    overwrite each other. Domains that first appear after the build are
+    listed in numbered slots claimed with ``cache.incr`` as well. A rebuild
+    racing a write can miss or double-count that write;
+    ORGANIZATION_DOMAIN_STATS_TTL bounds how long such drift can last.
+    """
+
+    @staticmethod
+    def timeout() -> int:
+        return getattr(settings, 'ORGANIZATION_DOMAIN_STATS_TTL', 15 * 60)
+
+    @staticmethod
+    def cache_key() -> str:
+        return f"{organization_cache.prefix}:domain_histogram"
+
+    @classmethod
+    def _build_key(cls, build: str, name: str) -> str:
+        return f"{cls.cache_key()}:{build}:{name}"
+
+    @staticmethod
+    def query(queryset=None) -> Dict[str, int]:
+        """``{domain: count}``, largest first, from a single GROUP BY"""
+        if queryset is None:
+            queryset = Organization.objects.all()
+        rows = queryset.exclude(website_domain='').order_by().values(
+            'website_domain'
+        ).annotate(count=Count('id')).order_by('-count', 'website_domain')
+        return {row['website_domain']: row['count'] for row in rows}
+
+    @classmethod
+    def histogram(cls) -> Dict[str, int]:
+        """Cached histogram of every organization"""
+        histogram = cls._cached()
+        if histogram is None:
+            histogram = cls.query()
+            cls._store(histogram)
+        return histogram
+
+    @classmethod
+    def _store(cls, histogram: Dict[str, int]):
+        build = uuid.uuid4().hex
+        entries = {cls._build_key(build, f'count:{domain}'): count for domain, count in histogram.items()}
+        entries[cls._build_key(build, 'added')] = 0
+        timeout = cls.timeout()
+        cache.set_many(entries, timeout=timeout)
+        # Written last: readers and writers only use a build once it is complete
+        cache.set(cls.cache_key(), {'build': build, 'domains': list(histogram)}, timeout=timeout)
+
+    @classmethod
+    def _cached(cls) -> Optional[Dict[str, int]]:
+        entry = cache.get(cls.cache_key())
+        if entry is None:
+            return None
+        build, domains = entry['build'], list(entry['domains'])
+        added_key = cls._build_key(build, 'added')
+        count_keys = {cls._build_key(build, f'count:{domain}'): domain for domain in domains}
+        found = cache.get_many([added_key, *count_keys])
+        if added_key not in found:
+            return None
+        added = found[added_key]
+        if added:
+            slots = cache.get_many([cls._build_key(build, f'domain:{slot}') for slot in range(1, added + 1)])
+            # A slot still being written belongs to a change that is not counted yet
+            new_keys = {
+                cls._build_key(build, f'count:{domain}'): domain
+                for domain in slots.values() if domain not in domains
+            }
+            found.update(cache.get_many(list(new_keys)))
+            count_keys.update(new_keys)
+
+        counts = {}
+        for key, domain in count_keys.items():
+            if key not in found:
+                # Evicted; the histogram can no longer be trusted
+                return None
+            if found[key] > 0:
+                counts[domain] = found[key]
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    @classmethod
+    def record_change(cls, old_domain: str, new_domain: str):
+        """Adjust the cached histogram once the current transaction commits"""
+        changes = defaultdict(int)
+        if old_domain:
+            changes[old_domain] -= 1
+        if new_domain:
+            changes[new_domain] += 1
+        changes = {domain: delta for domain, delta in changes.items() if delta}
+        if changes:
+            transaction.on_commit(lambda: cls.apply(changes))
+
+    @classmethod
+    def invalidate(cls):
+        transaction.on_commit(lambda: cache.delete(cls.cache_key()))
+
+    @classmethod
+    def apply(cls, changes: Dict[str, int]):
+        """Add ``changes`` to the counters of the cached build, if there is one"""
+        entry = cache.get(cls.cache_key())
+        if entry is None:
+            return
+        build, timeout = entry['build'], cls.timeout()
+        try:
+            for domain, delta in changes.items():
+                count_key = cls._build_key(build, f'count:{domain}')
+                try:
+                    cache.incr(count_key, delta)
+                    continue
+                except ValueError:
+                    pass
+                if delta < 0:
+                    # Not counted by this build, so there is nothing to remove
+                    continue
+                if cache.add(count_key, delta, timeout=timeout):
+                    slot = cache.incr(cls._build_key(build, 'added'))
+                    cache.set(cls._build_key(build, f'domain:{slot}'), domain, timeout=timeout)
+                else:
+                    cache.incr(count_key, delta)
+        except ValueError:
+            # A counter of the build was evicted between the calls
+            cache.delete(cls.cache_key())
+
+
 class BatchProcessor:
     """Service for handling batch operations on organizations"""
     
-    BATCH_SIZE = 100  # Number of records to process in each batch
+    BATCH_SIZE = 1000  # Number of records to process in each batch
     
     @classmethod
     def bulk_activate(cls, organization_ids: List[int]) -> Dict[str, Any]:
@@ -49,51 +190,84 @@ class BatchProcessor:
         
         stats['processing_time'] = (timezone.now() - start_time).total_seconds()
         return stats
+
+    @staticmethod
+    def detail_cache_key(organization_id: int) -> str:
+        return organization_cache.key('detail', organization_id)
     
     @classmethod
-    @transaction.atomic
     def _process_activation_batch(cls, batch_ids: List[int]) -> Dict[str, Any]:
-        """Process a single batch of organization activations"""
+        """
+        Activate a batch with one set-based UPDATE, then invalidate the
+        organization cache namespace and emit the webhooks as one batch
+        """
         batch_stats = {
             'activated': 0,
             'failed_ids': []
         }
-        
-        # Get organizations in this batch
-        organizations = Organization.objects.filter(
-            id__in=batch_ids,
-            is_active=False
-        ).select_for_update()
-        
-        for org in organizations:
-            try:
-                org.is_active = True
-                org.save()
-                batch_stats['activated'] += 1
-                
-                # Clear cache for this organization
-                cache_key = f"{settings.CACHE_KEY_PREFIX}:org:detail:{org.id}"
-                cache.delete(cache_key)
-                
-                # Send webhook notification
-                org_data = {
-                    'id': org.id,
-                    'name': org.name,
-                    'website': org.website,
-                    'is_active': True
-                }
-                WebhookService.send_webhook(
-                    'organization.activated',
-                    org_data,
-                    org.id
-                )
-                
-            except Exception as e:
-                logger.error(f"Failed to activate organization {org.id}: {str(e)}")
-                batch_stats['failed_ids'].append(org.id)
-        
+
+        try:
+            with transaction.atomic():
+                activated = cls._activate(batch_ids)
+        except DatabaseError as e:
+            logger.error(f"Failed to activate organization batch {batch_ids[:5]}...: {str(e)}")
+            batch_stats['failed_ids'].extend(batch_ids)
+            return batch_stats
+
+        batch_stats['activated'] = len(activated)
+        if activated:
+            organization_cache.bump()
+            WebhookService.send_webhooks('organization.activated', [
+                (dict(org, is_active=True), org['id']) for org in activated
+            ])
         return batch_stats
 
+    @staticmethod
+    def _can_update_returning() -> bool:
+        """
+        Whether the default database accepts ``UPDATE ... RETURNING``. Support
+        for RETURNING on INSERT says nothing about UPDATE (MariaDB has one but
+        not the other, Oracle uses ``RETURNING ... INTO``).
+        """
+        if connection.vendor == 'postgresql':
+            return True
+        if connection.vendor == 'sqlite':
+            return connection.Database.sqlite_version_info >= (3, 35)
+        return False
+
+    @staticmethod
+    def _activate(batch_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        ``UPDATE ... SET is_active = true WHERE id IN (...) AND is_active = false
+        RETURNING id, name, website``; databases without RETURNING select the
+        matching rows first.
+        """
+        if not batch_ids:
+            return []
+        fields = ['id', 'name', 'website']
+        now = timezone.now()
+
+        if not BatchProcessor._can_update_returning():
+            queryset = Organization.objects.filter(id__in=batch_ids, is_active=False)
+            rows = list(queryset.select_for_update().values(*fields))
+            Organization.objects.filter(
+                id__in=[row['id'] for row in rows]
+            ).update(is_active=True, updated_at=now)
+            return rows
+
+        quote = connection.ops.quote_name
+        sql = (
+            f"UPDATE {quote(Organization._meta.db_table)} "
+            f"SET {quote('is_active')} = %s, {quote('updated_at')} = %s "
+            f"WHERE {quote('id')} IN ({', '.join(['%s'] * len(batch_ids))}) "
+            f"AND {quote('is_active')} = %s "
+            f"RETURNING {', '.join(quote(field) for field in fields)}"
+        )
+        params = [True, connection.ops.adapt_datetimefield_value(now), *batch_ids, False]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [dict(zip(fields, row)) for row in cursor.fetchall()]
+
 class WebhookService:
     @staticmethod
     def _generate_signature(payload: str, secret_key: str) -> str:
@@ -116,32 +290,106 @@ class WebhookService:
     @classmethod
     def send_webhook(cls, event_type: str, data: dict, organization_id: int = None):
         """Queue webhook delivery for all registered endpoints"""
-        # Get active webhook endpoints
-        endpoints = WebhookEndpoint.objects.filter(is_active=True)
-        if organization_id:
-            endpoints = endpoints.filter(
-                Q(organization_id=organization_id) | 
-                Q(organization_id__isnull=True)
-            )
+        endpoints = subscription_registry.endpoints_for(event_type, organization_id)
+        if not endpoints:
+            return
 
-        payload = cls._prepare_payload(event_type, data)
+        payload = json.dumps(cls._prepare_payload(event_type, data))
+        cls.dispatch(event_type, payload, endpoints)
 
-        for endpoint in endpoints:
-            # Check if endpoint subscribes to this event
-            if event_type not in endpoint.events:
-                continue
-
-            # Create delivery record
-            delivery = WebhookDelivery.objects.create(
-                webhook=endpoint,
-                event_type=event_type,
-                payload=payload,
-                status='pending'
+    @classmethod
+    def send_webhooks(cls, event_type: str, items):
+        """
+        Emit ``event_type`` once per ``(data, organization_id)`` item, with all
+        events and deliveries written and enqueued together
+        """
+        cls.dispatch_many(event_type, [
+            (
+                json.dumps(cls._prepare_payload(event_type, data)),
+                subscription_registry.endpoints_for(event_type, organization_id)
             )
+            for data, organization_id in items
+        ])
+
+    @classmethod
+    def dispatch(cls, event_type: str, payload: str, endpoints) -> List[int]:
+        """
+        Store the event payload once, create a delivery per subscribed endpoint
+        with one bulk INSERT and enqueue them once the transaction commits
+        """
+        return cls.dispatch_many(event_type, [(payload, endpoints)])
+
+    @staticmethod
+    def dispatch_many(event_type: str, messages) -> List[int]:
+        """Batch form of dispatch() for ``(payload, endpoints)`` pairs"""
+        messages = [(payload, endpoints) for payload, endpoints in messages if endpoints]
+        if not messages:
+            return []
+
+        with transaction.atomic():
+            events = WebhookEvent.objects.bulk_create([
+                WebhookEvent.build(event_type, payload) for payload, _endpoints in messages
+            ])
+            deliveries = WebhookDelivery.objects.bulk_create([
+                WebhookDelivery(
+                    webhook=endpoint,
+                    event=event,
+                    event_type=event_type,
+                    status='pending'
+                )
+                for event, (_payload, endpoints) in zip(events, messages)
+                for endpoint in endpoints
+            ])
 
-            # Queue delivery task
-            from .tasks import send_webhook
-            send_webhook.delay(delivery.id)
+        pending = [(delivery.id, delivery.webhook_id) for delivery in deliveries]
+        transaction.on_commit(lambda: WebhookService.enqueue(pending))
+        return [delivery.id for delivery in deliveries]
+
+    @staticmethod
+    def enqueue(deliveries):
+        """
+        Publish ``(delivery_id, endpoint_id)`` pairs as batch tasks, several
+        batches as one Celery group. Each endpoint's deliveries are kept in as
+        few batches as possible; deliveries for endpoints with an open circuit
+        breaker are parked instead, and degraded endpoints go to their own
+        queue.
+        """
+        from celery import group
+        from .health import endpoint_health, pack_by_endpoint, HEALTHY, OPEN
+        from .retries import WebhookRetryScheduler
+        from .tasks import send_webhook_batch
+
+        states = endpoint_health.classify(endpoint_id for _delivery_id, endpoint_id in deliveries)
+        lanes = defaultdict(list)
+        parked = defaultdict(list)
+        for delivery_id, endpoint_id in deliveries:
+            state, open_until = states[endpoint_id]
+            if state == OPEN:
+                parked[open_until].append(delivery_id)
+            elif state == HEALTHY:
+                lanes[None].append((delivery_id, endpoint_id))
+            else:
+                degraded_queue = getattr(settings, 'WEBHOOK_DEGRADED_QUEUE', DEFAULT_WEBHOOK_DEGRADED_QUEUE)
+                lanes[degraded_queue].append((delivery_id, endpoint_id))
+        for open_until, delivery_ids in parked.items():
+            WebhookRetryScheduler.park(delivery_ids, open_until)
+
+        batch_size = getattr(settings, 'WEBHOOK_BATCH_SIZE', DEFAULT_WEBHOOK_BATCH_SIZE)
+        batches = []
+        for queue, lane in lanes.items():
+            batches.extend((queue, batch) for batch in pack_by_endpoint(lane, batch_size))
+        if len(batches) == 1:
+            queue, batch = batches[0]
+            if queue is None:
+                send_webhook_batch.delay(batch)
+            else:
+                send_webhook_batch.apply_async((batch,), queue=queue)
+        elif batches:
+            group([
+                send_webhook_batch.s(batch) if queue is None
+                else send_webhook_batch.s(batch).set(queue=queue)
+                for queue, batch in batches
+            ]).apply_async()
 
     @staticmethod
     def _send_with_retry(url: str, payload: str, headers: dict, max_retries: int = 3):
@@ -188,129 +436,34 @@ class AsyncWebhookService:
     @classmethod
     async def send_webhook(cls, event_type: str, data: dict, organization_id: Optional[int] = None):
         """Send webhooks asynchronously to all registered endpoints"""
-        # Get active webhook endpoints
-        endpoints = await sync_to_async(list)(
-            WebhookEndpoint.objects.filter(is_active=True)
+        endpoints = await sync_to_async(subscription_registry.endpoints_for)(
+            event_type,
+            organization_id
         )
-        
-        if organization_id:
-            endpoints = [
-                ep for ep in endpoints 
-                if ep.organization_id is None or ep.organization_id == organization_id
-            ]
+        if not endpoints:
+            return
 
         payload = cls._prepare_payload(event_type, data)
-        payload_str = json.dumps(payload)
-        
-        # Create delivery records and queue tasks
-        for endpoint in endpoints:
-            if event_type not in endpoint.events:
-                continue
-                
-            delivery = await sync_to_async(WebhookDelivery.objects.create)(
-                webhook=endpoint,
-                event_type=event_type,
-                payload=payload_str,  # Store JSON string
-                status='pending'
-            )
-            
-            # Queue delivery task
-            from .tasks import send_webhook
-            send_webhook.delay(delivery.id)
+        await sync_to_async(WebhookService.dispatch)(
+            event_type,
+            json.dumps(payload),
+            endpoints
+        )
 
     @classmethod
     async def _send_webhook(
-        cls, 
+        cls,
         client: Optional[httpx.AsyncClient],
         delivery: WebhookDelivery,
         payload: str,
         retry_count: int = 0
     ):
-        """Send a single webhook with retry mechanism"""
-        if client is None:
-            client = httpx.AsyncClient()
-            
-        try:
-            # Generate signature
-            signature = await cls._generate_signature(
-                payload,
-                delivery.webhook.secret_key
-            )
-
-            # Prepare headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Webhook-Signature': signature,
-                'X-Event-Type': delivery.event_type
-            }
-
-            # Send request
-            response = await client.post(
-                delivery.webhook.url,
-                json=json.loads(payload),
-                headers=headers,
-                timeout=settings.WEBHOOK_TIMEOUT
-            )
-            
-            # Update delivery record
-            if response.is_success:
-                await sync_to_async(cls._update_delivery_success)(
-                    delivery,
-                    response.status_code,
-                    response.text
-                )
-                return True
-            else:
-                raise httpx.RequestError(f"HTTP {response.status_code}: {response.text}")
-
-        except (httpx.RequestError, asyncio.TimeoutError) as e:
-            # Handle retry
-            if retry_count < settings.WEBHOOK_MAX_RETRIES:
-                await asyncio.sleep(
-                    settings.WEBHOOK_RETRY_DELAY * (2 ** retry_count)
-                )
-                return await cls._send_webhook(
-                    client,
-                    delivery,
-                    payload,
-                    retry_count + 1
-                )
-            else:
-                await sync_to_async(cls._update_delivery_failure)(
-                    delivery,
-                    str(e),
-                    retry_count
-                )
-                return False
-        finally:
-            if client is not None:
-                await client.aclose()
-
-    @staticmethod
-    def _update_delivery_success(
-        delivery: WebhookDelivery,
-        status_code: int,
-        response_text: str
-    ):
-        """Update delivery record for successful delivery"""
-        delivery.status = 'success'
-        delivery.response_status = status_code
-        delivery.response_content = response_text[:1000]
-        delivery.save()
-        logger.info(f"Webhook delivered successfully: {delivery}")
+        """
+        Make one delivery attempt on the worker's pooled client. Failures are
+        left due for the retry scheduler instead of sleeping here.
+        """
+        from .delivery import delivery_engine
 
-    @staticmethod
-    def _update_delivery_failure(
-        delivery: WebhookDelivery,
-        error_message: str,
-        retry_count: int
-    ):
-        """Update delivery record for failed delivery"""
-        delivery.status = 'failed'
-        delivery.error_message = error_message
-        delivery.retry_count = retry_count
-        delivery.next_retry_at = timezone.now() + timezone.timedelta(
-            seconds=settings.WEBHOOK_RETRY_DELAY * (2 ** retry_count)
-        )
-        delivery.save()
-        logger.error(f"Max retries exceeded for webhook: {delivery}") 
\ No newline at end of file
+        result = await delivery_engine.post(delivery, payload, client=client)
+        stats = await sync_to_async(delivery_engine.record_results)([result])
+        return stats['delivered'] == 1
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Organization, WebhookEndpoint
+from .registry import subscription_registry
+from .services import DomainStatistics, organization_cache
+
+@receiver([post_save, post_delete], sender=WebhookEndpoint)
+def webhook_endpoint_changed(sender, instance, **kwargs):
+    """Rebuild the webhook subscription registry everywhere"""
+    subscription_registry.invalidate()
+
+@receiver([post_save, post_delete], sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    """Invalidate every cached organization list, detail and statistic"""
+    organization_cache.bump()
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, created, **kwargs):
+    """Move the organization between domain histogram buckets"""
+    old_domain = '' if created else getattr(instance, '_loaded_website_domain', None)
+    if old_domain is None:
+        # Instance not loaded from the database: its previous domain is unknown
+        DomainStatistics.invalidate()
+    elif old_domain != instance.website_domain:
+        DomainStatistics.record_change(old_domain, instance.website_domain)
+    instance._loaded_website_domain = instance.website_domain
+
+@receiver(post_delete, sender=Organization)
+def organization_deleted(sender, instance, **kwargs):
+    DomainStatistics.record_change(instance.website_domain, '')
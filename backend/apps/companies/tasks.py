@@ -1,9 +1,7 @@
-import json
 from celery import shared_task
-from django.utils import timezone
-from .models import WebhookDelivery
-from .services import AsyncWebhookService
-from asgiref.sync import async_to_sync
+from core.metrics import record_webhook_outcomes
+from .delivery import BatchDeliveryError, delivery_engine
+from .retries import WebhookRetryScheduler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,43 +10,41 @@ logger = logging.getLogger(__name__)
 def send_webhook(self, delivery_id: int):
     """Send webhook delivery asynchronously"""
     try:
-        delivery = WebhookDelivery.objects.get(id=delivery_id)
-        
-        # Convert stored text payload back to dict
-        payload_dict = json.loads(delivery.payload)
-        
-        # Send webhook asynchronously
-        async_to_sync(AsyncWebhookService._send_webhook)(
-            client=None,  # Will be created in the service
-            delivery=delivery,
-            payload=json.dumps(payload_dict)
-        )
-        
-        return True
-        
-    except WebhookDelivery.DoesNotExist:
+        stats = delivery_engine.deliver([delivery_id])
+    except BatchDeliveryError as e:
+        if not e.retry_ids:
+            # Delivered, only the result was not stored
+            return True
+        raise self.retry(exc=e)
+    except Exception as e:
+        logger.error(f"Error sending webhook {delivery_id}: {str(e)}")
+        raise self.retry(exc=e)
+
+    # Outside the try: a metrics failure must not resend the delivery
+    record_webhook_outcomes(stats)
+    if not any(stats.values()):
         logger.error(f"Webhook delivery {delivery_id} not found")
         return False
-        
+    return stats['delivered'] == 1
+
+@shared_task(bind=True, max_retries=3)
+def send_webhook_batch(self, delivery_ids):
+    """Deliver many webhooks concurrently on the worker's pooled HTTP client"""
+    try:
+        stats = delivery_engine.deliver(delivery_ids)
+    except BatchDeliveryError as e:
+        # The other deliveries were attempted already; only resend the failures
+        if not e.retry_ids:
+            return None
+        raise self.retry(args=(e.retry_ids,), exc=e)
     except Exception as e:
-        logger.error(f"Error sending webhook {delivery_id}: {str(e)}")
+        logger.error(f"Error sending webhook batch of {len(delivery_ids)}: {str(e)}")
         raise self.retry(exc=e)
 
+    record_webhook_outcomes(stats)
+    return stats
+
 @shared_task
 def retry_failed_webhooks():
-    """Retry failed webhook deliveries that are due"""
-    now = timezone.now()
-    
-    # Get failed deliveries that are due for retry
-    deliveries = WebhookDelivery.objects.filter(
-        status='failed',
-        next_retry_at__lte=now,
-        retry_count__lt=3
-    )
-    
-    retry_count = 0
-    for delivery in deliveries:
-        send_webhook.delay(delivery.id)
-        retry_count += 1
-        
-    return retry_count 
\ No newline at end of file
+    """Publish webhook deliveries whose retry is due, capped per run"""
+    return WebhookRetryScheduler.run()
@@ -5,6 +5,7 @@ from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from apps.companies.models import Organization
 from apps.companies.services import BatchProcessor
+from django.core.cache import cache
 from unittest.mock import patch
 import time
 
@@ -54,16 +55,48 @@ class BatchProcessingTest(TestCase):
         
         self.assertEqual(stats['activated_count'], len(self.organizations) - 50)
 
-    @patch('apps.companies.services.WebhookService.send_webhook')
+    @patch('apps.companies.services.WebhookService.send_webhooks')
     def test_webhook_calls(self, mock_send):
-        """Test that webhooks are called for each activated organization"""
+        """Test that one webhook batch covers every activated organization"""
         org_ids = [org.id for org in self.organizations[:5]]  # Test with small batch
         
         BatchProcessor.bulk_activate(org_ids)
         
-        self.assertEqual(mock_send.call_count, len(org_ids))
-        for call_args in mock_send.call_args_list:
-            self.assertEqual(call_args[0][0], 'organization.activated')
+        mock_send.assert_called_once()
+        event_type, items = mock_send.call_args[0]
+        self.assertEqual(event_type, 'organization.activated')
+        self.assertEqual(sorted(org_id for _data, org_id in items), sorted(org_ids))
+        self.assertTrue(all(data['is_active'] for data, _org_id in items))
+
+    @patch('apps.companies.services.WebhookService.send_webhooks')
+    def test_batch_is_one_update(self, mock_send):
+        """Each batch activates its organizations with a single UPDATE"""
+        org_ids = [org.id for org in self.organizations]
+        for org_id in org_ids[:3]:
+            cache.set(BatchProcessor.detail_cache_key(org_id), {'cached': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(3):  # savepoint, UPDATE ... RETURNING, release
+                stats = BatchProcessor.bulk_activate(org_ids)
+
+        self.assertEqual(stats['activated_count'], len(org_ids))
+        self.assertFalse(Organization.objects.filter(id__in=org_ids, is_active=False).exists())
+        self.assertIsNone(cache.get(BatchProcessor.detail_cache_key(org_ids[0])))
+
+        # Already active organizations are not activated (or announced) twice
+        mock_send.reset_mock()
+        self.assertEqual(BatchProcessor.bulk_activate(org_ids)['activated_count'], 0)
+        mock_send.assert_not_called()
+
+    @patch('apps.companies.services.WebhookService.send_webhooks')
+    @patch('apps.companies.services.BatchProcessor._can_update_returning', return_value=False)
+    def test_batch_without_update_returning(self, _returning, mock_send):
+        """Databases without UPDATE ... RETURNING select the rows first"""
+        org_ids = [org.id for org in self.organizations]
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = BatchProcessor.bulk_activate(org_ids)
+        self.assertEqual(stats['activated_count'], len(org_ids))
+        self.assertFalse(Organization.objects.filter(id__in=org_ids, is_active=False).exists())
 
     def test_error_handling(self):
         """Test error handling during batch processing"""
@@ -0,0 +1,37 @@
+import json
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from apps.companies.benchmark import percentiles
+from apps.companies.models import WebhookEndpoint, WebhookDelivery, WebhookEvent
+
+
+class WebhookBenchmarkTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentiles(self):
+        values = [i / 100 for i in range(1, 101)]
+        result = percentiles(values)
+        self.assertAlmostEqual(result['p50'], 0.505)
+        self.assertAlmostEqual(result['p99'], 0.9901)
+        self.assertEqual(percentiles([]), {'p50': None, 'p95': None, 'p99': None})
+
+    def test_stage_reports_json_and_cleans_up(self):
+        out = StringIO()
+        call_command(
+            'benchmark_webhooks', '--rates', '20', '--endpoints', '2',
+            '--duration', '0.3', '--latency', '0', '--jitter', '0', '--json',
+            stdout=out
+        )
+        result = json.loads(out.getvalue().strip())
+        self.assertEqual(result['endpoints'], 2)
+        self.assertGreater(result['events'], 0)
+        self.assertEqual(result['delivered'], result['events'] * 2)
+        self.assertEqual(result['error_rate'], 0.0)
+        self.assertIsNotNone(result['latency']['p99'])
+        self.assertGreater(result['db_writes_per_delivery'], 0)
+        self.assertFalse(WebhookEndpoint.objects.exists())
+        self.assertFalse(WebhookDelivery.objects.exists())
+        self.assertFalse(WebhookEvent.objects.exists())
@@ -0,0 +1,56 @@
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.companies.models import Organization
+from apps.companies.services import BatchProcessor, organization_cache
+from core.cache import CacheNamespace
+
+
+class CacheNamespaceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.namespace = CacheNamespace('test')
+
+    def test_keys_embed_generation_and_params(self):
+        key = self.namespace.key('list', params={'b': 2, 'a': 1})
+        self.assertIn(f':test:g{self.namespace.generation()}:list:', key)
+        self.assertEqual(key, self.namespace.key('list', params={'a': 1, 'b': 2}))
+        self.assertNotEqual(key, self.namespace.key('list', params={'a': 2}))
+
+    def test_bump_invalidates_every_key_after_commit(self):
+        list_key = self.namespace.key('list')
+        detail_key = self.namespace.key('detail', 1)
+        self.namespace.set(list_key, ['cached'])
+        self.namespace.set(detail_key, {'cached': True})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.namespace.bump()
+            # Still current until the write commits
+            self.assertEqual(self.namespace.get(self.namespace.key('list')), ['cached'])
+        callbacks[0]()
+
+        self.assertIsNone(self.namespace.get(self.namespace.key('list')))
+        self.assertIsNone(self.namespace.get(self.namespace.key('detail', 1)))
+
+    def test_lost_generation_never_revives_old_entries(self):
+        with patch('core.cache.time.time', return_value=1000.0):
+            old_key = self.namespace.key('list')
+        cache.delete(self.namespace.generation_key)
+        with patch('core.cache.time.time', return_value=1000.5):
+            self.assertGreater(self.namespace.generation(), 1000 * 1000)
+            self.assertNotEqual(self.namespace.key('list'), old_key)
+
+    @override_settings(ORGANIZATION_CACHE_TTL=1234)
+    def test_timeout_setting(self):
+        self.assertEqual(organization_cache.timeout, 1234)
+
+    def test_organization_writes_bump_namespace(self):
+        key = BatchProcessor.detail_cache_key(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            organization = Organization.objects.create(name='Acme')
+        self.assertNotEqual(BatchProcessor.detail_cache_key(1), key)
+
+        key = BatchProcessor.detail_cache_key(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            organization.delete()
+        self.assertNotEqual(BatchProcessor.detail_cache_key(1), key)
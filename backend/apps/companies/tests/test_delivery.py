@@ -0,0 +1,152 @@
+import asyncio
+import json
+from unittest.mock import patch
+from datetime import timedelta
+import httpx
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.companies.delivery import WebhookDeliveryEngine
+from apps.companies.models import WebhookEndpoint, WebhookDelivery, WebhookEvent
+from apps.companies.registry import subscription_registry
+from apps.companies.retries import WebhookRetryScheduler
+from apps.companies.services import WebhookService
+from apps.companies.tasks import send_webhook_batch
+
+User = get_user_model()
+
+
+@override_settings(WEBHOOK_MAX_RETRIES=2, WEBHOOK_RETRY_DELAY=1)
+class WebhookDeliveryEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.requests = []
+        self.failing_hosts = set()
+        self.engine = WebhookDeliveryEngine(transport=httpx.MockTransport(self.handle))
+        # Run queued batches inline instead of through the broker
+        for patcher in [
+            patch('apps.companies.tasks.delivery_engine', self.engine),
+            patch.object(send_webhook_batch, 'delay', side_effect=send_webhook_batch),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.endpoints = [
+            WebhookEndpoint.objects.create(
+                name=f'Endpoint {i}',
+                url=f'http://receiver-{i}.test/hook',
+                secret_key=f'secret-{i}',
+                events=['organization.updated'],
+                is_active=True
+            )
+            for i in range(3)
+        ]
+
+    def send(self, event_type='organization.updated', data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            WebhookService.send_webhook(event_type, data or {'id': 1})
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request.url.host in self.failing_hosts:
+            return httpx.Response(503, text='down')
+        return httpx.Response(200, text='ok')
+
+    def test_event_is_delivered_to_every_endpoint_in_one_batch(self):
+        with patch.object(send_webhook_batch, 'apply_async') as reschedule:
+            self.send()
+        reschedule.assert_not_called()
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(
+            set(WebhookDelivery.objects.values_list('status', flat=True)), {'success'}
+        )
+
+        request = self.requests[0]
+        endpoint = next(e for e in self.endpoints if e.url == str(request.url))
+        self.assertEqual(
+            request.headers['X-Webhook-Signature'],
+            WebhookService._generate_signature(request.content.decode(), endpoint.secret_key)
+        )
+        self.assertEqual(json.loads(request.content)['data'], {'id': 1})
+
+    def test_failures_record_when_they_are_due(self):
+        self.failing_hosts.add('receiver-0.test')
+        before = timezone.now()
+        self.send()
+
+        failed = WebhookDelivery.objects.get(webhook=self.endpoints[0])
+        self.assertEqual(failed.status, 'retrying')
+        self.assertEqual(failed.retry_count, 1)
+        # WEBHOOK_RETRY_DELAY=1: first backoff is jittered within [0.5s, 1s]
+        self.assertGreaterEqual(failed.next_retry_at, before + timedelta(seconds=0.5))
+        self.assertLessEqual(failed.next_retry_at, timezone.now() + timedelta(seconds=1))
+
+    def test_retries_stop_in_dead_letter_state(self):
+        self.failing_hosts.add('receiver-0.test')
+        self.send()
+        # Run the scheduler as if every backoff had elapsed
+        for _ in range(3):
+            WebhookRetryScheduler.run(now=timezone.now() + timedelta(days=1))
+        failed = WebhookDelivery.objects.get(webhook=self.endpoints[0])
+        self.assertEqual(failed.status, 'dead')
+        self.assertEqual(failed.retry_count, 2)
+        self.assertIsNone(failed.next_retry_at)
+        self.assertEqual(len([r for r in self.requests if r.url.host == 'receiver-0.test']), 3)
+
+    def test_unrecorded_batch_only_retries_failures(self):
+        self.failing_hosts.add('receiver-0.test')
+        retried = RuntimeError('retried')
+        with patch.object(self.engine, 'record_results', side_effect=DatabaseError), \
+                patch.object(send_webhook_batch, 'retry', return_value=retried) as retry:
+            with self.assertRaises(RuntimeError):
+                self.send()
+        failed = WebhookDelivery.objects.get(webhook=self.endpoints[0])
+        self.assertEqual(retry.call_args.kwargs['args'], ([failed.id],))
+        self.assertEqual(len(self.requests), 3)
+
+    def test_engine_runs_from_inside_a_running_event_loop(self):
+        async def clients():
+            return self.engine.client(), self.engine.client()
+
+        async def caller():
+            # A blocking call from a thread whose loop is running
+            return self.engine.run(clients())
+
+        first, second = asyncio.run(caller())
+        self.assertIs(first, second)
+        self.assertIs(self.engine.run(clients())[0], first)
+
+    def test_client_is_reused_per_event_loop(self):
+        async def clients():
+            return self.engine.client(), self.engine.client()
+
+        first, second = self.engine.run(clients())
+        self.assertIs(first, second)
+        other_loop = asyncio.new_event_loop()
+        try:
+            self.assertIsNot(other_loop.run_until_complete(clients())[0], first)
+        finally:
+            other_loop.close()
+
+    def test_payload_is_stored_once_and_deliveries_bulk_created(self):
+        subscription_registry.endpoints_for('organization.updated')
+        with patch.object(send_webhook_batch, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                # Event INSERT and one bulk delivery INSERT (+ savepoint)
+                with self.assertNumQueries(4):
+                    WebhookService.send_webhook('organization.updated', {'id': 7})
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(json.loads(event.payload)['data'], {'id': 7})
+        deliveries = WebhookDelivery.objects.filter(event=event)
+        self.assertEqual(deliveries.count(), 3)
+        self.assertEqual(set(deliveries.values_list('payload', flat=True)), {''})
+        delay.assert_called_once_with(sorted(deliveries.values_list('id', flat=True)))
+
+    @override_settings(WEBHOOK_BATCH_SIZE=2)
+    def test_large_fan_out_is_enqueued_as_one_group(self):
+        with patch('celery.group') as group, patch.object(send_webhook_batch, 's') as signature:
+            self.send()
+        group.return_value.apply_async.assert_called_once()
+        self.assertEqual([len(call.args[0]) for call in signature.call_args_list], [2, 1])
@@ -0,0 +1,89 @@
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from apps.companies.models import Organization, normalize_domain
+from apps.companies.services import DomainStatistics
+
+
+class DomainStatisticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create(self, website):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Organization.objects.create(name=website or 'blank', website=website)
+
+    def test_normalize_domain(self):
+        self.assertEqual(normalize_domain('https://WWW.Example.com:8443/about'), 'example.com')
+        self.assertEqual(normalize_domain('http://user@sub.example.mn/'), 'sub.example.mn')
+        self.assertEqual(normalize_domain('example.org/path'), 'example.org')
+        self.assertEqual(normalize_domain(''), '')
+
+    def test_domain_is_kept_in_sync_on_save(self):
+        organization = self.create('https://www.acme.com')
+        self.assertEqual(organization.website_domain, 'acme.com')
+        organization.website = 'https://acme.mn'
+        organization.save(update_fields=['website'])
+        organization.refresh_from_db()
+        self.assertEqual(organization.website_domain, 'acme.mn')
+
+    def test_histogram_is_one_group_by(self):
+        for website in ['https://a.com', 'https://www.a.com/x', 'https://b.com', '']:
+            self.create(website)
+        with self.assertNumQueries(1):
+            self.assertEqual(DomainStatistics.histogram(), {'a.com': 2, 'b.com': 1})
+        with self.assertNumQueries(0):
+            DomainStatistics.histogram()
+
+    def test_histogram_is_updated_incrementally(self):
+        first = self.create('https://a.com')
+        DomainStatistics.histogram()
+
+        second = self.create('https://a.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = Organization.objects.get(pk=first.pk)
+            moved.website = 'https://b.com'
+            moved.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(DomainStatistics.histogram(), {'b.com': 1})
+        self.assertEqual(DomainStatistics.query(), {'b.com': 1})
+
+    def test_interleaved_changes_are_not_lost(self):
+        self.create('https://a.com')
+        DomainStatistics.histogram()
+        incr = cache.incr
+        calls = []
+
+        def interleaved(key, delta=1, version=None):
+            # The second writer runs entirely between the first one's read of
+            # the build and its own increment
+            calls.append(key)
+            if len(calls) == 1:
+                DomainStatistics.apply({'a.com': 1, 'c.com': 1})
+            return incr(key, delta, version=version)
+
+        with mock.patch.object(cache, 'incr', side_effect=interleaved):
+            DomainStatistics.apply({'a.com': 1, 'b.com': 1})
+
+        self.assertEqual(DomainStatistics.histogram(), {'a.com': 3, 'b.com': 1, 'c.com': 1})
+
+    def test_evicted_counter_rebuilds_histogram(self):
+        self.create('https://a.com')
+        DomainStatistics.histogram()
+        build = cache.get(DomainStatistics.cache_key())['build']
+        cache.delete(f'{DomainStatistics.cache_key()}:{build}:count:a.com')
+        self.create('https://b.com')
+        with self.assertNumQueries(1):
+            self.assertEqual(DomainStatistics.histogram(), {'a.com': 1, 'b.com': 1})
+
+    def test_backfill_command(self):
+        organization = self.create('https://www.acme.com')
+        Organization.objects.filter(pk=organization.pk).update(website_domain='')
+        call_command('backfill_website_domains', '--batch-size', '1', stdout=StringIO())
+        organization.refresh_from_db()
+        self.assertEqual(organization.website_domain, 'acme.com')
@@ -0,0 +1,152 @@
+import hashlib
+import json
+from datetime import date
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from graphene.test import Client
+from graphql import parse, validate
+from apps.companies.models import Organization, WebhookEndpoint
+from apps.internships.models import Agreement, Internship
+from graphene.validation import depth_limit_validator
+from core.graphql_tools import PersistedQueryGraphQLView, cost_limit_validator
+from schema import schema
+
+User = get_user_model()
+
+NESTED_QUERY = '''
+    query Portal {
+        organizations(first: 50) {
+            id
+            name
+            contactPerson { id username fullName }
+            webhooks { id url }
+            internships { id title status }
+        }
+    }
+'''
+
+
+class GraphQLBatchingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client(schema)
+        self.staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+        for i in range(12):
+            contact = User.objects.create_user(username=f'contact{i}', password='pw')
+            organization = Organization.objects.create(
+                name=f'Org {i:02d}', website=f'https://org{i}.mn', contact_person=contact
+            )
+            WebhookEndpoint.objects.create(
+                name=f'Hook {i}', url=f'https://org{i}.mn/hook', secret_key='s',
+                events=['organization.updated'], organization=organization
+            )
+            internship = Internship.objects.create(
+                student=contact, title=f'Internship {i}', description='-',
+                start_date=date(2026, 1, 1), end_date=date(2026, 6, 1)
+            )
+            Agreement.objects.create(
+                internship=internship, student=contact, organization=organization,
+                start_date=date(2026, 1, 1), end_date=date(2026, 6, 1)
+            )
+
+    def test_nested_query_costs_one_statement_per_relation(self):
+        # organizations, users, webhooks, internships
+        with self.assertNumQueries(4):
+            response = self.client.execute(NESTED_QUERY, context={'user': self.staff})
+        self.assertIsNone(response.get('errors'))
+        organizations = response['data']['organizations']
+        self.assertEqual(len(organizations), 12)
+        first = organizations[0]
+        self.assertEqual(first['contactPerson']['username'], 'contact0')
+        self.assertEqual(first['webhooks'][0]['url'], 'https://org0.mn/hook')
+        self.assertEqual(first['internships'][0]['title'], 'Internship 0')
+
+    def test_page_size_is_capped(self):
+        response = self.client.execute(
+            '{ organizations(first: 100000) { id } }', context={'user': self.staff}
+        )
+        self.assertIsNone(response.get('errors'))
+        self.assertLessEqual(len(response['data']['organizations']), 100)
+
+    def test_webhooks_hidden_from_non_staff(self):
+        user = User.objects.create_user(username='partner', password='pw')
+        response = self.client.execute(
+            '{ organizations(first: 1) { webhooks { url } } }', context={'user': user}
+        )
+        self.assertEqual(response['data']['organizations'][0]['webhooks'], [])
+
+
+class GraphQLLimitsTest(TestCase):
+    def errors(self, query, rule):
+        return validate(schema.graphql_schema, parse(query), [rule])
+
+    def test_cost_limit(self):
+        self.assertEqual(self.errors(NESTED_QUERY, cost_limit_validator(10000)), [])
+        errors = self.errors(NESTED_QUERY, cost_limit_validator(500))
+        self.assertEqual(len(errors), 1)
+        self.assertIn('exceeds maximum query cost', errors[0].message)
+
+    def test_variable_page_size_costs_a_full_page(self):
+        query = NESTED_QUERY.replace('Portal', 'Portal($first: Int)').replace('first: 50', 'first: $first')
+        self.assertEqual(self.errors(NESTED_QUERY, cost_limit_validator(3000)), [])
+        self.assertEqual(len(self.errors(query, cost_limit_validator(3000))), 1)
+        self.assertEqual(self.errors(query, cost_limit_validator(3000, max_list_size=50)), [])
+
+    def test_depth_limit(self):
+        query = '{ organizations { contactPerson { id } } }'
+        self.assertEqual(self.errors(query, depth_limit_validator(max_depth=2)), [])
+        self.assertEqual(len(self.errors(query, depth_limit_validator(max_depth=1))), 1)
+
+
+class PersistedQueryViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='portal', password='pw')
+        self.view = PersistedQueryGraphQLView.as_view(schema=schema)
+        self.query = '{ organizations { id } }'
+        self.hash = hashlib.sha256(self.query.encode()).hexdigest()
+
+    def post(self, body):
+        request = RequestFactory().post('/graphql/', json.dumps(body), content_type='application/json')
+        request.user = self.user
+        response = self.view(request)
+        return response.status_code, json.loads(response.content)
+
+    def extensions(self):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': self.hash}}
+
+    def test_hash_only_request_after_registration(self):
+        status, body = self.post({'extensions': self.extensions()})
+        self.assertEqual(status, 400)
+        self.assertEqual(body['errors'][0]['message'], 'PersistedQueryNotFound')
+
+        status, body = self.post({'query': self.query, 'extensions': self.extensions()})
+        self.assertEqual(status, 200)
+
+        status, body = self.post({'extensions': self.extensions()})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data'], {'organizations': []})
+
+    def test_mismatched_hash_is_rejected(self):
+        status, _body = self.post({'query': '{ organizations { name } }', 'extensions': self.extensions()})
+        self.assertEqual(status, 400)
+
+    @override_settings(GRAPHQL_PERSISTED_QUERIES_ONLY=True)
+    def test_persisted_only_mode(self):
+        status, _body = self.post({'query': self.query})
+        self.assertEqual(status, 400)
+        status, _body = self.post({'query': self.query, 'extensions': self.extensions()})
+        self.assertEqual(status, 400)
+
+        PersistedQueryGraphQLView.register(self.query, permanent=True)
+        status, _body = self.post({'extensions': self.extensions()})
+        self.assertEqual(status, 200)
+
+    @override_settings(GRAPHQL_PERSISTED_QUERY_TTL=0)
+    def test_client_registration_keeps_permanent_entry(self):
+        PersistedQueryGraphQLView.register(self.query, permanent=True)
+        status, _body = self.post({'query': self.query, 'extensions': self.extensions()})
+        self.assertEqual(status, 200)
+        status, _body = self.post({'extensions': self.extensions()})
+        self.assertEqual(status, 200)
@@ -0,0 +1,146 @@
+import time
+from unittest.mock import patch
+import httpx
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.companies.delivery import WebhookDeliveryEngine
+from apps.companies.health import (
+    EndpointHealth, pack_by_endpoint, HEALTHY, DEGRADED, HALF_OPEN, OPEN
+)
+from apps.companies.models import WebhookEndpoint, WebhookDelivery
+from apps.companies.services import WebhookService
+from apps.companies.tasks import send_webhook_batch
+
+
+def result(endpoint, error=None, elapsed=0.05):
+    delivery = WebhookDelivery(webhook=endpoint, event_type='organization.updated')
+    return {'delivery': delivery, 'error': error, 'elapsed': elapsed}
+
+
+@override_settings(
+    WEBHOOK_BREAKER_MIN_ATTEMPTS=4,
+    WEBHOOK_BREAKER_FAILURE_RATE=0.5,
+    WEBHOOK_DEGRADED_FAILURE_RATE=0.25,
+    WEBHOOK_DEGRADED_LATENCY=1.0,
+    WEBHOOK_BREAKER_COOLDOWN=30,
+)
+class EndpointHealthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.health = EndpointHealth()
+        self.endpoints = [
+            WebhookEndpoint.objects.create(
+                name=f'Endpoint {i}',
+                url=f'http://receiver-{i}.test/hook',
+                secret_key=f'secret-{i}',
+                events=['organization.updated'],
+                is_active=True
+            )
+            for i in range(3)
+        ]
+        self.healthy, self.slow, self.down = self.endpoints
+
+    def state(self, endpoint):
+        return self.health.classify([endpoint.id])[endpoint.id][0]
+
+    def test_rolling_stats_and_classification(self):
+        self.health.record_many(
+            [result(self.healthy) for _ in range(4)]
+            + [result(self.slow, elapsed=1.5) for _ in range(4)]
+        )
+        stats = self.health.stats([self.healthy.id, self.slow.id])
+        self.assertEqual(stats[self.healthy.id]['attempts'], 4)
+        self.assertAlmostEqual(stats[self.slow.id]['latency'], 1.5)
+        self.assertEqual(self.state(self.healthy), HEALTHY)
+        self.assertEqual(self.state(self.slow), DEGRADED)
+
+    def test_breaker_opens_then_probes_then_closes(self):
+        now = time.time()
+        self.health.record_many([result(self.down, error='HTTP 503') for _ in range(4)], now=now)
+        states = self.health.classify([self.down.id])
+        self.assertEqual(states[self.down.id][0], OPEN)
+        self.assertAlmostEqual(states[self.down.id][1], now + 30)
+        self.assertFalse(self.health.allow(self.down.id, OPEN))
+
+        # Cooldown over: half-open lets exactly one probe through
+        cache.delete(self.health._open_key(self.down.id))
+        self.assertEqual(self.state(self.down), HALF_OPEN)
+        self.assertTrue(self.health.allow(self.down.id, HALF_OPEN))
+        self.assertFalse(self.health.allow(self.down.id, HALF_OPEN))
+
+        self.health.record_many([result(self.down)])
+        self.assertEqual(self.state(self.down), HEALTHY)
+
+    def test_failed_probe_doubles_cooldown(self):
+        now = time.time()
+        self.health.trip(self.down.id, now)
+        cache.delete(self.health._open_key(self.down.id))
+        self.health.record_many([result(self.down, error='timeout')], now=now)
+        self.assertAlmostEqual(self.health.classify([self.down.id])[self.down.id][1], now + 60)
+
+    def test_pack_by_endpoint(self):
+        pairs = [(1, 'a'), (2, 'a'), (3, 'a'), (4, 'b'), (5, 'c'), (6, 'c'), (7, 'a'), (8, 'a')]
+        self.assertEqual(pack_by_endpoint(pairs, 3), [[1, 2, 3], [7, 8, 4], [5, 6]])
+
+    def test_backlogged_endpoint_does_not_starve_others(self):
+        pairs = [(i, 'big') for i in range(100)] + [(200, 'small'), (300, 'other')]
+        pairs += [(i, 'busy') for i in range(400, 420)]
+        batches = pack_by_endpoint(pairs, 10)
+        # Every endpoint gets a batch in the first turn, then the two big ones alternate
+        self.assertCountEqual(batches[:3], [list(range(10)), list(range(400, 410)), [200, 300]])
+        self.assertEqual(batches[3:5], [list(range(10, 20)), list(range(410, 420))])
+        self.assertEqual(sorted(i for batch in batches for i in batch), sorted(i for i, _ in pairs))
+
+    def test_trips_are_counted_atomically(self):
+        now = time.time()
+        # Two workers that both saw the endpoint closed trip it together
+        self.health.trip(self.down.id, now)
+        self.health.trip(self.down.id, now)
+        self.assertEqual(cache.get(self.health._trips_key(self.down.id)), 2)
+        self.assertAlmostEqual(self.health.classify([self.down.id])[self.down.id][1], now + 60)
+
+    def test_enqueue_parks_open_and_isolates_degraded_endpoints(self):
+        self.health.record_many([result(self.slow, elapsed=1.5) for _ in range(4)])
+        open_until = self.health.trip(self.down.id)
+        deliveries = {
+            endpoint.id: WebhookDelivery.objects.bulk_create([
+                WebhookDelivery(webhook=endpoint, event_type='organization.updated')
+                for _ in range(2)
+            ])
+            for endpoint in self.endpoints
+        }
+        pairs = [(d.id, d.webhook_id) for batch in deliveries.values() for d in batch]
+
+        with patch('celery.group') as group, patch.object(send_webhook_batch, 's') as signature:
+            WebhookService.enqueue(pairs)
+        group.return_value.apply_async.assert_called_once()
+        published = [call.args[0] for call in signature.call_args_list]
+        self.assertEqual(published, [
+            [d.id for d in deliveries[self.healthy.id]],
+            [d.id for d in deliveries[self.slow.id]],
+        ])
+        signature.return_value.set.assert_called_once_with(queue='webhooks_degraded')
+
+        for parked in WebhookDelivery.objects.filter(webhook=self.down):
+            self.assertEqual(parked.status, 'retrying')
+            self.assertEqual(parked.retry_count, 0)
+            self.assertAlmostEqual(parked.next_retry_at.timestamp(), open_until, places=3)
+
+    def test_engine_parks_deliveries_for_open_endpoints(self):
+        requests = []
+        engine = WebhookDeliveryEngine(transport=httpx.MockTransport(
+            lambda request: requests.append(request) or httpx.Response(200, text='ok')
+        ))
+        healthy = WebhookDelivery.objects.create(
+            webhook=self.healthy, event_type='organization.updated', payload='{}'
+        )
+        parked = WebhookDelivery.objects.create(
+            webhook=self.down, event_type='organization.updated', payload='{}'
+        )
+        self.health.trip(self.down.id)
+
+        stats = engine.deliver([healthy.id, parked.id])
+        self.assertEqual((stats['delivered'], stats['parked']), (1, 1))
+        self.assertEqual([request.url.host for request in requests], ['receiver-0.test'])
+        parked.refresh_from_db()
+        self.assertEqual((parked.status, parked.retry_count), ('retrying', 0))
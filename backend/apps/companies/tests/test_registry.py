@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.companies.models import Organization, WebhookEndpoint
+from apps.companies.registry import SubscriptionRegistry, VERSION_KEY
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'webhook-registry'}})
+class SubscriptionRegistryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = SubscriptionRegistry()
+        self.organization = Organization.objects.create(name='Acme')
+        self.other = Organization.objects.create(name='Other')
+        self.global_endpoint = self.endpoint('Global', ['organization.updated', 'organization.created'])
+        self.org_endpoint = self.endpoint('Acme only', ['organization.updated'], self.organization)
+        self.other_endpoint = self.endpoint('Other only', ['organization.updated'], self.other)
+        self.endpoint('Inactive', ['organization.updated'], is_active=False)
+
+    def endpoint(self, name, events, organization=None, is_active=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return WebhookEndpoint.objects.create(
+                name=name,
+                url='http://receiver.test/hook',
+                secret_key='secret',
+                events=events,
+                organization=organization,
+                is_active=is_active
+            )
+
+    def ids(self, *args):
+        return {endpoint.id for endpoint in self.registry.endpoints_for(*args)}
+
+    def test_lookup_matches_event_and_organization(self):
+        self.assertEqual(
+            self.ids('organization.updated', self.organization.id),
+            {self.global_endpoint.id, self.org_endpoint.id}
+        )
+        self.assertEqual(
+            self.ids('organization.updated'),
+            {self.global_endpoint.id, self.org_endpoint.id, self.other_endpoint.id}
+        )
+        self.assertEqual(self.ids('organization.created', self.other.id), {self.global_endpoint.id})
+        self.assertEqual(self.ids('organization.deleted'), set())
+
+    def test_lookup_does_not_hit_the_database_once_built(self):
+        self.registry.endpoints_for('organization.updated')
+        with self.assertNumQueries(0):
+            self.registry.endpoints_for('organization.updated', self.organization.id)
+
+    def test_endpoint_changes_bump_the_shared_version(self):
+        self.registry.endpoints_for('organization.updated')
+        version = cache.get(VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.org_endpoint.events = ['organization.created']
+            self.org_endpoint.save()
+        self.assertEqual(cache.get(VERSION_KEY), version + 1)
+        # Another process notices the new version and rebuilds
+        self.assertEqual(
+            self.ids('organization.created', self.organization.id),
+            {self.global_endpoint.id, self.org_endpoint.id}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.global_endpoint.delete()
+        self.assertEqual(self.ids('organization.created', self.organization.id), {self.org_endpoint.id})
+
+    def test_evicted_version_is_not_reused(self):
+        """Test a version key lost to eviction does not restart at a number already built at"""
+        # Built at a freshly seeded version, then evicted
+        cache.delete(VERSION_KEY)
+        self.registry.endpoints_for('organization.updated')
+        cache.delete(VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.org_endpoint.events = ['organization.created']
+            self.org_endpoint.save()
+        self.assertEqual(
+            self.ids('organization.created', self.organization.id),
+            {self.global_endpoint.id, self.org_endpoint.id}
+        )
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.companies.models import WebhookEndpoint, WebhookDelivery
+from apps.companies.retries import WebhookRetryScheduler
+from apps.companies.services import WebhookService
+
+
+@override_settings(WEBHOOK_RETRY_SCAN_SIZE=4, WEBHOOK_RETRY_MAX_PER_RUN=10, WEBHOOK_RETRY_LEASE=300)
+class WebhookRetrySchedulerTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.endpoint = WebhookEndpoint.objects.create(
+            name='Receiver',
+            url='http://receiver.test/hook',
+            secret_key='secret',
+            events=['organization.updated'],
+            is_active=True
+        )
+        patcher = patch.object(WebhookService, 'enqueue')
+        self.enqueue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, count, endpoint=None, **fields):
+        fields.setdefault('status', 'retrying')
+        fields.setdefault('next_retry_at', self.now - timedelta(minutes=1))
+        fields.setdefault('retry_count', 1)
+        return WebhookDelivery.objects.bulk_create([
+            WebhookDelivery(
+                webhook=endpoint or self.endpoint,
+                event_type='organization.updated',
+                **fields
+            )
+            for _ in range(count)
+        ])
+
+    def published(self):
+        return [pk for call in self.enqueue.call_args_list for pk, _endpoint in call.args[0]]
+
+    @override_settings(WEBHOOK_MAX_RETRIES=3)
+    def test_legacy_failed_rows_keep_their_attempt_cap(self):
+        due = self.create(1, status='failed', retry_count=2)
+        self.create(1, status='failed', retry_count=3)
+
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 1)
+        self.assertEqual(self.published(), [due[0].id])
+
+    def test_due_deliveries_are_published_in_chunks_and_leased(self):
+        due = self.create(6)
+        self.create(2, next_retry_at=self.now + timedelta(minutes=5))
+
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 6)
+        self.assertEqual([len(call.args[0]) for call in self.enqueue.call_args_list], [4, 2])
+        self.assertEqual(sorted(self.published()), sorted(d.id for d in due))
+
+        # Leased rows are not published again until the lease expires
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 0)
+        self.assertEqual(
+            WebhookRetryScheduler.run(now=self.now + timedelta(seconds=301)), 8
+        )
+
+    def test_run_is_capped(self):
+        self.create(25)
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 10)
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 10)
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 5)
+
+    def test_oldest_due_first_and_inactive_endpoints_skipped(self):
+        inactive = WebhookEndpoint.objects.create(
+            name='Disabled', url='http://disabled.test/hook', secret_key='s',
+            events=['organization.updated'], is_active=False
+        )
+        self.create(3, endpoint=inactive)
+        newer = self.create(1, next_retry_at=self.now - timedelta(minutes=1))
+        older = self.create(1, next_retry_at=self.now - timedelta(hours=1))
+        with self.settings(WEBHOOK_RETRY_MAX_PER_RUN=1):
+            WebhookRetryScheduler.run(now=self.now)
+        self.assertEqual(self.published(), [older[0].id])
+        WebhookRetryScheduler.run(now=self.now)
+        self.assertEqual(self.published(), [older[0].id, newer[0].id])
+
+    def test_replay_dead_letters(self):
+        dead = self.create(3, status='dead', next_retry_at=None)
+        self.create(1, status='success', next_retry_at=None)
+
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 0)
+        self.assertEqual(WebhookRetryScheduler.replay(now=self.now), 3)
+        replayed = WebhookDelivery.objects.filter(id__in=[d.id for d in dead])
+        self.assertEqual(set(replayed.values_list('status', 'retry_count')), {('retrying', 0)})
+        self.assertEqual(WebhookRetryScheduler.run(now=self.now), 3)
@@ -338,8 +338,8 @@ class WebhookDeliveryTest(TestCase):
         delivery = deliveries[0]
         self.assertEqual(delivery.event_type, 'organization.created')
         self.assertEqual(delivery.webhook, self.webhook)
-        self.assertIn('timestamp', delivery.payload)
-        self.assertIn('data', delivery.payload)
+        self.assertIn('timestamp', delivery.get_payload())
+        self.assertIn('data', delivery.get_payload())
 
 @pytest.mark.asyncio
 class AsyncWebhookServiceTest(TestCase):
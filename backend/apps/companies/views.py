@@ -6,8 +6,7 @@ from .models import Organization
 from .serializers import OrganizationSerializer
 from rest_framework.exceptions import PermissionDenied
 from core.throttling import (
-    BurstUserRateThrottle,
-    SustainedUserRateThrottle,
+    BurstSustainedUserRateThrottle,
     CriticalEndpointRateThrottle,
 )
 
@@ -28,7 +27,8 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    throttle_classes = [BurstUserRateThrottle, SustainedUserRateThrottle]
+    # Both rates are checked in one limiter call
+    throttle_classes = [BurstSustainedUserRateThrottle]
 
     def get_queryset(self):
         user = self.request.user
@@ -4,18 +4,14 @@ from rest_framework.response import Response
 from .models import Organization
 from .serializers import OrganizationSerializer
 from core.throttling import (
-    BurstUserRateThrottle,
-    SustainedUserRateThrottle,
+    BurstSustainedUserRateThrottle,
     CriticalEndpointRateThrottle,
 )
-from django.core.cache import cache
-from django.conf import settings
 from django.utils import timezone
 from django.db.models import Count, Q
-import hashlib
-import json
-from .services import WebhookService, AsyncWebhookService
+from .services import WebhookService, AsyncWebhookService, DomainStatistics, organization_cache
 from asgiref.sync import async_to_sync
+from core.aggregates import conditional_counts
 
 class OrganizationV2ViewSet(viewsets.ModelViewSet):
     """
@@ -31,15 +27,15 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    throttle_classes = [BurstUserRateThrottle, SustainedUserRateThrottle]
+    # Both rates are checked in one limiter call
+    throttle_classes = [BurstSustainedUserRateThrottle]
     
     def _get_cache_key(self, view_name, params=None):
-        """Generate a unique cache key based on the view name and parameters"""
-        key = f"{settings.CACHE_KEY_PREFIX}:org:{view_name}"
-        if params:
-            param_string = json.dumps(params, sort_keys=True)
-            key += ":" + hashlib.md5(param_string.encode()).hexdigest()
-        return key
+        """
+        Cache key in the current generation of the organization namespace;
+        any organization write moves every view to fresh keys
+        """
+        return organization_cache.key(view_name, params=params)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -57,7 +53,7 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """Enhanced list method with statistics and caching"""
         cache_key = self._get_cache_key('list', dict(request.query_params))
-        cached_data = cache.get(cache_key)
+        cached_data = organization_cache.get(cache_key)
 
         if cached_data:
             return Response(cached_data)
@@ -69,14 +65,10 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(page, many=True)
             data = {
                 'results': serializer.data,
-                'statistics': {
-                    'total_count': queryset.count(),
-                    'active_count': queryset.filter(is_active=True).count(),
-                    'inactive_count': queryset.filter(is_active=False).count(),
-                },
+                'statistics': self._get_activity_counts(queryset),
                 'cached_at': timezone.now().isoformat()
             }
-            cache.set(cache_key, data, timeout=settings.CACHE_TTL)
+            organization_cache.set(cache_key, data)
             return self.get_paginated_response(data)
 
         serializer = self.get_serializer(queryset, many=True)
@@ -84,13 +76,13 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
             'results': serializer.data,
             'cached_at': timezone.now().isoformat()
         }
-        cache.set(cache_key, data, timeout=settings.CACHE_TTL)
+        organization_cache.set(cache_key, data)
         return Response(data)
 
     def retrieve(self, request, *args, **kwargs):
         """Enhanced retrieve method with caching"""
         cache_key = self._get_cache_key(f'detail:{kwargs["pk"]}')
-        cached_data = cache.get(cache_key)
+        cached_data = organization_cache.get(cache_key)
 
         if cached_data:
             return Response(cached_data)
@@ -101,7 +93,7 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
             'result': serializer.data,
             'cached_at': timezone.now().isoformat()
         }
-        cache.set(cache_key, data, timeout=settings.CACHE_TTL)
+        organization_cache.set(cache_key, data)
         return Response(data)
 
     def _send_webhook(self, event_type: str, organization: Organization):
@@ -118,7 +110,6 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
         response = super().create(request, *args, **kwargs)
         if response.status_code == status.HTTP_201_CREATED:
             organization = self.get_object()
-            cache.delete(f'organization_{organization.id}')
             self._send_webhook('organization.created', organization)
         return response
 
@@ -128,7 +119,6 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
         response = super().update(request, *args, **kwargs)
         if response.status_code == status.HTTP_200_OK:
             organization = self.get_object()
-            cache.delete(f'organization_{organization.id}')
             self._send_webhook('organization.updated', organization)
             
             # Send activation/deactivation webhook if status changed
@@ -145,7 +135,6 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
         organization = self.get_object()
         response = super().destroy(request, *args, **kwargs)
         if response.status_code == status.HTTP_204_NO_CONTENT:
-            cache.delete(f'organization_{organization.id}')
             self._send_webhook('organization.deleted', organization)
         return response
 
@@ -157,7 +146,6 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
             organization.is_active = True
             organization.activated_at = timezone.now()
             organization.save()
-            cache.delete(f'organization_{organization.id}')
             self._send_webhook('organization.activated', organization)
         return Response({'status': 'activated'})
 
@@ -173,55 +161,45 @@ class OrganizationV2ViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
+        # BatchProcessor emits the organization.activated webhooks itself
         stats = BatchProcessor.bulk_activate(organization_ids)
-        
-        # Send webhooks for each activated organization
-        organizations = Organization.objects.filter(
-            id__in=organization_ids,
-            is_active=True
-        )
-        for org in organizations:
-            self._send_webhook('organization.activated', org)
-            
         return Response(stats)
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get detailed statistics with caching"""
-        cache_key = self._get_cache_key('statistics')
-        cached_data = cache.get(cache_key)
+        cache_key = self._get_cache_key('statistics', dict(self.request.query_params))
+        cached_data = organization_cache.get(cache_key)
 
         if cached_data:
             return Response(cached_data)
 
         queryset = self.get_queryset()
+        counts = self._get_activity_counts(queryset)
         data = {
-            'total_organizations': queryset.count(),
-            'active_organizations': queryset.filter(is_active=True).count(),
-            'inactive_organizations': queryset.filter(is_active=False).count(),
+            'total_organizations': counts['total_count'],
+            'active_organizations': counts['active_count'],
+            'inactive_organizations': counts['inactive_count'],
             'organizations_by_domain': self._get_organizations_by_domain(queryset),
             'timestamp': timezone.now().isoformat(),
             'cached_at': timezone.now().isoformat()
         }
         
-        cache.set(cache_key, data, timeout=settings.CACHE_TTL)
+        organization_cache.set(cache_key, data)
         return Response(data)
 
-    def _get_organizations_by_domain(self, queryset):
-        """Helper method to group organizations by domain with caching"""
-        cache_key = self._get_cache_key('domain_stats')
-        cached_data = cache.get(cache_key)
+    def _get_activity_counts(self, queryset):
+        """Total/active/inactive counts in a single aggregate query"""
+        return conditional_counts(
+            queryset,
+            total_count=None,
+            active_count=Q(is_active=True),
+            inactive_count=Q(is_active=False)
+        )
 
-        if cached_data:
-            return cached_data
-
-        domain_stats = {}
-        for org in queryset:
-            domain = org.website.split('//')[1].split('/')[0]
-            if domain in domain_stats:
-                domain_stats[domain] += 1
-            else:
-                domain_stats[domain] = 1
-
-        cache.set(cache_key, domain_stats, timeout=settings.CACHE_TTL)
-        return domain_stats 
\ No newline at end of file
+    def _get_organizations_by_domain(self, queryset):
+        """Organizations per website domain via GROUP BY"""
+        if self.request.query_params.get('name') or self.request.query_params.get('is_active') is not None:
+            return DomainStatistics.query(queryset)
+        # Unfiltered: the incrementally maintained histogram
+        return DomainStatistics.histogram()
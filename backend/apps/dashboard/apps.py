@@ -5,3 +5,6 @@ class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dashboard'
     label = 'dashboard'
+
+    def ready(self):
+        import apps.dashboard.signals
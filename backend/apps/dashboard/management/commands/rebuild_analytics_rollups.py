@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from apps.dashboard.services import AnalyticsRollupService
+
+class Command(BaseCommand):
+    help = 'Rebuilds the analytics rollup tables from the source tables'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding analytics rollups...')
+        for metric, buckets in AnalyticsRollupService.rebuild_all().items():
+            self.stdout.write(f'  {metric}: {buckets} buckets')
+        self.stdout.write(self.style.SUCCESS('Analytics rollups rebuilt'))
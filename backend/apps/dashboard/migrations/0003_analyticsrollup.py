@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=50)),
+                ('dimension', models.CharField(blank=True, max_length=100)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['metric', 'day'],
+                'indexes': [models.Index(fields=['metric', 'day'], name='dashboard_a_metric_8705d3_idx')],
+                'unique_together': {('metric', 'dimension', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+def backfill_value_count(apps, schema_editor):
+    # Keeps the previous averages until the nightly reconcile recounts buckets
+    AnalyticsRollup = apps.get_model('dashboard', 'AnalyticsRollup')
+    AnalyticsRollup.objects.update(value_count=models.F('count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_analyticsrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticsrollup',
+            name='value_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_value_count, migrations.RunPython.noop),
+    ]
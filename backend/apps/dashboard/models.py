@@ -85,3 +85,30 @@ class Activity(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.activity_type}"
+
+class AnalyticsRollup(models.Model):
+    """
+    Daily pre-aggregated counters behind the analytics endpoints.
+
+    One row per (metric, dimension, day). ``count`` is the number of source
+    rows in the bucket, ``total`` the sum of the metric's value (e.g.
+    internship duration in days) and ``value_count`` the number of rows with
+    a value, so averages skip NULLs the way ``Avg`` does.
+    """
+    metric = models.CharField(max_length=50)
+    dimension = models.CharField(max_length=100, blank=True)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    total = models.FloatField(default=0)
+    value_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['metric', 'dimension', 'day']
+        indexes = [
+            models.Index(fields=['metric', 'day']),
+        ]
+        ordering = ['metric', 'day']
+
+    def __str__(self):
+        return f"{self.metric}[{self.dimension}] {self.day}: {self.count}"
@@ -1,8 +1,15 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Count, Q
-from .models import DashboardMetric, Activity
+from django.db import transaction
+from django.db.models import Avg, Count, Q, F, Sum, Value, FloatField, DateTimeField
+from django.db.models.functions import TruncDate, TruncMonth
+from core.aggregates import conditional_counts, status_histogram
+from .models import DashboardMetric, Activity, AnalyticsRollup
 from apps.users.models import User
-from apps.internships.models import Internship
+from apps.internships.models import Internship, Evaluation as InternshipEvaluation
+from apps.reports.models import Report
+from apps.evaluations.models import Evaluation, EvaluationScore
 
 class DashboardService:
     @staticmethod
@@ -10,45 +17,140 @@ class DashboardService:
         """Update daily dashboard metrics."""
         today = timezone.now().date()
 
-        # Update student count
-        DashboardMetric.objects.update_or_create(
-            name='student_count',
-            date=today,
-            defaults={
-                'value': User.objects.filter(user_type='student').count()
-            }
+        user_counts = conditional_counts(
+            User.objects.all(),
+            students=Q(user_type='student'),
+            mentors=Q(user_type='mentor', is_active=True)
         )
-
-        # Update active internships
-        DashboardMetric.objects.update_or_create(
-            name='active_internships',
-            date=today,
-            defaults={
-                'value': Internship.objects.filter(status='active').count()
-            }
+        internship_counts = conditional_counts(
+            Internship.objects.all(),
+            total=None,
+            active=Q(status='active'),
+            completed=Q(status='completed')
         )
 
-        # Update completion rate
-        total_internships = Internship.objects.count()
-        completed_internships = Internship.objects.filter(status='completed').count()
-        completion_rate = (completed_internships / total_internships * 100) if total_internships > 0 else 0
+        total_internships = internship_counts['total']
+        completion_rate = (
+            internship_counts['completed'] / total_internships * 100
+        ) if total_internships > 0 else 0
 
-        DashboardMetric.objects.update_or_create(
-            name='completion_rate',
-            date=today,
-            defaults={
-                'value': int(completion_rate)
-            }
-        )
+        metrics = {
+            'student_count': user_counts['students'],
+            'active_internships': internship_counts['active'],
+            'completion_rate': int(completion_rate),
+            'mentor_count': user_counts['mentors'],
+        }
+        for name, value in metrics.items():
+            DashboardMetric.objects.update_or_create(
+                name=name,
+                date=today,
+                defaults={'value': value}
+            )
 
-        # Update mentor count
-        DashboardMetric.objects.update_or_create(
-            name='mentor_count',
-            date=today,
-            defaults={
-                'value': User.objects.filter(user_type='mentor', is_active=True).count()
-            }
-        )
+    @staticmethod
+    def get_teacher_overview(teacher):
+        """Status counts for the internships and reports a teacher supervises."""
+        internships = Internship.objects.filter(teacher=teacher)
+        return {
+            'internships': status_histogram(internships, 'status'),
+            'reports': status_histogram(
+                Report.objects.filter(internship__teacher=teacher), 'status'
+            ),
+            'students': internships.values('student').distinct().count(),
+        }
+
+    @staticmethod
+    def get_admin_overview():
+        """System-wide status counts, one query per model."""
+        from apps.companies.models import Organization
+
+        return {
+            'users': status_histogram(User.objects.all(), 'user_type'),
+            'internships': status_histogram(Internship.objects.all(), 'status'),
+            'reports': status_histogram(Report.objects.all(), 'status'),
+            'organizations': conditional_counts(
+                Organization.objects.all(),
+                total=None,
+                active=Q(is_active=True),
+                inactive=Q(is_active=False)
+            ),
+        }
+
+    @staticmethod
+    def get_teacher_student_stats(students=None):
+        """
+        Per-student internship, report and evaluation stats for the teacher
+        students page, for students with an approved internship. Uses a
+        constant number of queries (students, internships, one grouped Report
+        aggregate, one grouped Evaluation aggregate) and joins the results in
+        memory.
+        """
+        if students is None:
+            students = User.objects.filter(user_type='student', is_active=True)
+        students = list(students.order_by('id'))
+        student_ids = [student.id for student in students]
+
+        # Latest approved internship per student
+        internships = {}
+        for internship in Internship.objects.filter(
+            student_id__in=student_ids,
+            status='approved'
+        ).order_by('student_id', '-created_at'):
+            internships.setdefault(internship.student_id, internship)
+        students = [student for student in students if student.id in internships]
+
+        report_stats = {
+            row['student_id']: row
+            for row in Report.objects.filter(student_id__in=student_ids).order_by().values(
+                'student_id'
+            ).annotate(
+                total=Count('id'),
+                approved=Count('id', filter=Q(status='approved')),
+                pending=Count('id', filter=Q(status='pending')),
+                rejected=Count('id', filter=Q(status='rejected'))
+            )
+        }
+
+        evaluation_stats = {
+            row['internship_id']: row
+            for row in Evaluation.objects.filter(
+                internship_id__in=[internship.id for internship in internships.values()]
+            ).order_by().values('internship_id').annotate(
+                count=Count('id', distinct=True),
+                average_score=Avg('scores__score')
+            )
+        }
+
+        results = []
+        for student in students:
+            internship = internships[student.id]
+            reports = report_stats.get(student.id, {})
+            evaluations = evaluation_stats.get(internship.id, {})
+            average_score = evaluations.get('average_score')
+            results.append({
+                'id': student.id,
+                'username': student.username,
+                'full_name': student.get_full_name(),
+                'email': student.email,
+                'internship': {
+                    'id': internship.id,
+                    'title': internship.title,
+                    'status': internship.status,
+                    'start_date': internship.start_date,
+                    'end_date': internship.end_date,
+                },
+                'reports': {
+                    'total': reports.get('total', 0),
+                    'approved': reports.get('approved', 0),
+                    'pending': reports.get('pending', 0),
+                    'rejected': reports.get('rejected', 0),
+                },
+                'evaluations': {
+                    'count': evaluations.get('count', 0),
+                    'average_score': round(float(average_score), 2) if average_score is not None else None,
+                },
+            })
+        return results
 
     @staticmethod
     def log_activity(user, activity_type, description):
@@ -63,25 +165,238 @@ class DashboardService:
     def get_user_stats(user):
         """Get statistics for a specific user."""
         if user.user_type == 'student':
+            counts = conditional_counts(
+                Internship.objects.filter(student=user),
+                internships=None,
+                completed_internships=Q(status='completed')
+            )
             return {
-                'internships': Internship.objects.filter(student=user).count(),
+                'internships': counts['internships'],
                 'active_internship': Internship.objects.filter(
                     student=user,
                     status='active'
                 ).first(),
-                'completed_internships': Internship.objects.filter(
-                    student=user,
-                    status='completed'
-                ).count()
+                'completed_internships': counts['completed_internships']
             }
         elif user.user_type == 'mentor':
-            return {
-                'mentored_students': Internship.objects.filter(
-                    mentor=user
-                ).values('student').distinct().count(),
-                'active_internships': Internship.objects.filter(
-                    mentor=user,
-                    status='active'
-                ).count()
-            }
-        return {} 
\ No newline at end of file
+            return Internship.objects.filter(mentor=user).aggregate(
+                mentored_students=Count('student', distinct=True),
+                active_internships=Count('pk', filter=Q(status='active'))
+            )
+        return {}
+
+class RollupSpec:
+    """Describes how one analytics metric is bucketed into AnalyticsRollup rows."""
+
+    def __init__(self, metric, model, date_field, dimension, value=None, filters=None):
+        self.metric = metric
+        self.model = model
+        self.date_field = date_field
+        self.dimension = dimension
+        self.value = value
+        self.filters = filters
+
+    def _date_model_field(self):
+        model = self.model
+        parts = self.date_field.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(parts[-1])
+
+    def day_expression(self):
+        if isinstance(self._date_model_field(), DateTimeField):
+            return TruncDate(self.date_field)
+        return F(self.date_field)
+
+    def source_field(self):
+        """The field of ``model`` itself that ``date_field`` starts from"""
+        return self.model._meta.get_field(self.date_field.split('__')[0])
+
+    @staticmethod
+    def as_day(value):
+        if isinstance(value, datetime):
+            return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+        return value
+
+    def day_of(self, instance):
+        """Return the bucket day for a model instance (None if unset)"""
+        value = instance
+        for part in self.date_field.split('__'):
+            value = getattr(value, part, None)
+            if value is None:
+                return None
+        return self.as_day(value)
+
+    def day_range(self, days):
+        """
+        Lookups selecting the raw date column from the first to the last of
+        ``days``, so an index on it can be used
+        """
+        first, last = min(days), max(days) + timedelta(days=1)
+        if isinstance(self._date_model_field(), DateTimeField):
+            first, last = datetime.combine(first, time.min), datetime.combine(last, time.min)
+            if settings.USE_TZ:
+                first, last = timezone.make_aware(first), timezone.make_aware(last)
+        return {f'{self.date_field}__gte': first, f'{self.date_field}__lt': last}
+
+
+ROLLUP_SPECS = [
+    RollupSpec('users.by_type', User, 'date_joined', 'user_type'),
+    RollupSpec(
+        'internships.by_status', Internship, 'start_date', 'status',
+        value=F('end_date') - F('start_date')
+    ),
+    RollupSpec('reports.by_status', Report, 'created_at', 'status'),
+    RollupSpec('reports.by_type', Report, 'created_at', 'report_type'),
+    RollupSpec(
+        'reports.review_time', Report, 'created_at', 'status',
+        value=F('review_date') - F('submission_date'),
+        filters=Q(
+            status__in=['approved', 'rejected'],
+            review_date__isnull=False,
+            submission_date__isnull=False
+        )
+    ),
+    RollupSpec('evaluations.by_type', InternshipEvaluation, 'created_at', 'evaluator_type'),
+    RollupSpec('evaluations.scores', EvaluationScore, 'evaluation__date', 'criteria__name', value=F('score')),
+]
+
+
+class AnalyticsRollupService:
+    """
+    Maintains and reads the AnalyticsRollup fact table.
+
+    Buckets are recomputed per (metric, day) from model save/delete signals
+    (see signals.py) and fully rebuilt by the nightly reconcile task, so the
+    analytics endpoints only ever scan O(buckets) rows.
+    """
+
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def get_spec(metric):
+        for spec in ROLLUP_SPECS:
+            if spec.metric == metric:
+                return spec
+        raise KeyError(metric)
+
+    @staticmethod
+    def specs_for_model(model):
+        return [spec for spec in ROLLUP_SPECS if spec.model is model]
+
+    @staticmethod
+    def _as_number(value):
+        if value is None:
+            return 0
+        if isinstance(value, timedelta):
+            return value.total_seconds() / 86400
+        return float(value)
+
+    @classmethod
+    def _aggregate(cls, spec, days=None):
+        queryset = spec.model.objects.all()
+        if spec.filters is not None:
+            queryset = queryset.filter(spec.filters)
+        if days is not None:
+            # Range on the raw column; rows of days in between that were not
+            # asked for are dropped by refresh()
+            queryset = queryset.filter(**spec.day_range(days))
+        queryset = queryset.annotate(rollup_day=spec.day_expression())
+
+        if spec.value is not None:
+            total, value_count = Sum(spec.value), Count(spec.value)
+        else:
+            total, value_count = Value(0, output_field=FloatField()), Value(0)
+        return queryset.order_by().values('rollup_day', spec.dimension).annotate(
+            rollup_count=Count('pk'),
+            rollup_total=total,
+            rollup_value_count=value_count
+        )
+
+    @classmethod
+    def refresh(cls, spec, days=None):
+        """
+        Recompute the buckets of one metric.
+        With ``days`` only those buckets are touched, otherwise the whole
+        metric is rebuilt.
+        """
+        if days is not None:
+            days = {day for day in days if day is not None}
+            if not days:
+                return 0
+
+        rollups = [
+            AnalyticsRollup(
+                metric=spec.metric,
+                dimension=row[spec.dimension] or '',
+                day=row['rollup_day'],
+                count=row['rollup_count'],
+                total=cls._as_number(row['rollup_total']),
+                value_count=row['rollup_value_count']
+            )
+            for row in cls._aggregate(spec, days)
+            if row['rollup_day'] is not None
+            and (days is None or row['rollup_day'] in days)
+        ]
+
+        with transaction.atomic():
+            stale = AnalyticsRollup.objects.filter(metric=spec.metric)
+            if days is not None:
+                stale = stale.filter(day__in=days)
+            stale.delete()
+            AnalyticsRollup.objects.bulk_create(rollups, batch_size=cls.BATCH_SIZE)
+        return len(rollups)
+
+    @classmethod
+    def rebuild_all(cls):
+        """Rebuild every metric from the source tables"""
+        return {spec.metric: cls.refresh(spec) for spec in ROLLUP_SPECS}
+
+    @staticmethod
+    def histogram(metric):
+        """Return {dimension: count} summed over all buckets"""
+        rows = AnalyticsRollup.objects.filter(metric=metric).values('dimension').annotate(
+            count=Sum('count')
+        ).order_by()
+        return {row['dimension']: row['count'] for row in rows}
+
+    @staticmethod
+    def averages(metric):
+        """Return {dimension: total / value_count} summed over all buckets"""
+        rows = AnalyticsRollup.objects.filter(metric=metric).values('dimension').annotate(
+            value_count=Sum('value_count'),
+            total=Sum('total')
+        ).order_by()
+        return {
+            row['dimension']: row['total'] / row['value_count']
+            for row in rows
+            if row['value_count']
+        }
+
+    @staticmethod
+    def monthly(metric):
+        """Return [{'month': date, 'count': n}] ordered by month"""
+        return list(
+            AnalyticsRollup.objects.filter(metric=metric).annotate(
+                month=TruncMonth('day')
+            ).values('month').annotate(
+                count=Sum('count')
+            ).order_by('month')
+        )
+
+    @staticmethod
+    def totals(metric):
+        """Return the overall count, total and average of a metric"""
+        totals = AnalyticsRollup.objects.filter(metric=metric).aggregate(
+            count=Sum('count'),
+            value_count=Sum('value_count'),
+            total=Sum('total')
+        )
+        value_count = totals['value_count'] or 0
+        total = totals['total'] or 0
+        return {
+            'count': totals['count'] or 0,
+            'total': total,
+            'average': total / value_count if value_count else 0
+        }
+
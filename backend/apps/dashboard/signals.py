@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from .services import AnalyticsRollupService, ROLLUP_SPECS
+
+
+def _affected_specs(sender, update_fields):
+    """Specs whose buckets can change given the fields being saved"""
+    specs = AnalyticsRollupService.specs_for_model(sender)
+    if not update_fields:
+        return specs
+    return [
+        spec for spec in specs
+        if spec.value is not None
+        or spec.date_field.split('__')[0] in update_fields
+        or spec.dimension.split('__')[0] in update_fields
+    ]
+
+
+def _snapshot_days(sender, instance, **kwargs):
+    """Keep the loaded values the bucket days derive from (no query)"""
+    instance._rollup_loaded = {
+        spec.metric: instance.__dict__.get(spec.source_field().attname, DEFERRED)
+        for spec in AnalyticsRollupService.specs_for_model(sender)
+    }
+
+
+def _previous_day(spec, instance, loaded):
+    field = spec.source_field()
+    if '__' not in spec.date_field:
+        return spec.as_day(loaded)
+    if loaded == getattr(instance, field.attname):
+        # Same related row, so the same day
+        return spec.day_of(instance)
+    if loaded is None:
+        return None
+    rest = spec.date_field.split('__', 1)[1]
+    value = field.related_model.objects.filter(pk=loaded).values_list(rest, flat=True).first()
+    return spec.as_day(value)
+
+
+def _stash_previous_days(sender, instance, **kwargs):
+    """Remember the bucket days of the stored row so a moved row is decremented"""
+    if instance._state.adding or instance.pk is None:
+        return
+    specs = _affected_specs(sender, kwargs.get('update_fields'))
+    if not specs:
+        return
+    loaded = getattr(instance, '_rollup_loaded', {})
+    if any(loaded.get(spec.metric, DEFERRED) is DEFERRED for spec in specs):
+        # Deferred or never loaded: read the stored row
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is None:
+            return
+        instance._rollup_previous_days = {spec.metric: spec.day_of(previous) for spec in specs}
+        return
+    instance._rollup_previous_days = {
+        spec.metric: _previous_day(spec, instance, loaded[spec.metric])
+        for spec in specs
+    }
+
+
+def _refresh_rollups(sender, instance, **kwargs):
+    """Recompute the affected day buckets once the write is committed"""
+    previous_days = getattr(instance, '_rollup_previous_days', {})
+    for spec in _affected_specs(sender, kwargs.get('update_fields')):
+        days = {spec.day_of(instance), previous_days.get(spec.metric)}
+        transaction.on_commit(
+            lambda spec=spec, days=days: AnalyticsRollupService.refresh(spec, days)
+        )
+    # The saved values are what the next save moves away from
+    _snapshot_days(sender, instance)
+
+
+for model in {spec.model for spec in ROLLUP_SPECS}:
+    post_init.connect(_snapshot_days, sender=model, dispatch_uid=f'rollup_post_init_{model._meta.label}')
+    pre_save.connect(_stash_previous_days, sender=model, dispatch_uid=f'rollup_pre_save_{model._meta.label}')
+    post_save.connect(_refresh_rollups, sender=model, dispatch_uid=f'rollup_post_save_{model._meta.label}')
+    post_delete.connect(_refresh_rollups, sender=model, dispatch_uid=f'rollup_post_delete_{model._meta.label}')
@@ -0,0 +1,12 @@
+from celery import shared_task
+from .services import AnalyticsRollupService
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def reconcile_analytics_rollups():
+    """Rebuild the analytics rollup tables from the source tables"""
+    rebuilt = AnalyticsRollupService.rebuild_all()
+    logger.info(f"Analytics rollups reconciled: {rebuilt}")
+    return rebuilt
@@ -1,3 +1,239 @@
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F, Q
+from django.contrib.auth import get_user_model
+from apps.internships.models import Internship
+from apps.reports.models import Report
+from apps.evaluations.models import Evaluation, EvaluationCriteria, EvaluationScore
+from core.aggregates import conditional_counts, status_histogram
+from .models import AnalyticsRollup, DashboardMetric
+from .services import AnalyticsRollupService, DashboardService, RollupSpec
 
-# Create your tests here.
+User = get_user_model()
+
+class AnalyticsRollupTest(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123',
+            user_type='student'
+        )
+
+    def _create_internship(self, status='pending', start=date(2024, 1, 10), end=date(2024, 1, 20)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Internship.objects.create(
+                student=self.student,
+                title='Test Internship',
+                description='Test Description',
+                start_date=start,
+                end_date=end,
+                status=status
+            )
+
+    def test_save_updates_buckets(self):
+        """Test rollups follow internship create, update and delete"""
+        internship = self._create_internship()
+        self._create_internship(status='approved', start=date(2024, 2, 1), end=date(2024, 2, 21))
+
+        self.assertEqual(
+            AnalyticsRollupService.histogram('internships.by_status'),
+            {'pending': 1, 'approved': 1}
+        )
+        self.assertEqual(AnalyticsRollupService.totals('internships.by_status')['average'], 15)
+
+        internship.status = 'approved'
+        internship.start_date = date(2024, 2, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            internship.save()
+        self.assertEqual(AnalyticsRollupService.histogram('internships.by_status'), {'approved': 2})
+        self.assertFalse(AnalyticsRollup.objects.filter(day=date(2024, 1, 10)).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            internship.delete()
+        self.assertEqual(AnalyticsRollupService.histogram('internships.by_status'), {'approved': 1})
+
+    def test_averages_skip_null_values(self):
+        """Test rollup averages divide by the rows with a value, like Avg"""
+        internship = self._create_internship()
+        for review_date in (None, datetime(2024, 1, 4, tzinfo=dt_timezone.utc)):
+            Report.objects.create(
+                title='Weekly',
+                content='Content',
+                student=self.student,
+                internship=internship,
+                report_type='weekly',
+                status='pending',
+                submission_date=datetime(2024, 1, 2, tzinfo=dt_timezone.utc),
+                review_date=review_date
+            )
+        spec = RollupSpec(
+            'reports.test_review_time', Report, 'created_at', 'status',
+            value=F('review_date') - F('submission_date')
+        )
+        AnalyticsRollupService.refresh(spec)
+
+        self.assertEqual(AnalyticsRollupService.averages(spec.metric), {'pending': 2})
+        self.assertEqual(
+            AnalyticsRollupService.totals(spec.metric),
+            {'count': 2, 'total': 2, 'average': 2}
+        )
+
+    def test_save_does_not_reload_the_row(self):
+        """Test the previous bucket days come from the loaded values"""
+        self._create_internship()
+        internship = Internship.objects.get()
+        internship.start_date = date(2024, 2, 1)
+        with CaptureQueriesContext(connection) as queries:
+            internship.save()
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(selects, [])
+        self.assertEqual(internship._rollup_previous_days['internships.by_status'], date(2024, 1, 10))
+
+    def test_refresh_scans_a_date_range(self):
+        """Test a partial refresh filters the raw column and keeps to its days"""
+        for day in (10, 15, 20):
+            self._create_internship(start=date(2024, 1, day), end=date(2024, 1, 25))
+        AnalyticsRollup.objects.all().delete()
+        spec = AnalyticsRollupService.get_spec('internships.by_status')
+
+        with CaptureQueriesContext(connection) as queries:
+            AnalyticsRollupService.refresh(spec, {date(2024, 1, 10), date(2024, 1, 20)})
+        self.assertIn('"start_date" >=', queries[0]['sql'])
+        self.assertEqual(
+            sorted(AnalyticsRollup.objects.values_list('day', flat=True)),
+            [date(2024, 1, 10), date(2024, 1, 20)]
+        )
+
+    def test_monthly_series(self):
+        """Test monthly series is summed from daily buckets"""
+        self._create_internship(start=date(2024, 1, 5))
+        self._create_internship(start=date(2024, 1, 25), end=date(2024, 2, 5))
+        self._create_internship(start=date(2024, 3, 1), end=date(2024, 3, 10))
+
+        months = [
+            (item['month'].strftime('%Y-%m'), item['count'])
+            for item in AnalyticsRollupService.monthly('internships.by_status')
+        ]
+        self.assertEqual(months, [('2024-01', 2), ('2024-03', 1)])
+
+    def test_rebuild_matches_source(self):
+        """Test reconcile rebuilds rollups missed by bulk updates"""
+        self._create_internship()
+        self._create_internship()
+        Internship.objects.update(status='completed')
+
+        AnalyticsRollupService.rebuild_all()
+        self.assertEqual(AnalyticsRollupService.histogram('internships.by_status'), {'completed': 2})
+        self.assertEqual(AnalyticsRollupService.histogram('users.by_type'), {'student': 1})
+
+class StatusHistogramTest(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        for status in ['pending', 'pending', 'approved', 'completed']:
+            Internship.objects.create(
+                student=self.student,
+                title='Test Internship',
+                description='Test Description',
+                start_date=date(2024, 1, 1),
+                end_date=date(2024, 3, 1),
+                status=status
+            )
+
+    def test_histogram_uses_single_query(self):
+        """Test every choice is counted, zero-filled, in one query"""
+        with self.assertNumQueries(1):
+            histogram = status_histogram(Internship.objects.all(), 'status')
+        self.assertEqual(histogram, {
+            'pending': 2, 'approved': 1, 'rejected': 0,
+            'completed': 1, 'cancelled': 0, 'total': 4
+        })
+
+    def test_histogram_without_choices(self):
+        """Test fields without choices fall back to a single GROUP BY"""
+        with self.assertNumQueries(1):
+            histogram = status_histogram(Internship.objects.all(), 'title', total_key=None)
+        self.assertEqual(histogram, {'Test Internship': 4})
+
+    def test_conditional_counts(self):
+        counts = conditional_counts(
+            Internship.objects.all(),
+            total=None,
+            open=Q(status__in=['pending', 'approved'])
+        )
+        self.assertEqual(counts, {'total': 4, 'open': 3})
+
+    def test_update_metrics(self):
+        """Test daily metrics are written from the aggregated counts"""
+        DashboardService.update_metrics()
+        metrics = dict(DashboardMetric.objects.values_list('name', 'value'))
+        self.assertEqual(metrics['student_count'], 1)
+        self.assertEqual(metrics['completion_rate'], 25)
+
+class TeacherStudentStatsTest(TestCase):
+    def _create_student(self, index, internship_status='approved'):
+        student = User.objects.create_user(
+            username=f'student{index}',
+            password='testpass123',
+            user_type='student'
+        )
+        internship = Internship.objects.create(
+            student=student,
+            title=f'Internship {index}',
+            description='Test Description',
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 1),
+            status=internship_status
+        )
+        for status in ['approved', 'pending', 'rejected']:
+            Report.objects.create(
+                title='Weekly',
+                content='Content',
+                student=student,
+                internship=internship,
+                report_type='weekly',
+                status=status
+            )
+        evaluation = Evaluation.objects.create(
+            internship=internship,
+            evaluator=self.teacher,
+            evaluated_student=student
+        )
+        EvaluationScore.objects.create(evaluation=evaluation, criteria=self.criteria, score=8)
+        return student
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='teacher',
+            password='testpass123',
+            user_type='teacher'
+        )
+        self.criteria = EvaluationCriteria.objects.create(
+            name='Performance',
+            category='technical',
+            description='Overall performance'
+        )
+        self._create_student(0)
+
+    def test_stats_are_joined_per_student(self):
+        stats = DashboardService.get_teacher_student_stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['internship']['title'], 'Internship 0')
+        self.assertEqual(stats[0]['reports'], {'total': 3, 'approved': 1, 'pending': 1, 'rejected': 1})
+        self.assertEqual(stats[0]['evaluations'], {'count': 1, 'average_score': 8.0})
+
+    def test_query_count_is_constant(self):
+        """Test the query count does not grow with class size"""
+        with self.assertNumQueries(4):
+            DashboardService.get_teacher_student_stats()
+
+        for index in range(1, 6):
+            self._create_student(index)
+        User.objects.create_user(username='no_internship', password='testpass123', user_type='student')
+        self._create_student(6, internship_status='pending')
+
+        with self.assertNumQueries(4):
+            stats = DashboardService.get_teacher_student_stats()
+        # Only students with an approved internship are listed
+        self.assertEqual([row['username'] for row in stats], [f'student{index}' for index in range(6)])
@@ -9,7 +9,7 @@ def handle_evaluation_status_change(sender, instance, created, **kwargs):
     try:
         if created:
             # Notify student about new evaluation
-            NotificationService.create_notification(
+            NotificationService.notify(
                 recipient=instance.student,
                 title='New Evaluation Created',
                 message=f'A new {instance.get_evaluation_type_display()} has been created for you.',
@@ -18,14 +18,14 @@ def handle_evaluation_status_change(sender, instance, created, **kwargs):
         else:
             # Notify relevant parties about status changes
             if instance.status == 'completed':
-                NotificationService.create_notification(
+                NotificationService.notify(
                     recipient=instance.student,
                     title='Evaluation Completed',
                     message=f'Your {instance.get_evaluation_type_display()} has been completed.',
                     notification_type='evaluation'
                 )
             elif instance.status == 'reviewed':
-                NotificationService.create_notification(
+                NotificationService.notify(
                     recipient=instance.evaluator,
                     title='Evaluation Reviewed',
                     message=f'The {instance.get_evaluation_type_display()} has been reviewed.',
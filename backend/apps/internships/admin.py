@@ -56,11 +56,12 @@ class InternshipApplicationAdmin(admin.ModelAdmin):
     
 @admin.register(InternshipListing)
 class InternshipListingAdmin(admin.ModelAdmin):
-    list_display = ('id', 'organization', 'position', 'category', 'type', 'location', 'featured', 'active', 'applyDeadline')
+    list_display = ('id', 'organization', 'position', 'category', 'type', 'location', 'featured', 'active', 'applyDeadline', 'applications_count', 'bookmark_count')
     list_filter = ('category', 'type', 'featured', 'active', 'postedDate')
     search_fields = ('organization', 'position', 'description')
     list_editable = ('featured', 'active')
     date_hierarchy = 'postedDate'
+    readonly_fields = ('applications_count', 'bookmark_count')
     fieldsets = (
         ('Үндсэн мэдээлэл', {
             'fields': ('organization', 'position', 'category', 'type', 'location', 'duration')
@@ -72,7 +73,7 @@ class InternshipListingAdmin(admin.ModelAdmin):
             'fields': ('salary', 'salary_amount')
         }),
         ('Тохиргоо', {
-            'fields': ('logo', 'featured', 'active', 'applyDeadline')
+            'fields': ('logo', 'featured', 'active', 'applyDeadline', 'applications_count', 'bookmark_count')
         }),
         ('Холбоо барих', {
             'fields': ('contact_person',)
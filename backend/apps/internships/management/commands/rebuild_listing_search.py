@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.internships.search import ListingSearchService
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search vectors of internship listings'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding listing search index...')
+        ListingSearchService.rebuild()
+        self.stdout.write(self.style.SUCCESS('Listing search index rebuilt'))
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    InternshipListing = apps.get_model('internships', 'InternshipListing')
+    InternshipApplication = apps.get_model('internships', 'InternshipApplication')
+
+    counts = InternshipApplication.objects.filter(
+        internship_listing__isnull=False
+    ).values('internship_listing').annotate(total=models.Count('id')).order_by()
+    for row in counts:
+        InternshipListing.objects.filter(pk=row['internship_listing']).update(
+            applications_count=row['total']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('internships', '0003_teacherevaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='internshiplisting',
+            name='applications_count',
+            field=models.PositiveIntegerField(default=0, help_text='Ирсэн хүсэлтийн тоо'),
+        ),
+        migrations.AddField(
+            model_name='internshiplisting',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0, help_text='Хадгалсан хэрэглэгчийн тоо'),
+        ),
+        migrations.CreateModel(
+            name='ListingBookmark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookmarks', to='internships.internshiplisting')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listing_bookmarks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('user', 'listing')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:31
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS internship_listing_search_idx '
+        'ON internships_internshiplisting USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS internship_listing_position_trgm_idx '
+        'ON internships_internshiplisting USING gin (position gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS internship_listing_organization_trgm_idx '
+        'ON internships_internshiplisting USING gin (organization gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        "UPDATE internships_internshiplisting SET search_vector = "
+        "setweight(to_tsvector('simple', coalesce(position, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(organization, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(requirements::text, '')), 'C') || "
+        "setweight(to_tsvector('simple', coalesce(benefits::text, '')), 'D')"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS internship_listing_search_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS internship_listing_position_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS internship_listing_organization_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internships', '0004_listing_counters'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='internshiplisting',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
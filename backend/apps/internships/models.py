@@ -6,6 +6,7 @@ from apps.companies.models import Organization
 # Comment out GeoDjango import
 # from django.contrib.gis.db import models as gis_models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
@@ -371,13 +372,27 @@ class InternshipApplication(models.Model):
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.internship.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save() and the counter signals compare against the loaded
+        # values without reading the row again
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        if 'internship_listing_id' in field_names:
+            instance._loaded_listing_id = instance.internship_listing_id
+        return instance
+
     def save(self, *args, **kwargs):
         # If status is being changed to accepted/rejected, set reviewed_at
         if self.pk:
-            old_instance = InternshipApplication.objects.get(pk=self.pk)
-            if old_instance.status != self.status and self.status in ['accepted', 'rejected']:
+            old_status = getattr(self, '_loaded_status', None)
+            if old_status is None:
+                old_status = InternshipApplication.objects.get(pk=self.pk).status
+            if old_status != self.status and self.status in ['accepted', 'rejected']:
                 self.reviewed_at = timezone.now()
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
 class InternshipListing(models.Model):
     """
@@ -430,6 +445,13 @@ class InternshipListing(models.Model):
         blank=True,
         help_text="Холбоо барих хүн"
     )
+
+    # Denormalized counters, maintained by signals in signals.py
+    applications_count = models.PositiveIntegerField(default=0, help_text="Ирсэн хүсэлтийн тоо")
+    bookmark_count = models.PositiveIntegerField(default=0, help_text="Хадгалсан хэрэглэгчийн тоо")
+
+    # Full-text search document, maintained by signals (see search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -442,6 +464,29 @@ class InternshipListing(models.Model):
         verbose_name = "Дадлагын Зар"
         verbose_name_plural = "Дадлагын Зарууд"
 
+class ListingBookmark(models.Model):
+    """
+    Хэрэглэгчийн хадгалсан дадлагын зар
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='listing_bookmarks'
+    )
+    listing = models.ForeignKey(
+        InternshipListing,
+        on_delete=models.CASCADE,
+        related_name='bookmarks'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'listing']
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user} - {self.listing}"
+
 class TeacherEvaluation(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='teacher_evaluations')
     teacher = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_teacher_evaluations')
@@ -0,0 +1,212 @@
+"""
+Full-text search for internship listings.
+
+On PostgreSQL listings carry a ``search_vector`` column (GIN indexed, kept
+current on save) that is queried with ranked full-text search, falling back
+to trigram similarity when nothing matches so typos still find results.
+Other databases (SQLite in tests) use an in-process inverted index with the
+same ranking weights and a fuzzy vocabulary fallback.
+
+The ``simple`` text search configuration is used because PostgreSQL ships no
+Mongolian dictionary: it lowercases Cyrillic tokens without stemming, which is
+what the in-process tokenizer does as well.
+"""
+import difflib
+import re
+import threading
+from collections import defaultdict
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, TextField
+from django.db.models.functions import Cast, Greatest
+from rest_framework.filters import BaseFilterBackend
+from .models import InternshipListing
+
+SEARCH_CONFIG = 'simple'
+
+# Field weights, highest first (PostgreSQL weights A-D)
+SEARCH_FIELDS = [
+    ('position', 'A'),
+    ('organization', 'A'),
+    ('description', 'B'),
+    ('requirements', 'C'),
+    ('benefits', 'D'),
+]
+WEIGHT_SCORES = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+JSON_FIELDS = {'requirements', 'benefits'}
+
+TRIGRAM_THRESHOLD = 0.3
+FUZZY_CUTOFF = 0.75
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into casefolded word tokens (Cyrillic and Latin alike)"""
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(item) for item in text)
+    return [token.casefold() for token in TOKEN_RE.findall(str(text))]
+
+
+def uses_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def build_search_vector():
+    """SearchVector expression covering every searchable listing field"""
+    from django.contrib.postgres.search import SearchVector
+
+    vector = None
+    for field, weight in SEARCH_FIELDS:
+        source = Cast(field, TextField()) if field in JSON_FIELDS else field
+        part = SearchVector(source, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+class InvertedIndex:
+    """
+    In-process inverted index used when PostgreSQL full-text search is not
+    available. Built lazily from the listings table and dropped whenever a
+    listing is saved or deleted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        fields = ['id'] + [field for field, _weight in SEARCH_FIELDS]
+        for row in InternshipListing.objects.values(*fields).iterator():
+            for field, weight in SEARCH_FIELDS:
+                for token in tokenize(row[field]):
+                    postings[token][row['id']] += WEIGHT_SCORES[weight]
+        return postings
+
+    def postings(self):
+        with self._lock:
+            if self._postings is None:
+                self._postings = self._build()
+            return self._postings
+
+    def search(self, query):
+        """Return [(listing_id, score)] best first"""
+        postings = self.postings()
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores = self._score(postings, terms)
+        if not scores:
+            # Typo tolerance: retry with the closest known tokens
+            vocabulary = list(postings.keys())
+            corrected = []
+            for term in terms:
+                corrected.extend(
+                    difflib.get_close_matches(term, vocabulary, n=3, cutoff=FUZZY_CUTOFF)
+                )
+            scores = self._score(postings, corrected, require_all=False)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _score(self, postings, terms, require_all=True):
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in set(terms):
+            for listing_id, score in postings.get(term, {}).items():
+                scores[listing_id] += score
+                matched[listing_id] += 1
+        if require_all:
+            needed = len(set(terms))
+            scores = {
+                listing_id: score
+                for listing_id, score in scores.items()
+                if matched[listing_id] == needed
+            }
+        return dict(scores)
+
+
+inverted_index = InvertedIndex()
+
+
+class ListingSearchService:
+    @staticmethod
+    def update_search_vector(listing_ids):
+        """Refresh the stored search vector for the given listings"""
+        if uses_postgres_search():
+            InternshipListing.objects.filter(pk__in=listing_ids).update(
+                search_vector=build_search_vector()
+            )
+        else:
+            inverted_index.invalidate()
+
+    @staticmethod
+    def rebuild():
+        """Recompute the search vector (or index) for every listing"""
+        if uses_postgres_search():
+            InternshipListing.objects.update(search_vector=build_search_vector())
+        else:
+            inverted_index.invalidate()
+
+    @classmethod
+    def search(cls, query, queryset=None):
+        """Return ``queryset`` filtered to listings matching ``query``, best match first"""
+        if queryset is None:
+            queryset = InternshipListing.objects.all()
+        if not tokenize(query):
+            return queryset
+        if uses_postgres_search():
+            return cls._postgres_search(query, queryset)
+        return cls._index_search(query, queryset)
+
+    @staticmethod
+    def _postgres_search(query, queryset):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        ranked = queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank('search_vector', search_query)
+        ).order_by('-rank', 'id')
+        if ranked.exists():
+            return ranked
+
+        return queryset.annotate(
+            rank=Greatest(
+                TrigramSimilarity('position', query),
+                TrigramSimilarity('organization', query)
+            )
+        ).filter(rank__gte=TRIGRAM_THRESHOLD).order_by('-rank', 'id')
+
+    @staticmethod
+    def _index_search(query, queryset):
+        ranked_ids = [listing_id for listing_id, _score in inverted_index.search(query)]
+        if not ranked_ids:
+            return queryset.none()
+        ordering = Case(
+            *[When(pk=listing_id, then=Value(position)) for position, listing_id in enumerate(ranked_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(pk__in=ranked_ids).annotate(
+            search_position=ordering
+        ).order_by('search_position')
+
+
+class ListingSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for DRF's SearchFilter on InternshipListingViewSet:
+    reads the same ``?search=`` parameter but uses ListingSearchService and
+    keeps the relevance ordering.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return ListingSearchService.search(query, queryset)
@@ -3,12 +3,14 @@ from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from .models import Agreement, InternshipPlan, Internship
+from .models import Agreement, InternshipPlan, Internship, InternshipListing, ListingBookmark
 from apps.notifications.services import NotificationService
 from docx import Document
 
@@ -155,7 +157,7 @@ class AgreementService:
             agreement.sign(user_type)
             
             # Create notification
-            NotificationService.create_notification(
+            NotificationService.notify(
                 recipient=agreement.student,
                 title='Agreement Update',
                 message=f'Agreement signed by {user_type}',
@@ -170,7 +172,7 @@ class AgreementService:
                 )
                 
                 # Notify relevant parties
-                NotificationService.create_bulk_notifications([
+                NotificationService.queue([
                     {
                         'recipient': agreement.student,
                         'title': 'Agreement Approved',
@@ -188,6 +190,60 @@ class AgreementService:
             print(f"Error processing signature: {str(e)}")
             return False
 
+class ListingService:
+    @staticmethod
+    def get_bookmarked_ids(user):
+        """
+        IDs of the listings a user has bookmarked, fetched once per request and
+        passed to InternshipListingSerializer as ``context['bookmarked_ids']``.
+        """
+        if not user or not user.is_authenticated:
+            return set()
+        return set(
+            ListingBookmark.objects.filter(user=user).values_list('listing_id', flat=True)
+        )
+
+    @staticmethod
+    def bookmark(user, listing):
+        """Bookmark a listing, returns False if it was already bookmarked"""
+        try:
+            with transaction.atomic():
+                ListingBookmark.objects.create(user=user, listing=listing)
+            return True
+        except IntegrityError:
+            return False
+
+    @staticmethod
+    def remove_bookmark(user, listing):
+        """Remove a bookmark, returns False if there was none"""
+        with transaction.atomic():
+            bookmarks = list(ListingBookmark.objects.filter(user=user, listing=listing))
+            for bookmark in bookmarks:
+                bookmark.delete()
+        return bool(bookmarks)
+
+    @staticmethod
+    def recount(listings=None):
+        """Recompute the denormalized counters from the source tables"""
+        if listings is None:
+            listings = InternshipListing.objects.all()
+        listings = listings.annotate(
+            actual_applications=Count('applications', distinct=True),
+            actual_bookmarks=Count('bookmarks', distinct=True)
+        )
+        updated = []
+        for listing in listings:
+            if (listing.applications_count, listing.bookmark_count) != (
+                listing.actual_applications, listing.actual_bookmarks
+            ):
+                listing.applications_count = listing.actual_applications
+                listing.bookmark_count = listing.actual_bookmarks
+                updated.append(listing)
+        InternshipListing.objects.bulk_update(
+            updated, ['applications_count', 'bookmark_count'], batch_size=500
+        )
+        return len(updated)
+
 class InternshipPlanService:
     @staticmethod
     def generate_plan_template(internship):
@@ -257,7 +313,7 @@ class InternshipPlanService:
         plan.save()
 
         # Notify student
-        NotificationService.create_notification(
+        NotificationService.notify(
             recipient=plan.internship.student,
             title=f'Plan {status.title()}',
             message=f'Your internship plan has been {status}. {feedback if feedback else ""}',
@@ -1,8 +1,11 @@
+from django.db.models import F
 from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
-from .models import Internship, Task, Evaluation, Report
+from .models import (
+    Internship, Task, Evaluation, Report,
+    InternshipApplication, InternshipListing, ListingBookmark
+)
 from apps.notifications.services import NotificationService
-from apps.notifications.models import Notification
 
 @receiver(post_save, sender=Internship)
 def internship_notification(sender, instance, created, **kwargs):
@@ -10,7 +13,7 @@ def internship_notification(sender, instance, created, **kwargs):
     try:
         if created:
             # Notify student
-            Notification.objects.create(
+            NotificationService.notify(
                 recipient=instance.student,
                 title='Дадлага бүртгэгдлээ',
                 message=f'Таны {instance.organization.name} дээрх дадлага амжилттай бүртгэгдлээ.',
@@ -19,7 +22,7 @@ def internship_notification(sender, instance, created, **kwargs):
             
             # Notify mentor
             if instance.mentor:
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=instance.mentor,
                     title='Шинэ оюутан хуваарилагдлаа',
                     message=f'{instance.student.get_full_name()} таны удирдлага дор дадлага хийхээр бүртгэгдлээ.',
@@ -28,7 +31,7 @@ def internship_notification(sender, instance, created, **kwargs):
         else:
             # Status change notification
             if instance.status == 2:  # completed
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=instance.student,
                     title='Дадлага дууслаа',
                     message=f'{instance.organization.name} дээрх таны дадлага амжилттай дууслаа.',
@@ -36,7 +39,7 @@ def internship_notification(sender, instance, created, **kwargs):
                 )
                 
                 if instance.mentor:
-                    Notification.objects.create(
+                    NotificationService.notify(
                         recipient=instance.mentor,
                         title='Дадлага дууслаа',
                         message=f'{instance.student.get_full_name()}-н дадлага амжилттай дууслаа.',
@@ -48,14 +51,14 @@ def internship_notification(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Task)
 def task_post_save(sender, instance, created, **kwargs):
     if created:
-        NotificationService.create_notification(
+        NotificationService.notify(
             recipient=instance.internship.student,
             title='New Task Assigned',
             message=f'You have been assigned a new task: {instance.title}',
             notification_type='task'
         )
     elif instance.status == 'completed':
-        NotificationService.create_notification(
+        NotificationService.notify(
             recipient=instance.assigned_by,
             title='Task Completed',
             message=f'Task "{instance.title}" has been completed',
@@ -65,7 +68,7 @@ def task_post_save(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Evaluation)
 def evaluation_post_save(sender, instance, created, **kwargs):
     if created:
-        NotificationService.create_notification(
+        NotificationService.notify(
             recipient=instance.internship.student,
             title='New Evaluation',
             message=f'You have received a new evaluation from your {instance.evaluator_type}',
@@ -79,7 +82,7 @@ def report_notification(sender, instance, created, **kwargs):
         if created:
             # Notify mentor about new report
             if instance.internship.mentor:
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=instance.internship.mentor,
                     title='Шинэ тайлан',
                     message=f'{instance.student.get_full_name()} шинэ тайлан илгээлээ.',
@@ -88,18 +91,78 @@ def report_notification(sender, instance, created, **kwargs):
         else:
             # Status change notifications
             if instance.status == 'approved':
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=instance.student,
                     title='Тайлан зөвшөөрөгдлөө',
                     message=f'Таны тайлан зөвшөөрөгдлөө.',
                     notification_type='success'
                 )
             elif instance.status == 'rejected':
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=instance.student,
                     title='Тайлан буцаагдлаа',
                     message=f'Таны тайлан буцаагдлаа. Шалтгаан: {instance.feedback}',
                     notification_type='warning'
                 )
     except Exception as e:
-        print(f"Error creating report notification: {str(e)}")
\ No newline at end of file
+        print(f"Error creating report notification: {str(e)}")
+
+def _adjust_listing_counter(listing_id, field, delta):
+    """Atomically add ``delta`` to a listing counter column"""
+    if listing_id is None:
+        return
+    listings = InternshipListing.objects.filter(pk=listing_id)
+    if delta < 0:
+        listings = listings.filter(**{f'{field}__gte': -delta})
+    listings.update(**{field: F(field) + delta})
+
+@receiver(pre_save, sender=InternshipApplication)
+def application_pre_save(sender, instance, **kwargs):
+    """
+    Remember the previous listing so a moved application is recounted. It
+    comes from the values the instance was loaded with (see
+    ``InternshipApplication.from_db``); the row is only read when they are
+    not known, e.g. the listing field was deferred.
+    """
+    if instance.pk and not instance._state.adding and not hasattr(instance, '_loaded_listing_id'):
+        instance._loaded_listing_id = InternshipApplication.objects.filter(
+            pk=instance.pk
+        ).values_list('internship_listing_id', flat=True).first()
+
+@receiver(post_save, sender=InternshipApplication)
+def application_count_post_save(sender, instance, created, **kwargs):
+    previous_listing_id = getattr(instance, '_loaded_listing_id', instance.internship_listing_id)
+    instance._loaded_listing_id = instance.internship_listing_id
+    if created:
+        _adjust_listing_counter(instance.internship_listing_id, 'applications_count', 1)
+    elif previous_listing_id != instance.internship_listing_id:
+        _adjust_listing_counter(previous_listing_id, 'applications_count', -1)
+        _adjust_listing_counter(instance.internship_listing_id, 'applications_count', 1)
+
+@receiver(post_delete, sender=InternshipApplication)
+def application_count_post_delete(sender, instance, **kwargs):
+    _adjust_listing_counter(instance.internship_listing_id, 'applications_count', -1)
+
+@receiver(post_save, sender=ListingBookmark)
+def bookmark_count_post_save(sender, instance, created, **kwargs):
+    if created:
+        _adjust_listing_counter(instance.listing_id, 'bookmark_count', 1)
+
+@receiver(post_delete, sender=ListingBookmark)
+def bookmark_count_post_delete(sender, instance, **kwargs):
+    _adjust_listing_counter(instance.listing_id, 'bookmark_count', -1)
+
+@receiver(post_save, sender=InternshipListing)
+def listing_search_post_save(sender, instance, update_fields=None, **kwargs):
+    from .search import ListingSearchService, SEARCH_FIELDS
+
+    searchable = {field for field, _weight in SEARCH_FIELDS}
+    if update_fields and not searchable.intersection(update_fields):
+        return
+    ListingSearchService.update_search_vector([instance.pk])
+
+@receiver(post_delete, sender=InternshipListing)
+def listing_search_post_delete(sender, instance, **kwargs):
+    from .search import inverted_index
+
+    inverted_index.invalidate()
@@ -0,0 +1,153 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
+from apps.internships.models import (
+    Internship, InternshipApplication, InternshipListing, ListingBookmark
+)
+from apps.internships.services import ListingService
+from apps.internships.search import ListingSearchService
+
+User = get_user_model()
+
+class ListingCounterTest(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.listing = InternshipListing.objects.create(
+            organization='Test Company',
+            position='Backend Intern',
+            category='Програм хангамж',
+            type='Бүтэн цагийн',
+            location='Улаанбаатар',
+            duration='3 сар',
+            description='Test Description',
+            applyDeadline=timezone.now().date() + timedelta(days=30)
+        )
+        self.internship = Internship.objects.create(
+            student=self.student,
+            title='Test Internship',
+            description='Test Description',
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=90)
+        )
+
+    def test_applications_count(self):
+        """Test applications_count follows application create/move/delete"""
+        application = InternshipApplication.objects.create(
+            student=self.student,
+            internship=self.internship,
+            internship_listing=self.listing
+        )
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.applications_count, 1)
+
+        application.internship_listing = None
+        application.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.applications_count, 0)
+
+        application.internship_listing = self.listing
+        application.save()
+        application.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.applications_count, 0)
+
+    def test_moving_a_loaded_application_does_not_reload_it(self):
+        """Test the previous listing and status come from the loaded values"""
+        InternshipApplication.objects.create(
+            student=self.student,
+            internship=self.internship,
+            internship_listing=self.listing
+        )
+        application = InternshipApplication.objects.get()
+        application.internship_listing = None
+        application.status = 'accepted'
+        with CaptureQueriesContext(connection) as queries:
+            application.save()
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(selects, [])
+        self.assertIsNotNone(application.reviewed_at)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.applications_count, 0)
+
+    def test_bookmark_count(self):
+        """Test bookmark_count and the per-request bookmarked id set"""
+        self.assertTrue(ListingService.bookmark(self.student, self.listing))
+        self.assertFalse(ListingService.bookmark(self.student, self.listing))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bookmark_count, 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(ListingService.get_bookmarked_ids(self.student), {self.listing.id})
+
+        self.assertTrue(ListingService.remove_bookmark(self.student, self.listing))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bookmark_count, 0)
+
+    def test_recount(self):
+        """Test recount repairs counters changed outside of signals"""
+        ListingBookmark.objects.create(user=self.student, listing=self.listing)
+        InternshipListing.objects.update(bookmark_count=5)
+
+        self.assertEqual(ListingService.recount(), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bookmark_count, 1)
+
+class ListingSearchTest(TestCase):
+    def _create_listing(self, position, organization, description, requirements=None):
+        return InternshipListing.objects.create(
+            organization=organization,
+            position=position,
+            category='Програм хангамж',
+            type='Бүтэн цагийн',
+            location='Улаанбаатар',
+            duration='3 сар',
+            description=description,
+            requirements=requirements or [],
+            applyDeadline=timezone.now().date() + timedelta(days=30)
+        )
+
+    def setUp(self):
+        self.backend = self._create_listing(
+            'Програм хөгжүүлэгч', 'Мобиком', 'Python болон Django ашиглан API хөгжүүлэх',
+            requirements=['Python', 'SQL']
+        )
+        self.data = self._create_listing(
+            'Дата шинжээч', 'Голомт банк', 'Өгөгдөл боловсруулах, Python тайлан'
+        )
+        self.marketing = self._create_listing(
+            'Маркетингийн дадлагажигч', 'Юнител', 'Сошиал медиа контент'
+        )
+
+    def test_cyrillic_search(self):
+        """Test Mongolian Cyrillic queries match case-insensitively"""
+        results = list(ListingSearchService.search('ПРОГРАМ'))
+        self.assertEqual(results, [self.backend])
+
+    def test_ranking(self):
+        """Test title matches rank above body and JSON field matches"""
+        results = list(ListingSearchService.search('python'))
+        self.assertEqual(results[0], self.backend)
+        self.assertEqual(set(results), {self.backend, self.data})
+
+    def test_typo_tolerance(self):
+        results = list(ListingSearchService.search('маркетинги'))
+        self.assertEqual(results, [self.marketing])
+
+    def test_index_follows_saves(self):
+        """Test the in-process index is refreshed after listing changes"""
+        self.assertEqual(list(ListingSearchService.search('Юнител')), [self.marketing])
+        self.marketing.organization = 'Скайтел'
+        self.marketing.save()
+        self.assertEqual(list(ListingSearchService.search('Юнител')), [])
+        self.assertEqual(list(ListingSearchService.search('скайтел')), [self.marketing])
+
+    def test_search_respects_queryset(self):
+        queryset = InternshipListing.objects.exclude(pk=self.backend.pk)
+        self.assertEqual(list(ListingSearchService.search('python', queryset)), [self.data])
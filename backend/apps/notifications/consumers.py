@@ -0,0 +1,50 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from .services import UnreadCounter
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Pushes the user's unread notification count whenever it changes"""
+
+    async def connect(self):
+        self.user = self.scope['user']
+
+        # Verify user is authenticated
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        # Join the same personal group ChatConsumer uses
+        self.user_group_name = f'user_{self.user.id}'
+        await self.channel_layer.group_add(
+            self.user_group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+        # Send the current count so the client needs no initial request
+        await self.send_unread_count(await self.get_unread_count())
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'user_group_name'):
+            await self.channel_layer.group_discard(
+                self.user_group_name,
+                self.channel_name
+            )
+
+    async def notification_unread(self, event):
+        await self.send_unread_count(event['count'])
+
+    async def chatroom_update(self, event):
+        # Room changes are handled by ChatConsumer
+        pass
+
+    async def send_unread_count(self, count):
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': count
+        }))
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return UnreadCounter.get(self.user.id)
@@ -0,0 +1,15 @@
+from .services import NotificationService
+
+
+class NotificationBufferMiddleware:
+    """
+    Collect every notification created while handling a request and write
+    them with one bulk INSERT once the response has been produced.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with NotificationService.buffered():
+            return self.get_response(request)
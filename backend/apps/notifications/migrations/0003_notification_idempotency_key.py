@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['updated_at'], name='notificatio_updated_8e4673_idx'),
+        ),
+    ]
@@ -25,6 +25,14 @@ class Notification(models.Model):
         default='info'
     )
     is_read = models.BooleanField(default=False)
+    # Set by the async delivery pipeline so a redelivered task cannot insert twice
+    idempotency_key = models.CharField(
+        max_length=40,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False
+    )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -33,6 +41,8 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['recipient', '-created_at']),
             models.Index(fields=['is_read']),
+            # Range scan of recently changed rows for UnreadCounter.reconcile
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
@@ -6,7 +6,6 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'title', 'message', 'notification_type',
-            'related_object_id', 'related_object_type',
             'is_read', 'created_at'
         ]
         read_only_fields = ['recipient']
@@ -1,6 +1,330 @@
+import hashlib
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 from .models import Notification
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_BULK_BATCH_SIZE = 500
+DEFAULT_BATCH_WINDOW = 5  # seconds
+DEFAULT_STAGING_TTL = 60 * 60
+DEFAULT_UNREAD_COUNT_TTL = 60 * 60 * 24
+
+
+class NotificationBuffer(threading.local):
+    """
+    Per-thread queue of pending notifications.
+
+    Rows added inside a transaction are coalesced per atomic block: the first
+    add in a block registers one on-commit flush in that block, and later adds
+    in the same block append to its rows, so the block's notifications are
+    written with one bulk INSERT (or one Celery message) once committed.
+    Rolling the block back (a transaction or a savepoint) discards the flush
+    and its rows with it. ``collect()`` widens the window to a whole block of
+    code spanning several atomic blocks, e.g. a view that saves several models
+    whose signals each notify someone: their committed rows are written
+    together after it ends. Outside a transaction, rows count as committed
+    straight away.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.depth = 0
+        self.blocks = {}
+
+    def add(self, notifications_data):
+        if not notifications_data:
+            return
+        rows = list(notifications_data)
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self._deliver(rows, self.pending if self.depth else None)
+            return
+
+        key = (connection.alias, tuple(connection.savepoint_ids))
+        block = self.blocks.get(key)
+        if block is None or not self._registered(connection, block):
+            block = self._open_block(connection, key)
+        block['rows'].extend(rows)
+
+    def _open_block(self, connection, key):
+        # Blocks whose flush was rolled back (or already ran) are stale
+        self.blocks = {
+            other_key: block for other_key, block in self.blocks.items()
+            if self._registered(connection, block)
+        }
+        # Bind to this block's target: it may be flushed after a collect()
+        # block ends, when a transaction around it commits
+        target = self.pending if self.depth else None
+        block = {'rows': []}
+
+        def flush():
+            if self.blocks.get(key) is block:
+                del self.blocks[key]
+            self._deliver(block['rows'], target)
+
+        block['flush'] = flush
+        self.blocks[key] = block
+        transaction.on_commit(flush, robust=True)
+        return block
+
+    @staticmethod
+    def _registered(connection, block):
+        return any(callback is block['flush'] for _sids, callback, _robust in connection.run_on_commit)
+
+    @staticmethod
+    def _deliver(rows, target):
+        if target is None:
+            NotificationService.dispatch(rows)
+        else:
+            target.extend(rows)
+
+    @contextmanager
+    def collect(self):
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self.depth == 1:
+                self.pending = []
+            raise
+        finally:
+            self.depth -= 1
+        if not self.depth:
+            # Registered after the flushes of the blocks opened in it, so it
+            # runs once they have all been committed (or not at all)
+            pending, self.pending = self.pending, []
+            transaction.on_commit(lambda: pending and NotificationService.dispatch(pending), robust=True)
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        return NotificationService.dispatch(pending)
+
+    def discard(self):
+        """Forget everything buffered on this thread without sending it"""
+        self.pending = []
+        self.blocks = {}
+
+
+notification_buffer = NotificationBuffer()
+
+
+def make_idempotency_key(*parts):
+    """Fixed-length key for Notification.idempotency_key"""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class NotificationQueue:
+    """
+    Worker-side staging of notifications per recipient.
+
+    The first notification for a recipient opens a batching window and
+    schedules a flush at its end; everything that arrives for that recipient
+    meanwhile is written by the same bulk INSERT. Staged rows live in the
+    cache under a per-recipient sequence number (``cache.incr`` is atomic on
+    Redis), and a flush only consumes the contiguous prefix it can read, so a
+    row still being staged is picked up by the next window instead of lost.
+
+    Staged rows outlive every attempt of the flush task (see
+    ``staging_timeout``); rows that are gone anyway (evicted, or lost with a
+    Redis restart) are skipped by its last attempt and logged as dropped.
+    """
+    prefix = 'notifications:queue'
+
+    @classmethod
+    def _key(cls, recipient_id, name):
+        return f'{cls.prefix}:{recipient_id}:{name}'
+
+    @staticmethod
+    def window():
+        return getattr(settings, 'NOTIFICATION_BATCH_WINDOW', DEFAULT_BATCH_WINDOW)
+
+    @classmethod
+    def staging_timeout(cls):
+        """
+        How long staged rows are kept: at least NOTIFICATION_STAGING_TTL, which
+        absorbs a backlog on the notifications queue, and never less than the
+        window plus every retry of the flush task
+        """
+        from .tasks import flush_recipient_notifications as flush_task
+
+        window = cls.window()
+        horizon = window + flush_task.max_retries * max(window, flush_task.default_retry_delay)
+        return max(horizon, getattr(settings, 'NOTIFICATION_STAGING_TTL', DEFAULT_STAGING_TTL))
+
+    @classmethod
+    def enqueue(cls, notifications_data):
+        """Stage rows per recipient; returns the recipient ids whose window was opened"""
+        window = cls.window()
+        if not window:
+            NotificationService.insert(notifications_data, ignore_conflicts=True)
+            return []
+
+        by_recipient = defaultdict(list)
+        for data in notifications_data:
+            by_recipient[data['recipient_id']].append(data)
+
+        opened = []
+        for recipient_id, rows in by_recipient.items():
+            seq_key = cls._key(recipient_id, 'seq')
+            cache.add(seq_key, 0, timeout=None)
+            last = cache.incr(seq_key, len(rows))
+            cache.set_many({
+                cls._key(recipient_id, seq): row
+                for seq, row in enumerate(rows, start=last - len(rows) + 1)
+            }, timeout=cls.staging_timeout())
+            # Staged rows must be visible before the window can be claimed
+            if cache.add(cls._key(recipient_id, 'window'), 1, timeout=window):
+                opened.append(recipient_id)
+        return opened
+
+    @classmethod
+    def flush(cls, recipient_id, skip_missing=False):
+        """
+        Write the rows staged for one recipient. Returns ``(written, blocked)``;
+        ``blocked`` means a row that is still being staged (or was lost) stopped
+        the flush early, and ``skip_missing`` gives up on such rows.
+        """
+        cache.delete(cls._key(recipient_id, 'window'))
+        done_key = cls._key(recipient_id, 'done')
+        done = cache.get(done_key, 0)
+        last = cache.get(cls._key(recipient_id, 'seq'), 0)
+        if last <= done:
+            return 0, False
+
+        keys = [cls._key(recipient_id, seq) for seq in range(done + 1, last + 1)]
+        staged = cache.get_many(keys)
+        rows = []
+        consumed = 0
+        for key in keys:
+            if key in staged:
+                rows.append(staged[key])
+            elif not skip_missing:
+                break
+            consumed += 1
+
+        if len(rows) < consumed:
+            logger.error(
+                f"Dropped {consumed - len(rows)} staged notifications for user {recipient_id}: "
+                "they were no longer in the cache"
+            )
+        NotificationService.insert(rows, ignore_conflicts=True)
+        cache.set(done_key, done + consumed, timeout=None)
+        cache.delete_many(keys[:consumed])
+        return len(rows), consumed < len(keys)
+
+
+class UnreadCounter:
+    """
+    Per-user unread notification count kept in the cache (Redis in
+    production), so reading it is not a COUNT(*).
+
+    Creates and reads adjust the counter once their transaction commits, and
+    every change is pushed to the user's ``user_{id}`` Channels group.
+    Deletes go through ``NotificationService.delete_notifications``, which
+    recounts the affected users (a post_delete receiver would turn every
+    queryset delete into a row-by-row one). A missing counter is recomputed
+    from the database; reconcile() repairs any drift periodically.
+    """
+    prefix = 'notifications:unread'
+
+    @classmethod
+    def _key(cls, user_id):
+        return f'{cls.prefix}:{user_id}'
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'NOTIFICATION_UNREAD_COUNT_TTL', DEFAULT_UNREAD_COUNT_TTL)
+
+    @classmethod
+    def get(cls, user_id):
+        count = cache.get(cls._key(user_id))
+        if count is None:
+            count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+            cache.add(cls._key(user_id), count, timeout=cls.timeout())
+        return count
+
+    @classmethod
+    def adjust(cls, user_id, delta):
+        """Add ``delta`` to a user's counter after the current transaction commits"""
+        if delta:
+            transaction.on_commit(lambda: cls._apply(user_id, delta))
+
+    @classmethod
+    def adjust_many(cls, deltas):
+        """``deltas`` maps user id to the change in unread count"""
+        for user_id, delta in deltas.items():
+            cls.adjust(user_id, delta)
+
+    @classmethod
+    def _apply(cls, user_id, delta):
+        key = cls._key(user_id)
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            # Not cached yet: the next read counts from the database
+            count = cls.get(user_id)
+        if count < 0:
+            cache.delete(key)
+            count = cls.get(user_id)
+        cls.push(user_id, count)
+
+    @classmethod
+    def refresh(cls, user_ids):
+        """Recount the given users with one GROUP BY, store and push the result"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(
+            Notification.objects.filter(
+                recipient_id__in=user_ids, is_read=False
+            ).values_list('recipient_id').annotate(unread=Count('id')).order_by()
+        )
+        previous = cache.get_many([cls._key(user_id) for user_id in user_ids])
+        cache.set_many(
+            {cls._key(user_id): count for user_id, count in counts.items()},
+            timeout=cls.timeout()
+        )
+        for user_id, count in counts.items():
+            if previous.get(cls._key(user_id)) != count:
+                cls.push(user_id, count)
+        return counts
+
+    @classmethod
+    def reconcile(cls, since):
+        """Recount every user whose notifications changed since ``since``"""
+        user_ids = Notification.objects.filter(
+            updated_at__gte=since
+        ).values_list('recipient_id', flat=True).distinct()
+        return cls.refresh(user_ids)
+
+    @staticmethod
+    def push(user_id, count):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f'user_{user_id}',
+                {'type': 'notification_unread', 'count': count}
+            )
+        except Exception:
+            logger.exception(f"Error pushing unread count to user {user_id}")
+
+
 class NotificationService:
     @staticmethod
     def create_notification(recipient, title, message, notification_type='info'):
@@ -18,54 +342,204 @@ class NotificationService:
             return None
 
     @staticmethod
-    def create_bulk_notifications(notifications_data):
-        """Create multiple notifications at once."""
+    def insert(notifications_data, batch_size=None, ignore_conflicts=False):
+        """Insert notifications with batched bulk INSERTs; rows without a recipient are skipped"""
+        if batch_size is None:
+            batch_size = getattr(settings, 'NOTIFICATION_BULK_BATCH_SIZE', DEFAULT_BULK_BATCH_SIZE)
+        notifications = [
+            Notification(**data)
+            for data in notifications_data
+            if data.get('recipient') is not None or data.get('recipient_id') is not None
+        ]
+        if not notifications:
+            return []
+        created = Notification.objects.bulk_create(
+            notifications,
+            batch_size=batch_size,
+            ignore_conflicts=ignore_conflicts
+        )
+        # bulk_create sends no post_save, so update the unread counters here
+        if ignore_conflicts:
+            # Conflicting rows were skipped silently; recount instead of guessing
+            recipient_ids = {notification.recipient_id for notification in notifications}
+            transaction.on_commit(lambda: UnreadCounter.refresh(recipient_ids))
+        else:
+            deltas = defaultdict(int)
+            for notification in created:
+                if not notification.is_read:
+                    deltas[notification.recipient_id] += 1
+            UnreadCounter.adjust_many(deltas)
+        return created
+
+    @staticmethod
+    def bulk_create(notifications_data, batch_size=None, ignore_conflicts=False):
+        """Like insert(), but logs and swallows database errors"""
         try:
-            notifications = []
-            for data in notifications_data:
-                notification = Notification.objects.create(**data)
-                notifications.append(notification)
-            return notifications
+            return NotificationService.insert(notifications_data, batch_size, ignore_conflicts)
         except Exception as e:
             print(f"Error creating bulk notifications: {str(e)}")
             return []
 
+    @staticmethod
+    def create_bulk_notifications(notifications_data):
+        """Create multiple notifications at once."""
+        return NotificationService.bulk_create(notifications_data)
+
+    @staticmethod
+    def notify(recipient, title, message, notification_type='info', idempotency_key=None):
+        """Queue a notification on the buffer; it is sent when the transaction commits"""
+        NotificationService.notify_many(
+            [recipient], title, message, notification_type, idempotency_key
+        )
+
+    @staticmethod
+    def notify_many(recipients, title, message, notification_type='info', idempotency_key=None):
+        """
+        Queue the same notification for several recipients. ``idempotency_key``
+        names the triggering event (e.g. ``chat.message:42``); it is combined
+        with each recipient so the event notifies every recipient at most once.
+        """
+        notifications = []
+        for recipient in recipients:
+            if recipient is None:
+                continue
+            data = {
+                'recipient': recipient,
+                'title': title,
+                'message': message,
+                'notification_type': notification_type,
+            }
+            if idempotency_key:
+                data['idempotency_key'] = make_idempotency_key(idempotency_key, recipient.pk)
+            notifications.append(data)
+        notification_buffer.add(notifications)
+
+    @staticmethod
+    def queue(notifications_data):
+        """Queue prepared notification dicts (``recipient``, ``title``, ``message``, ...)"""
+        notification_buffer.add([data for data in notifications_data if data.get('recipient') is not None])
+
+    @staticmethod
+    def is_async():
+        """Deliver through Celery unless disabled or running tasks eagerly (tests)"""
+        return (
+            getattr(settings, 'NOTIFICATIONS_ASYNC', True)
+            and not getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False)
+        )
+
+    @staticmethod
+    def dispatch(notifications_data):
+        """
+        Hand buffered notifications to the ``notifications`` Celery queue as
+        one message, or write them inline when async delivery is off or the
+        broker cannot be reached.
+        """
+        if not NotificationService.is_async():
+            return NotificationService.bulk_create(
+                notifications_data, ignore_conflicts=any(
+                    data.get('idempotency_key') for data in notifications_data
+                )
+            )
+
+        from .tasks import deliver_notifications
+
+        payload = []
+        for data in notifications_data:
+            recipient = data.get('recipient')
+            recipient_id = recipient.pk if recipient is not None else data.get('recipient_id')
+            if recipient_id is None:
+                continue
+            payload.append({
+                'recipient_id': recipient_id,
+                'title': data['title'],
+                'message': data['message'],
+                'notification_type': data.get('notification_type', 'info'),
+                'idempotency_key': data.get('idempotency_key') or uuid.uuid4().hex,
+            })
+        if not payload:
+            return []
+        try:
+            deliver_notifications.delay(payload)
+        except Exception:
+            # Broker unreachable: write inline rather than lose the batch.
+            # Every row has an idempotency key, so a message that did get
+            # through cannot duplicate them.
+            logger.exception(f"Failed to queue {len(payload)} notifications, writing them inline")
+            return NotificationService.bulk_create(payload, ignore_conflicts=True)
+        return []
+
+    @staticmethod
+    def buffered():
+        """Collect every notification queued inside the block into one INSERT"""
+        return notification_buffer.collect()
+
     @staticmethod
     def mark_as_read(notification_id):
         """Mark a notification as read"""
         try:
             notification = Notification.objects.get(id=notification_id)
-            notification.is_read = True
-            notification.save()
-            return True
         except Notification.DoesNotExist:
             return False
+        NotificationService.mark_read(notification)
+        return True
+
+    @staticmethod
+    def mark_read(notification):
+        """Mark a loaded notification as read and update the unread counter"""
+        if notification.is_read:
+            return
+        notification.is_read = True
+        notification.save(update_fields=['is_read', 'updated_at'])
+        UnreadCounter.adjust(notification.recipient_id, -1)
 
     @staticmethod
     def mark_all_as_read(user):
         """Mark all notifications as read for a user"""
         try:
-            Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+            NotificationService.mark_all_read(Notification.objects.filter(recipient=user))
             return True
         except Exception:
             return False
 
+    @staticmethod
+    def mark_all_read(queryset):
+        """Mark every unread notification in ``queryset`` as read; returns how many changed"""
+        unread = queryset.filter(is_read=False)
+        deltas = dict(
+            unread.values_list('recipient_id').annotate(unread=Count('id')).order_by()
+        )
+        updated = unread.update(is_read=True, updated_at=timezone.now())
+        UnreadCounter.adjust_many({user_id: -count for user_id, count in deltas.items()})
+        return updated
+
     @staticmethod
     def get_unread_count(user):
         """Get count of unread notifications for a user"""
-        return Notification.objects.filter(recipient=user, is_read=False).count()
+        return UnreadCounter.get(user.id)
 
     @staticmethod
     def get_recent_notifications(user, limit=5):
         """Get recent notifications for a user"""
         return Notification.objects.filter(recipient=user).order_by('-created_at')[:limit]
 
+    @staticmethod
+    def delete_notifications(queryset):
+        """
+        Delete ``queryset`` with one DELETE (no per-row signals) and recount the
+        unread counters of the users who lose unread rows once it commits
+        """
+        user_ids = set(queryset.filter(is_read=False).values_list('recipient_id', flat=True).distinct())
+        deleted, _ = queryset.delete()
+        if user_ids:
+            transaction.on_commit(lambda: UnreadCounter.refresh(user_ids))
+        return deleted
+
     @staticmethod
     def delete_old_notifications(days=30):
         """Delete notifications older than specified days."""
         try:
             cutoff_date = timezone.now() - timezone.timedelta(days=days)
-            Notification.objects.filter(created_at__lt=cutoff_date).delete()
+            NotificationService.delete_notifications(Notification.objects.filter(created_at__lt=cutoff_date))
             return True
         except Exception as e:
             print(f"Error deleting old notifications: {str(e)}")
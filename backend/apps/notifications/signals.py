@@ -2,6 +2,7 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import Notification, NotificationPreference
+from .services import NotificationService, UnreadCounter
 
 User = get_user_model()
 
@@ -17,7 +18,7 @@ def create_user_notification(sender, instance, created=None, **kwargs):
     """Create notification when user is created or deleted"""
     try:
         if created:
-            Notification.objects.create(
+            NotificationService.notify(
                 recipient=instance,
                 title='Welcome!',
                 message=f'Welcome to IMS, {instance.get_full_name()}!',
@@ -27,7 +28,7 @@ def create_user_notification(sender, instance, created=None, **kwargs):
             # User deletion notification to admin
             admin = User.objects.filter(is_superuser=True).first()
             if admin:
-                Notification.objects.create(
+                NotificationService.notify(
                     recipient=admin,
                     title='User Deleted',
                     message=f'User {instance.get_full_name()} has been deleted.',
@@ -40,9 +41,15 @@ def create_user_notification(sender, instance, created=None, **kwargs):
 def notification_preference_changed(sender, instance, created, **kwargs):
     """Create notification when notification preferences are changed"""
     if not created:
-        Notification.objects.create(
+        NotificationService.notify(
             recipient=instance.user,
             title='Notification Settings Updated',
             message='Your notification preferences have been updated.',
             notification_type='info'
-        ) 
\ No newline at end of file
+        )
+
+@receiver(post_save, sender=Notification)
+def notification_unread_post_save(sender, instance, created, **kwargs):
+    """Count notifications created one at a time (bulk inserts update the counter themselves)"""
+    if created and not instance.is_read:
+        UnreadCounter.adjust(instance.recipient_id, 1)
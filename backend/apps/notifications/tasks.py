@@ -0,0 +1,45 @@
+from datetime import timedelta
+from celery import shared_task
+from django.utils import timezone
+from .services import NotificationQueue, UnreadCounter
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def deliver_notifications(self, notifications):
+    """Stage a batch of notifications and schedule one flush per recipient window"""
+    try:
+        opened = NotificationQueue.enqueue(notifications)
+    except Exception as e:
+        logger.error(f"Error staging {len(notifications)} notifications: {str(e)}")
+        raise self.retry(exc=e)
+
+    window = NotificationQueue.window()
+    for recipient_id in opened:
+        flush_recipient_notifications.apply_async((recipient_id,), countdown=window)
+    return len(notifications)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def flush_recipient_notifications(self, recipient_id):
+    """Write everything staged for a recipient during its batching window"""
+    try:
+        written, blocked = NotificationQueue.flush(
+            recipient_id,
+            skip_missing=self.request.retries >= self.max_retries
+        )
+    except Exception as e:
+        logger.error(f"Error flushing notifications for user {recipient_id}: {str(e)}")
+        raise self.retry(exc=e)
+
+    if blocked:
+        # A row was still being staged; pick it up on a later attempt
+        raise self.retry(countdown=NotificationQueue.window())
+    return written
+
+@shared_task
+def reconcile_unread_counts(minutes=15):
+    """Recount cached unread counters for users whose notifications changed recently"""
+    counts = UnreadCounter.reconcile(timezone.now() - timedelta(minutes=minutes))
+    logger.info(f"Reconciled unread counts for {len(counts)} users")
+    return len(counts)
@@ -1,3 +1,371 @@
-from django.test import TestCase
+import json
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from core.authentication import JWTAuthMiddlewareStack
+from .models import Notification
+from .routing import websocket_urlpatterns
+from .services import NotificationQueue, NotificationService, UnreadCounter, notification_buffer
+from .tasks import deliver_notifications
+from .views import NotificationViewSet
 
-# Create your tests here.
+User = get_user_model()
+
+
+class NotificationFeedPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(username='reader', password='pass')
+        Notification.objects.all().delete()
+        base = timezone.now() - timedelta(days=1)
+        # Two rows share every timestamp so the id tie-breaker is exercised
+        self.notifications = [
+            Notification.objects.create(
+                recipient=self.user,
+                title=f'n{i}',
+                message='body',
+                created_at=base + timedelta(minutes=i // 2)
+            )
+            for i in range(7)
+        ]
+        self.view = NotificationViewSet.as_view({'get': 'list'})
+
+    def get(self, **params):
+        request = self.factory.get('/notifications/', params)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_first_page_is_newest(self):
+        data = self.get(page_size=3)
+        self.assertEqual([row['title'] for row in data['results']], ['n6', 'n5', 'n4'])
+        self.assertTrue(data['has_before'])
+        self.assertFalse(data['has_after'])
+
+    def test_walk_back_with_before_cursor(self):
+        seen = []
+        data = self.get(page_size=3)
+        seen += [row['title'] for row in data['results']]
+        while data['has_before']:
+            data = self.get(page_size=3, before=data['before'])
+            seen += [row['title'] for row in data['results']]
+        self.assertEqual(seen, [f'n{i}' for i in range(6, -1, -1)])
+
+    def test_after_cursor_returns_newer_rows(self):
+        oldest_page = self.get(page_size=3, before=self.get(page_size=4)['before'])
+        self.assertEqual([row['title'] for row in oldest_page['results']], ['n2', 'n1', 'n0'])
+
+        newer = self.get(page_size=2, after=oldest_page['after'])
+        self.assertEqual([row['title'] for row in newer['results']], ['n4', 'n3'])
+        self.assertTrue(newer['has_after'])
+
+    def test_invalid_cursor_is_rejected(self):
+        request = self.factory.get('/notifications/', {'before': 'not-a-cursor'})
+        force_authenticate(request, user=self.user)
+        self.assertEqual(self.view(request).status_code, 400)
+
+
+class NotificationBufferTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'member{i}', password='pass')
+            for i in range(3)
+        ]
+        # Welcome notifications queued by the user signals
+        notification_buffer.discard()
+        Notification.objects.all().delete()
+
+    def test_bulk_create_batches_inserts(self):
+        data = [
+            {'recipient': user, 'title': 'Hi', 'message': 'body'}
+            for user in self.users
+        ] + [{'recipient': None, 'title': 'Dropped', 'message': 'body'}]
+        with self.assertNumQueries(2):
+            created = NotificationService.bulk_create(data, batch_size=2)
+        self.assertEqual(len(created), 3)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_notifications_are_written_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            NotificationService.notify_many(self.users, 'Hi', 'body')
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(len(callbacks), 1)
+
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_atomic_block_coalesces_into_one_flush(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                for user in self.users:
+                    NotificationService.notify(user, 'Hi', 'body')
+                try:
+                    with transaction.atomic():
+                        NotificationService.notify(self.users[0], 'Lost', 'body')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Hi'] * 3)
+
+    def test_buffered_block_flushes_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with NotificationService.buffered():
+                for user in self.users:
+                    NotificationService.notify(user, 'Hi', 'body')
+        self.assertEqual(Notification.objects.count(), 0)
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(Notification.objects.filter(title='Hi').count(), 3)
+
+    def test_rolled_back_savepoint_is_discarded_from_buffered_block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with NotificationService.buffered():
+                NotificationService.notify(self.users[0], 'Kept', 'body')
+                try:
+                    with transaction.atomic():
+                        NotificationService.notify(self.users[1], 'Lost', 'body')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertEqual(
+            list(Notification.objects.values_list('title', flat=True)), ['Kept']
+        )
+
+    def test_rolled_back_notifications_are_discarded(self):
+        try:
+            with transaction.atomic():
+                NotificationService.notify(self.users[0], 'Lost', 'body')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify(self.users[1], 'Kept', 'body')
+        self.assertEqual(
+            list(Notification.objects.values_list('title', flat=True)), ['Kept']
+        )
+
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=False,
+    NOTIFICATIONS_ASYNC=True,
+    NOTIFICATION_BATCH_WINDOW=5,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notification-queue'}},
+)
+class NotificationQueueTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'queued{i}', password='pass')
+            for i in range(2)
+        ]
+        notification_buffer.discard()
+        Notification.objects.all().delete()
+        cache.clear()
+
+    def rows(self, *users, key=None):
+        return [
+            {
+                'recipient_id': user.pk,
+                'title': 'Hi',
+                'message': 'body',
+                'notification_type': 'info',
+                'idempotency_key': key or uuid.uuid4().hex,
+            }
+            for user in users
+        ]
+
+    @patch('apps.notifications.tasks.deliver_notifications.delay')
+    def test_commit_publishes_one_task_without_writing(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_many(self.users, 'Hi', 'body', idempotency_key='event:1')
+        self.assertEqual(Notification.objects.count(), 0)
+        delay.assert_called_once()
+        payload = delay.call_args[0][0]
+        self.assertEqual({row['recipient_id'] for row in payload}, {user.pk for user in self.users})
+        self.assertTrue(all(row['idempotency_key'] for row in payload))
+
+    @patch('apps.notifications.tasks.deliver_notifications.delay', side_effect=ConnectionError('broker down'))
+    def test_broker_failure_writes_inline(self, delay):
+        with self.assertLogs('apps.notifications.services', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                NotificationService.notify_many(self.users, 'Hi', 'body', idempotency_key='event:2')
+        delay.assert_called_once()
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            {user.pk for user in self.users}
+        )
+
+    @patch('apps.notifications.tasks.flush_recipient_notifications.apply_async')
+    def test_window_batches_per_recipient(self, apply_async):
+        first, second = self.users
+        deliver_notifications(self.rows(first, second))
+        deliver_notifications(self.rows(first))
+        # One flush per recipient window, however many batches arrived
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(NotificationQueue.flush(first.pk), (2, False))
+        self.assertEqual(NotificationQueue.flush(first.pk), (0, False))
+        self.assertEqual(Notification.objects.filter(recipient=first).count(), 2)
+
+        # The window closed with the flush, so the next row opens a new one
+        deliver_notifications(self.rows(first))
+        self.assertEqual(apply_async.call_count, 3)
+
+    @patch('apps.notifications.tasks.flush_recipient_notifications.apply_async')
+    def test_redelivered_batch_is_written_once(self, apply_async):
+        rows = self.rows(self.users[0], key='a' * 32)
+        deliver_notifications(rows)
+        deliver_notifications(rows)
+        NotificationQueue.flush(self.users[0].pk)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_flush_stops_at_rows_still_being_staged(self):
+        recipient_id = self.users[0].pk
+        cache.set(NotificationQueue._key(recipient_id, 'seq'), 2)
+        cache.set(NotificationQueue._key(recipient_id, 2), self.rows(self.users[0])[0])
+        self.assertEqual(NotificationQueue.flush(recipient_id), (0, True))
+        with self.assertLogs('apps.notifications.services', 'ERROR') as logs:
+            self.assertEqual(NotificationQueue.flush(recipient_id, skip_missing=True), (1, False))
+        self.assertIn('Dropped 1 staged notifications', logs.output[0])
+
+    @override_settings(NOTIFICATION_BATCH_WINDOW=30, NOTIFICATION_STAGING_TTL=60)
+    def test_staged_rows_outlive_every_flush_attempt(self):
+        # The first flush runs after the window, then up to three retries
+        self.assertGreaterEqual(NotificationQueue.staging_timeout(), 30 + 3 * 30)
+        with patch.object(cache, 'set_many', wraps=cache.set_many) as set_many, \
+                patch('apps.notifications.tasks.flush_recipient_notifications.apply_async'):
+            deliver_notifications(self.rows(self.users[0]))
+        self.assertEqual(set_many.call_args.kwargs['timeout'], NotificationQueue.staging_timeout())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'unread-counter'}},
+)
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counted', password='pass')
+        notification_buffer.discard()
+        Notification.objects.all().delete()
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.channel_layer = get_channel_layer()
+        self.channel = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(f'user_{self.user.id}', self.channel)
+
+    def receive(self):
+        return async_to_sync(self.channel_layer.receive)(self.channel)
+
+    def unread_count(self):
+        request = self.factory.get('/notifications/unread_count/')
+        force_authenticate(request, user=self.user)
+        return NotificationViewSet.as_view({'get': 'unread_count'})(request).data['count']
+
+    def test_count_is_served_from_cache(self):
+        self.assertEqual(self.unread_count(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 0)
+
+    def test_bulk_insert_and_read_adjust_counter_and_push(self):
+        self.assertEqual(self.unread_count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.bulk_create([
+                {'recipient': self.user, 'title': f't{i}', 'message': 'body'} for i in range(3)
+            ])
+        self.assertEqual(self.receive(), {'type': 'notification_unread', 'count': 3})
+
+        notification = Notification.objects.filter(recipient=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.mark_read(notification)
+        self.assertEqual(self.receive()['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.mark_all_as_read(self.user)
+        self.assertEqual(self.receive()['count'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 0)
+
+    def test_bulk_delete_recounts_once_per_user(self):
+        other = User.objects.create_user(username='other', password='pass')
+        old = timezone.now() - timedelta(days=40)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.bulk_create([
+                {'recipient': user, 'title': f't{i}', 'message': 'body'}
+                for user in (self.user, other) for i in range(3)
+            ])
+        self.assertEqual(self.receive()['count'], 3)
+        Notification.objects.filter(title__in=['t0', 't1']).update(created_at=old)
+
+        # One aggregate and one DELETE, however many rows; no row is loaded
+        with self.assertNumQueries(2):
+            with self.captureOnCommitCallbacks() as callbacks:
+                NotificationService.delete_old_notifications(days=30)
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(self.receive(), {'type': 'notification_unread', 'count': 1})
+        self.assertEqual(UnreadCounter.get(other.id), 1)
+
+    def test_reconcile_repairs_drift(self):
+        Notification.objects.create(recipient=self.user, title='t', message='body')
+        cache.set(UnreadCounter._key(self.user.id), 7)
+        counts = UnreadCounter.reconcile(timezone.now() - timedelta(minutes=5))
+        self.assertEqual(counts, {self.user.id: 1})
+        self.assertEqual(self.unread_count(), 1)
+        self.assertEqual(self.receive()['count'], 1)
+
+
+class NotificationConsumerAuthTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='jwt_client', password='pass')
+        self.application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, cookie=None):
+        # channels.testing needs daphne; drive the ASGI protocol directly
+        scope = {
+            'type': 'websocket',
+            'path': '/ws/notifications/',
+            'query_string': b'',
+            'headers': [(b'cookie', cookie.encode())] if cookie else [],
+            'subprotocols': [],
+        }
+        communicator = ApplicationCommunicator(self.application, scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        response = await communicator.receive_output(timeout=5)
+        return communicator, response['type'] == 'websocket.accept'
+
+    def test_jwt_cookie_authenticates_without_session(self):
+        async def run():
+            communicator, connected = await self.connect(f'access_token={AccessToken.for_user(self.user)}')
+            self.assertTrue(connected)
+            message = await communicator.receive_output(timeout=5)
+            self.assertEqual(json.loads(message['text'])['type'], 'unread_count')
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(timeout=5)
+        async_to_sync(run)()
+
+    def test_invalid_or_missing_token_is_rejected(self):
+        async def run():
+            for cookie in ('access_token=not-a-token', None):
+                communicator, connected = await self.connect(cookie)
+                self.assertFalse(connected)
+                await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+                await communicator.wait(timeout=5)
+        async_to_sync(run)()
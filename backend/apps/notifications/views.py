@@ -4,31 +4,32 @@ from rest_framework.response import Response
 from django.db.models import Q
 from .models import Notification, NotificationPreference
 from .serializers import NotificationSerializer, NotificationPreferenceSerializer
+from .services import NotificationService, UnreadCounter
+from core.pagination import NotificationKeysetPagination
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationKeysetPagination
 
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user)
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
-        updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated = NotificationService.mark_all_read(self.get_queryset())
         return Response({'status': f'{updated} notifications marked as read'})
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         notification = self.get_object()
-        if not notification.is_read:
-            notification.is_read = True
-            notification.save()
+        NotificationService.mark_read(notification)
         return Response({'status': 'Notification marked as read'})
 
     @action(detail=False)
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
+        # Served from the cached counter; clients can also subscribe over websocket
+        return Response({'count': UnreadCounter.get(request.user.id)})
 
 class NotificationPreferenceViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationPreferenceSerializer
@@ -111,7 +111,7 @@ class ReportService:
 
             # Notify mentor
             if report.mentor:
-                NotificationService.create_notification(
+                NotificationService.notify(
                     recipient=report.mentor,
                     title='New Report Submission',
                     message=f'New {report.get_type_display()} report submitted by {report.student.get_full_name()}',
@@ -133,7 +133,7 @@ class ReportService:
             report.save()
 
             # Notify student
-            NotificationService.create_notification(
+            NotificationService.notify(
                 recipient=report.student,
                 title=f'Report {status.title()}',
                 message=f'Your {report.get_type_display()} report has been {status}',
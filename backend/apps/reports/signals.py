@@ -40,11 +40,10 @@ def comment_post_save(sender, instance, created, **kwargs):
 
         # Notify relevant users
         recipients = {instance.report.student, instance.report.mentor} - {instance.author}
-        for recipient in recipients:
-            if recipient:
-                NotificationService.create_notification(
-                    recipient=recipient,
-                    title='New Comment on Report',
-                    message=f'New comment on report: {instance.report.title}',
-                    notification_type='report_comment'
-                ) 
\ No newline at end of file
+        NotificationService.notify_many(
+            recipients,
+            title='New Comment on Report',
+            message=f'New comment on report: {instance.report.title}',
+            notification_type='report_comment',
+            idempotency_key=f'report.comment:{instance.pk}'
+        )
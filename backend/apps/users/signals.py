@@ -19,7 +19,7 @@ def user_post_save(sender, instance, created, **kwargs):
                 )
 
                 # Create welcome notification
-                NotificationService.create_notification(
+                NotificationService.notify(
                     recipient=instance,
                     title='Welcome to IMS',
                     message=f'Welcome to the Internship Management System, {instance.get_full_name() or instance.username}!',
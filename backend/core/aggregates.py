@@ -0,0 +1,53 @@
+from django.db.models import Count, Q
+
+
+def conditional_counts(queryset, **conditions):
+    """
+    Count rows matching each condition in a single aggregate query.
+
+    Usage:
+        conditional_counts(User.objects.all(),
+                           students=Q(user_type='student'),
+                           mentors=Q(user_type='mentor'))
+        -> {'students': 12, 'mentors': 3}
+
+    A condition of None counts every row.
+    """
+    # Aliases are generated because keys may not be valid SQL identifiers
+    aliases = {f'count_{index}': name for index, name in enumerate(conditions)}
+    aggregates = {
+        alias: Count('pk', filter=conditions[name]) if conditions[name] is not None else Count('pk')
+        for alias, name in aliases.items()
+    }
+    if not aggregates:
+        return {}
+    result = queryset.order_by().aggregate(**aggregates)
+    return {name: result[alias] or 0 for alias, name in aliases.items()}
+
+
+def status_histogram(queryset, field='status', values=None, total_key='total'):
+    """
+    Return {value: count} for every value of ``field`` in one query.
+
+    With ``values`` (or when the model field declares choices) every listed
+    value is present in the result, zero-filled, using one conditional
+    aggregate. Otherwise a single ``values().annotate()`` GROUP BY is used and
+    only values that occur are returned. ``total_key`` adds the overall count
+    when set.
+    """
+    if values is None:
+        model_field = queryset.model._meta.get_field(field) if '__' not in field else None
+        if model_field is not None and model_field.choices:
+            values = [value for value, _label in model_field.flatchoices]
+
+    if values is None:
+        rows = queryset.order_by().values(field).annotate(count=Count('pk'))
+        histogram = {row[field]: row['count'] for row in rows}
+        if total_key:
+            histogram[total_key] = sum(histogram.values())
+        return histogram
+
+    conditions = {value: Q(**{field: value}) for value in values}
+    if total_key:
+        conditions[total_key] = None
+    return conditional_counts(queryset, **conditions)
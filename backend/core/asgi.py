@@ -12,4 +12,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing consumers, which import models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from apps.chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+from apps.notifications.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+from core.authentication import JWTAuthMiddlewareStack
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': JWTAuthMiddlewareStack(
+        URLRouter(chat_websocket_urlpatterns + notification_websocket_urlpatterns)
+    ),
+})
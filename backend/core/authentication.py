@@ -1,4 +1,8 @@
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from django.conf import settings
 from rest_framework.authentication import CSRFCheck
 from rest_framework import exceptions
@@ -24,4 +28,36 @@ class CustomJWTAuthentication(JWTAuthentication):
         try:
             check.process_request(request)
         except exceptions.PermissionDenied:
-            raise exceptions.PermissionDenied('CSRF Failed: %s' % check.error_message) 
\ No newline at end of file
+            raise exceptions.PermissionDenied('CSRF Failed: %s' % check.error_message) 
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware authenticating WebSocket connections from the JWT
+    access-token cookie, for clients without a Django session. Runs inside
+    ``AuthMiddlewareStack`` and only replaces an anonymous ``scope['user']``.
+    """
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+        if user is None or not user.is_authenticated:
+            cookie_name = getattr(settings, 'SIMPLE_JWT', {}).get('AUTH_COOKIE', 'access_token')
+            raw_token = scope.get('cookies', {}).get(cookie_name)
+            if raw_token:
+                user = await self.get_user(raw_token)
+                if user is not None:
+                    scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        authentication = CustomJWTAuthentication()
+        try:
+            user = authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, exceptions.AuthenticationFailed):
+            return None
+        return user if user.is_active else None
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session authentication, falling back to the JWT cookie"""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
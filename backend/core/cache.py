@@ -1,27 +1,308 @@
 from django.core.cache import cache
 from functools import wraps
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
 import hashlib
 import json
+import math
+import random
+import time
 
-def cache_response(timeout=300, key_prefix=''):
+FRESH = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+class CacheNamespace:
+    """
+    Versioned cache namespace.
+
+    Every key built by ``key()`` embeds the namespace's current generation,
+    a counter kept in the cache. ``bump()`` increments it once the current
+    transaction commits, which invalidates every list, detail and statistics
+    entry of the namespace at once: readers simply stop finding the old keys,
+    and those entries age out through their TTL.
+    """
+
+    def __init__(self, name, timeout_setting='CACHE_TTL', default_timeout=300):
+        self.name = name
+        self.timeout_setting = timeout_setting
+        self.default_timeout = default_timeout
+
+    @property
+    def prefix(self):
+        return f"{getattr(settings, 'CACHE_KEY_PREFIX', '')}:{self.name}"
+
+    @property
+    def generation_key(self):
+        return f"{self.prefix}:generation"
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.timeout_setting, self.default_timeout)
+
+    @staticmethod
+    def _seed():
+        # A counter lost to eviction restarts above any generation handed out
+        # before, so stale entries can never become current again
+        return int(time.time() * 1000)
+
+    def generation(self):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            seed = self._seed()
+            cache.add(self.generation_key, seed, timeout=None)
+            generation = cache.get(self.generation_key, seed)
+        return generation
+
+    def key(self, *parts, params=None):
+        """``<prefix>:<name>:g<generation>:<parts>[:<md5 of params>]``"""
+        key = ':'.join([self.prefix, f"g{self.generation()}", *(str(part) for part in parts)])
+        if params:
+            param_string = json.dumps(params, sort_keys=True)
+            key += ":" + hashlib.md5(param_string.encode()).hexdigest()
+        return key
+
+    def get(self, key, default=None):
+        return cache.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        cache.set(key, value, timeout=self.timeout if timeout is None else timeout)
+
+    def bump(self):
+        """Invalidate the whole namespace once the current transaction commits"""
+        transaction.on_commit(self._incr)
+
+    def _incr(self):
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.add(self.generation_key, self._seed(), timeout=None)
+
+
+class ResponseCache:
+    """
+    Cache of rendered responses.
+
+    An entry holds the status, headers and body of a response, the time it
+    goes stale and how long it took to build. It is kept ``stale_ttl`` seconds
+    past that time: the first worker to find it stale takes a lock with
+    ``cache.add()`` and rebuilds it while the others keep serving the stale
+    copy. Fresh entries are also rebuilt early with a probability that grows
+    as they near expiry (XFetch), so a hot key rarely expires at all, and a
+    cold miss waits briefly for the worker already building it.
+
+    Entries record the version of each of their tags; ``invalidate()`` bumps a
+    tag and every entry carrying it becomes a miss.
+    """
+
+    def __init__(self, name='response'):
+        self.name = name
+
+    @property
+    def prefix(self):
+        return f"{getattr(settings, 'CACHE_KEY_PREFIX', '')}:{self.name}"
+
+    def tag_namespace(self, tag):
+        return CacheNamespace(f"{self.name}:tag:{tag}")
+
+    def key(self, request, key_prefix, kwargs, shared=False, user=None):
+        """
+        Entry key; per ``user`` (by default ``request.user``) unless
+        ``shared`` and the user is authenticated
+        """
+        if user is None:
+            user = getattr(request, 'user', None)
+        if shared and getattr(user, 'is_authenticated', False):
+            scope = 'shared'
+        else:
+            scope = f"u{getattr(user, 'pk', None) or 'anon'}"
+        variant = json.dumps([
+            request.method,
+            request.path,
+            sorted(request.GET.lists()),
+            kwargs,
+            request.META.get('HTTP_ACCEPT', ''),
+        ], sort_keys=True, default=str)
+        return f"{self.prefix}:{key_prefix}:{scope}:{hashlib.md5(variant.encode()).hexdigest()}"
+
+    def lookup(self, key, tags=()):
+        """``(entry, state, tag_versions)``, reading entry and tags in one round trip"""
+        namespaces = {tag: self.tag_namespace(tag) for tag in tags}
+        found = cache.get_many([key, *(ns.generation_key for ns in namespaces.values())])
+        versions = {
+            tag: found[ns.generation_key] if ns.generation_key in found else ns.generation()
+            for tag, ns in namespaces.items()
+        }
+        entry = found.get(key)
+        if entry is None or entry['tags'] != versions:
+            return None, MISS, versions
+        return entry, FRESH if time.time() < entry['expires'] else STALE, versions
+
+    @staticmethod
+    def refresh_early(entry, beta=None):
+        """XFetch: rebuild before expiry with a probability rising towards it"""
+        if beta is None:
+            beta = getattr(settings, 'RESPONSE_CACHE_EARLY_REFRESH_BETA', 1.0)
+        if not beta:
+            return False
+        gap = -entry['delta'] * beta * math.log(1.0 - random.random())
+        return time.time() + gap >= entry['expires']
+
+    @staticmethod
+    def cacheable(request, response, shared=False):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return False
+        if getattr(response, 'streaming', False) or response.cookies:
+            return False
+        cache_control = response.get('Cache-Control', '')
+        if 'no-store' in cache_control or (shared and 'private' in cache_control):
+            return False
+        return True
+
+    @staticmethod
+    def finalize(request, response):
+        """
+        Make ``response`` renderable, as ``APIView.finalize_response`` would,
+        when a view method returns it before DRF has finalized it. False when
+        it cannot be rendered here (no negotiated renderer on ``request``).
+        """
+        if not isinstance(response, Response) or response.is_rendered:
+            return True
+        if getattr(response, 'accepted_renderer', None) is not None:
+            return True
+        view = (getattr(request, 'parser_context', None) or {}).get('view')
+        renderer = getattr(request, 'accepted_renderer', None)
+        if view is None or renderer is None:
+            return False
+        response.accepted_renderer = renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = view.get_renderer_context()
+        return True
+
+    def store(self, key, response, tag_versions, timeout, stale_ttl, delta):
+        if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+            response.render()
+        entry = {
+            'status': response.status_code,
+            'headers': list(response.items()),
+            'content': response.content,
+            'expires': time.time() + timeout,
+            'delta': delta,
+            'tags': tag_versions,
+        }
+        cache.set(key, entry, timeout=timeout + stale_ttl)
+        return entry
+
+    @staticmethod
+    def to_response(entry, state):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        response['X-Cache'] = state
+        return response
+
+    def serve(self, request, key, build, tags=(), timeout=300, stale_ttl=None, shared=False):
+        """The cached response for ``key``, calling ``build()`` when it needs rebuilding"""
+        if stale_ttl is None:
+            stale_ttl = getattr(settings, 'RESPONSE_CACHE_STALE_TTL', timeout)
+        entry, state, versions = self.lookup(key, tags)
+        if state == FRESH and not self.refresh_early(entry):
+            return self.to_response(entry, FRESH)
+
+        lock_key = f"{key}:lock"
+        lock_timeout = getattr(settings, 'RESPONSE_CACHE_LOCK_TIMEOUT', 30)
+        if cache.add(lock_key, 1, timeout=lock_timeout):
+            try:
+                return self._rebuild(request, key, build, versions, timeout, stale_ttl, shared)
+            finally:
+                cache.delete(lock_key)
+        if entry is not None:
+            # Someone else is rebuilding it
+            return self.to_response(entry, state)
+
+        # Cold miss: wait for the worker holding the lock rather than pile on
+        deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_MAX_WAIT', 2.0)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry, state, versions = self.lookup(key, tags)
+            if entry is not None:
+                return self.to_response(entry, state)
+            if cache.get(lock_key) is None:
+                break
+        return self._rebuild(request, key, build, versions, timeout, stale_ttl, shared)
+
+    def _rebuild(self, request, key, build, versions, timeout, stale_ttl, shared):
+        started = time.monotonic()
+        response = build()
+        if self.cacheable(request, response, shared) and self.finalize(request, response):
+            self.store(key, response, versions, timeout, stale_ttl, time.monotonic() - started)
+            response['X-Cache'] = MISS
+        return response
+
+    def invalidate(self, *tags):
+        """Drop every entry tagged with any of ``tags`` once the transaction commits"""
+        for tag in tags:
+            self.tag_namespace(tag).bump()
+
+
+response_cache = ResponseCache()
+
+
+def request_user(request, view_func):
+    """
+    The user ``view_func`` will see. A DRF view wrapped as a whole (around
+    ``as_view()``) authenticates with its own classes, so a JWT client is
+    still anonymous on the Django request; authenticate it the same way here.
+    Raises ``APIException`` when the credentials are rejected.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if isinstance(request, Request) or not (isinstance(view_class, type) and issubclass(view_class, APIView)):
+        return getattr(request, 'user', None)
+    view = view_class(**getattr(view_func, 'initkwargs', {}))
+    return Request(request, authenticators=view.get_authenticators()).user
+
+
+def cache_response(timeout=300, key_prefix='', stale_ttl=None, tags=(), shared=False):
+    """
+    Cache a view's rendered GET responses in ``response_cache``.
+
+    ``tags`` is a callable ``(request, *args, **kwargs) -> tags`` or a list of
+    strings formatted with the view kwargs, e.g. ``'organization:{pk}'``.
+    Entries are per user unless the view declares ``shared=True``, meaning its
+    response does not depend on which authenticated user asks.
+
+    Works around a whole view (``as_view()`` or ``api_view``) and, through
+    ``method_decorator``, on a DRF view's handler methods.
+    """
     def decorator(view_func):
+        prefix = key_prefix or f"{view_func.__module__}.{view_func.__qualname__}"
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Create unique cache key based on user, method and params
-            cache_key = f"{key_prefix}:{request.user.id}:{request.method}:"
-            cache_key += hashlib.md5(
-                f"{json.dumps(request.GET.dict())}:{json.dumps(kwargs)}".encode()
-            ).hexdigest()
-
-            # Try to get cached response
-            cached_response = cache.get(cache_key)
-            if cached_response is not None:
-                return cached_response
-
-            # Get fresh response
-            response = view_func(request, *args, **kwargs)
-            cache.set(cache_key, response, timeout)
-            return response
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            try:
+                user = request_user(request, view_func)
+            except APIException:
+                # Rejected credentials; the view answers with the error
+                return view_func(request, *args, **kwargs)
+            view_tags = (
+                tags(request, *args, **kwargs) if callable(tags)
+                else [tag.format(**kwargs) for tag in tags]
+            )
+            return response_cache.serve(
+                request,
+                response_cache.key(request, prefix, kwargs, shared, user=user),
+                lambda: view_func(request, *args, **kwargs),
+                tags=view_tags,
+                timeout=timeout,
+                stale_ttl=stale_ttl,
+                shared=shared
+            )
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
@@ -0,0 +1,461 @@
+"""
+Two-tier cache backend: a bounded, TTL-aware LRU in every worker process in
+front of a shared cache (Redis).
+
+Reads are served from the local tier when possible and fall back to the
+shared one; writes go to the shared tier and publish the affected keys on a
+Redis pub/sub channel, and a listener thread in every process drops them from
+its local tier. Local entries also expire after L1_TIMEOUT seconds, which
+bounds staleness when a message is lost (the local tier is cleared whenever
+the listener reconnects).
+
+A value read from the shared tier is kept locally for no longer than it has
+left there (one pipelined TTL lookup per fill), and not at all when the
+shared tier cannot tell (it is not django_redis and has no ``ttl()``). The
+fill is dropped when the key was invalidated while it was being read, so a
+concurrent write cannot be overwritten by the value it replaced.
+
+    CACHES = {
+        'redis': {'BACKEND': 'django_redis.cache.RedisCache', ...},
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': 'redis',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 2048,
+                'L1_TIMEOUT': 30,
+                # Only these keys are kept locally; all keys when empty
+                'L1_KEY_PREFIXES': ['ims:org:', 'evaluation_criteria'],
+            },
+        },
+    }
+
+The local tier is per process and shared by the backend instances Django
+creates for each thread. ``stats()`` returns hit/miss counters per tier, and
+reads are also counted for the current request (``core.instrumentation``) and
+by key prefix (``core.metrics``).
+
+Deployments keeping plain django_redis as the default cache get the same
+counting by replacing its backend, with the other settings unchanged:
+
+    'BACKEND': 'core.cache_backends.InstrumentedRedisCache',
+
+Reads through any other backend are not counted. TwoTierCache already counts
+its own reads, so its shared tier should stay a plain RedisCache.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from core.instrumentation import record_cache_access
+from core.metrics import record_cache_lookups
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_L1_MAX_ENTRIES = 1024
+DEFAULT_L1_TIMEOUT = 30
+MAX_RECONNECT_DELAY = 30
+
+_MISSING = object()
+
+
+def record_lookups(hit_keys, miss_keys):
+    # Per request (Server-Timing) and per key prefix (Prometheus)
+    record_cache_access(hits=len(hit_keys), misses=len(miss_keys))
+    record_cache_lookups(hit_keys, miss_keys)
+
+
+class LocalLRU:
+    """Bounded LRU of pickled values with per-entry expiry, safe across threads"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        # Generation of the last invalidation of each key, and the newest one
+        # no longer tracked (cleared, or evicted from _invalidated)
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, pickled = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+        # Unpickled per read so callers cannot mutate the cached value
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        if timeout <= 0:
+            self.delete_many([key])
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def fill(self, key, value, timeout, generation):
+        """
+        Keep a value read from the shared tier, unless ``key`` was invalidated
+        after ``generation`` (taken before the read)
+        """
+        if timeout <= 0:
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if max(self._forgotten, self._invalidated.get(key, 0)) > generation:
+                return
+            self._data[key] = (time.monotonic() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+                self._invalidated[key] = self._generation
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._invalidated.clear()
+            self._forgotten = self._generation
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalTier:
+    """
+    The per-process part of a TwoTierCache: the LRU, the hit/miss counters
+    and the invalidation listener.
+    """
+
+    COUNTERS = ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses', 'invalidations')
+
+    def __init__(self, l2_alias, channel, max_entries, timeout):
+        self.l2_alias = l2_alias
+        self.channel = channel
+        self.lru = LocalLRU(max_entries, timeout)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.node = None
+        self._pid = None
+        self._redis = _MISSING
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'l1': {'hits': counters['l1_hits'], 'misses': counters['l1_misses'], 'size': len(self.lru)},
+            'l2': {'hits': counters['l2_hits'], 'misses': counters['l2_misses']},
+            'invalidations': counters['invalidations'],
+        }
+
+    def redis(self):
+        """Redis client of the shared tier, or None when it is not django_redis"""
+        if self._redis is _MISSING:
+            try:
+                from django_redis import get_redis_connection
+                self._redis = get_redis_connection(self.l2_alias)
+            except (ImportError, NotImplementedError):
+                logger.warning(
+                    f"Cache '{self.l2_alias}' has no Redis client; local cache entries "
+                    "are only invalidated by their timeout on other processes"
+                )
+                self._redis = None
+        return self._redis
+
+    def ensure_listening(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # First use, or a forked worker that inherited the parent's entries
+            self._pid = pid
+            self.node = uuid.uuid4().hex
+            self.lru.clear()
+            if self.redis() is not None:
+                threading.Thread(
+                    target=self._listen, name='cache-invalidation', daemon=True
+                ).start()
+
+    def _listen(self):
+        delay = 0.5
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed was missed
+                self.lru.clear()
+                delay = 0.5
+                for message in pubsub.listen():
+                    self.handle(message['data'])
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed, reconnecting: {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def publish(self, keys):
+        """Tell the other processes to drop ``keys`` (everything when None)"""
+        self.ensure_listening()
+        redis = self.redis()
+        if redis is None:
+            return
+        try:
+            redis.publish(self.channel, json.dumps({'node': self.node, 'keys': keys}))
+        except Exception as e:
+            logger.error(f"Failed to publish cache invalidation: {str(e)}")
+
+    def handle(self, data):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get('node') == self.node:
+            return
+        self.count('invalidations')
+        if message.get('keys') is None:
+            self.lru.clear()
+        else:
+            self.lru.delete_many(message['keys'])
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location or 'redis'
+        self._key_prefixes = tuple(options.get('L1_KEY_PREFIXES') or ())
+        channel = options.get('CHANNEL', f'cache-invalidation:{self._l2_alias}')
+        with _local_tiers_lock:
+            if channel not in _local_tiers:
+                _local_tiers[channel] = LocalTier(
+                    self._l2_alias,
+                    channel,
+                    options.get('L1_MAX_ENTRIES', DEFAULT_L1_MAX_ENTRIES),
+                    options.get('L1_TIMEOUT', DEFAULT_L1_TIMEOUT)
+                )
+            self._tier = _local_tiers[channel]
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def stats(self):
+        return self._tier.stats()
+
+    def _is_local(self, key):
+        return not self._key_prefixes or key.startswith(self._key_prefixes)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.l2.default_timeout
+        if timeout is None:
+            return self._tier.lru.timeout
+        return min(timeout, self._tier.lru.timeout)
+
+    def _remaining_timeouts(self, keys, version):
+        """
+        ``{key: seconds}`` the keys may be kept locally: what they have left in
+        the shared tier, capped at L1_TIMEOUT. Keys that are gone, or whose
+        expiry is unknown, are left out.
+        """
+        l2 = self.l2
+        try:
+            if isinstance(l2, RedisCache):
+                pipeline = l2.client.get_client(write=False).pipeline(transaction=False)
+                for key in keys:
+                    pipeline.ttl(l2.make_and_validate_key(key, version))
+                # Redis: -1 without expiry, -2 when missing
+                ttls = [None if ttl == -1 else max(ttl, 0) for ttl in pipeline.execute()]
+            elif hasattr(l2, 'ttl'):
+                ttls = [l2.ttl(key, version=version) for key in keys]
+            else:
+                return {}
+        except Exception as e:
+            logger.warning(f"Failed to read remaining cache timeouts: {str(e)}")
+            return {}
+        limit = self._tier.lru.timeout
+        return {
+            key: limit if ttl is None else min(ttl, limit)
+            for key, ttl in zip(keys, ttls) if ttl is None or ttl > 0
+        }
+
+    def _local_keys(self, keys, version):
+        """``{local key: key}`` of the keys kept in the local tier"""
+        return {
+            self.make_and_validate_key(key, version): key
+            for key in keys if self._is_local(key)
+        }
+
+    def _invalidate(self, keys, version):
+        local_keys = list(self._local_keys(keys, version))
+        if local_keys:
+            self._tier.lru.delete_many(local_keys)
+            self._tier.publish(local_keys)
+
+    def get(self, key, default=None, version=None):
+        local = self._is_local(key)
+        if local:
+            self._tier.ensure_listening()
+            local_key = self.make_and_validate_key(key, version)
+            value = self._tier.lru.get(local_key, _MISSING)
+            if value is not _MISSING:
+                self._tier.count('l1_hits')
+                record_lookups([key], ())
+                return value
+            self._tier.count('l1_misses')
+            generation = self._tier.lru.generation
+
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._tier.count('l2_misses')
+            record_lookups((), [key])
+            return default
+        self._tier.count('l2_hits')
+        record_lookups([key], ())
+        if local:
+            timeout = self._remaining_timeouts([key], version).get(key, 0)
+            self._tier.lru.fill(local_key, value, timeout, generation)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        local_keys = self._local_keys(keys, version)
+        if local_keys:
+            self._tier.ensure_listening()
+        for local_key, key in local_keys.items():
+            value = self._tier.lru.get(local_key, _MISSING)
+            if value is _MISSING:
+                self._tier.count('l1_misses')
+            else:
+                self._tier.count('l1_hits')
+                found[key] = value
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            generation = self._tier.lru.generation
+            fetched = self.l2.get_many(remaining, version=version)
+            fill = {local_key: key for local_key, key in local_keys.items() if key in fetched}
+            if fill:
+                timeouts = self._remaining_timeouts(list(fill.values()), version)
+                for local_key, key in fill.items():
+                    self._tier.lru.fill(local_key, fetched[key], timeouts.get(key, 0), generation)
+            for key in remaining:
+                self._tier.count('l2_hits' if key in fetched else 'l2_misses')
+            found.update(fetched)
+        record_lookups(list(found), [key for key in keys if key not in found])
+        return found
+
+    def has_key(self, key, version=None):
+        if self._is_local(key):
+            self._tier.ensure_listening()
+            if self._tier.lru.get(self.make_and_validate_key(key, version), _MISSING) is not _MISSING:
+                return True
+        return self.l2.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._invalidate([key], version)
+        if self._is_local(key):
+            self._tier.lru.set(
+                self.make_and_validate_key(key, version), value, self._local_timeout(timeout)
+            )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        self._invalidate(list(data), version)
+        local_timeout = self._local_timeout(timeout)
+        for local_key, key in self._local_keys(data, version).items():
+            if key not in failed:
+                self._tier.lru.set(local_key, data[key], local_timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        self._invalidate([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self.l2.decr(key, delta, version=version)
+        self._invalidate([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        self._invalidate([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        self._invalidate(keys, version)
+
+    def clear(self):
+        self.l2.clear()
+        self._tier.lru.clear()
+        self._tier.publish(None)
+
+
+class InstrumentedRedisCache(RedisCache):
+    """django_redis backend counting its reads like TwoTierCache does"""
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _MISSING, version=version, client=client)
+        if value is _MISSING:
+            record_lookups((), [key])
+            return default
+        record_lookups([key], ())
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version, client=client)
+        record_lookups(list(found), [key for key in keys if key not in found])
+        return found
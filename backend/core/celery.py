@@ -2,6 +2,7 @@ import os
 from celery import Celery
 from django.conf import settings
 from celery.schedules import crontab
+from core.metrics import connect_celery_signals
 
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -25,9 +26,18 @@ app.conf.accept_content = ['json']
 app.conf.timezone = 'UTC'
 
 # Configure task routing
+# Webhook batches for slow or failing endpoints are published to
+# 'webhooks_degraded' (WEBHOOK_DEGRADED_QUEUE) by WebhookService.enqueue.
+# Nothing consumes that queue unless a worker is started for it:
+#   celery -A core worker -Q webhooks_degraded
+# (see "Celery worker-ууд" in README.md for the full set of workers)
 app.conf.task_routes = {
     'apps.companies.tasks.send_webhook': {'queue': 'webhooks'},
+    'apps.companies.tasks.send_webhook_batch': {'queue': 'webhooks'},
     'apps.companies.tasks.retry_failed_webhooks': {'queue': 'webhooks'},
+    'apps.notifications.tasks.deliver_notifications': {'queue': 'notifications'},
+    'apps.notifications.tasks.flush_recipient_notifications': {'queue': 'notifications'},
+    'apps.notifications.tasks.reconcile_unread_counts': {'queue': 'notifications'},
 }
 
 # Configure task default rate limits
@@ -40,6 +50,10 @@ app.conf.task_annotations = {
         'max_retries': 3,
         'default_retry_delay': 60,  # 1 minute
     },
+    'apps.companies.tasks.send_webhook_batch': {
+        'max_retries': 3,
+        'default_retry_delay': 60,
+    },
     'apps.companies.tasks.retry_failed_webhooks': {
         'rate_limit': '10/m',
     },
@@ -49,9 +63,21 @@ app.conf.task_annotations = {
 app.conf.beat_schedule = {
     'retry-failed-webhooks': {
         'task': 'apps.companies.tasks.retry_failed_webhooks',
-        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+        # Every minute; each run is capped by WEBHOOK_RETRY_MAX_PER_RUN
+        'schedule': crontab(minute='*'),
+    },
+    'reconcile-unread-counts': {
+        'task': 'apps.notifications.tasks.reconcile_unread_counts',
+        'schedule': crontab(minute='*/10'),  # Every 10 minutes
+    },
+    'reconcile-analytics-rollups': {
+        'task': 'apps.dashboard.tasks.reconcile_analytics_rollups',
+        'schedule': crontab(hour=2, minute=0),  # Nightly at 02:00
     },
 }
 
+# Task run time metrics (see core.metrics)
+connect_celery_signals()
+
 # Auto-discover tasks from all installed apps
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS) 
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Shared GraphQL infrastructure: per-request batch loaders, query depth and
+cost limits, and a view with persisted-query support.
+
+Wire the view up as
+``path('graphql/', csrf_exempt(PersistedQueryGraphQLView.as_view(graphiql=settings.DEBUG)))``.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseBadRequest
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError, ValidationRule
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode
+from graphql.type import get_named_type, get_nullable_type, is_list_type
+
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_MAX_COST = 10000
+# Assumed size of a list field without a ``first`` argument
+DEFAULT_LIST_COST = 10
+# Largest page a list field returns; also the size assumed for a ``first``
+# given as a variable, whose value is unknown at validation time
+MAX_PAGE_SIZE = 100
+DEFAULT_PERSISTED_QUERY_TTL = 7 * 24 * 60 * 60
+
+
+class BatchLoader:
+    """
+    Synchronous, per-request DataLoader.
+
+    Keys are queued with ``prime()`` (typically by the resolver that fetched
+    the parent objects) or by ``load()`` itself; the first ``load()`` of a key
+    that is not cached yet fetches every queued key with one call to
+    ``batch_fn(keys) -> {key: value}``. Missing keys resolve to ``default()``.
+    """
+
+    def __init__(self, batch_fn, default=None):
+        self.batch_fn = batch_fn
+        self.default = default
+        self._queue = set()
+        self._cache = {}
+
+    def prime(self, keys):
+        self._queue.update(key for key in keys if key is not None and key not in self._cache)
+
+    def load(self, key):
+        if key is None:
+            return self.default() if self.default else None
+        if key not in self._cache:
+            self._queue.add(key)
+            keys, self._queue = self._queue, set()
+            results = self.batch_fn(list(keys))
+            for queued in keys:
+                self._cache[queued] = results.get(
+                    queued, self.default() if self.default else None
+                )
+        return self._cache[key]
+
+
+def get_loader(info, name, factory):
+    """
+    The request's loader called ``name``, created by ``factory()`` on first
+    use. Works with an HttpRequest or a plain dict as the GraphQL context.
+    """
+    context = info.context
+    if isinstance(context, dict):
+        loaders = context.setdefault('loaders', {})
+    else:
+        loaders = getattr(context, 'loaders', None)
+        if loaders is None:
+            loaders = context.loaders = {}
+    if name not in loaders:
+        loaders[name] = factory()
+    return loaders[name]
+
+
+def get_context_user(info):
+    context = info.context
+    if isinstance(context, dict):
+        return context.get('user')
+    return getattr(context, 'user', None)
+
+
+def cost_limit_validator(max_cost, list_cost=DEFAULT_LIST_COST, max_list_size=MAX_PAGE_SIZE):
+    """
+    Validation rule rejecting operations whose estimated cost exceeds
+    ``max_cost``. Every field costs 1; fields below a list are multiplied by
+    its ``first`` argument capped at ``max_list_size``, by ``max_list_size``
+    when ``first`` is a variable, and by ``list_cost`` without ``first``.
+    """
+
+    class QueryCostLimit(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            root = self.context.schema.get_root_type(node.operation)
+            fragments = {
+                definition.name.value: definition
+                for definition in self.context.document.definitions
+                if definition.kind == 'fragment_definition'
+            }
+            cost = self._selection_cost(node.selection_set, root, fragments, set())
+            if cost > max_cost:
+                name = node.name.value if node.name else 'anonymous'
+                self.report_error(GraphQLError(
+                    f"'{name}' exceeds maximum query cost of {max_cost} (estimated {cost})",
+                    [node],
+                ))
+
+        def _selection_cost(self, selection_set, parent_type, fragments, visited):
+            if selection_set is None or parent_type is None:
+                return 0
+            cost = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    cost += self._field_cost(selection, parent_type, fragments, visited)
+                elif isinstance(selection, InlineFragmentNode):
+                    fragment_type = (
+                        self.context.schema.get_type(selection.type_condition.name.value)
+                        if selection.type_condition else parent_type
+                    )
+                    cost += self._selection_cost(selection.selection_set, fragment_type, fragments, visited)
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    if name in visited or name not in fragments:
+                        continue
+                    fragment = fragments[name]
+                    fragment_type = self.context.schema.get_type(fragment.type_condition.name.value)
+                    cost += self._selection_cost(
+                        fragment.selection_set, fragment_type, fragments, visited | {name}
+                    )
+            return cost
+
+        def _field_cost(self, node, parent_type, fragments, visited):
+            fields = getattr(parent_type, 'fields', {})
+            field = fields.get(node.name.value)
+            if field is None:
+                return 1
+            field_type = get_nullable_type(field.type)
+            child_cost = self._selection_cost(
+                node.selection_set, get_named_type(field_type), fragments, visited
+            )
+            if is_list_type(field_type):
+                child_cost *= self._list_size(node)
+            return 1 + child_cost
+
+        @staticmethod
+        def _list_size(node):
+            for argument in node.arguments or []:
+                if argument.name.value == 'first':
+                    if isinstance(argument.value, IntValueNode):
+                        return min(max(int(argument.value.value), 1), max_list_size)
+                    return max_list_size
+            return list_cost
+
+    return QueryCostLimit
+
+
+def default_validation_rules():
+    return [
+        depth_limit_validator(max_depth=getattr(settings, 'GRAPHQL_MAX_DEPTH', DEFAULT_MAX_DEPTH)),
+        cost_limit_validator(getattr(settings, 'GRAPHQL_MAX_COST', DEFAULT_MAX_COST)),
+    ]
+
+
+class PersistedQueryGraphQLView(GraphQLView):
+    """
+    GraphQLView with depth/cost limits and Automatic Persisted Queries.
+
+    A client may send ``extensions.persistedQuery.sha256Hash`` without the
+    query text; the query is then looked up in the cache. Sending the text with
+    its hash registers it. With GRAPHQL_PERSISTED_QUERIES_ONLY, only
+    registered hashes are executed and new registrations are refused, so
+    partners can only run queries that were deployed with our own clients.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if not kwargs.get('validation_rules'):
+            kwargs['validation_rules'] = default_validation_rules()
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def persisted_query_key(sha256_hash):
+        return f"{getattr(settings, 'CACHE_KEY_PREFIX', '')}:graphql:persisted:{sha256_hash}"
+
+    @classmethod
+    def register(cls, query, permanent=False):
+        """
+        Store ``query`` under its hash and return the hash. Queries registered
+        at deploy time are ``permanent``; ones registered by clients expire,
+        and never replace an existing entry, so a client sending the text of a
+        permanent query does not give it a TTL.
+        """
+        sha256_hash = hashlib.sha256(query.encode()).hexdigest()
+        key = cls.persisted_query_key(sha256_hash)
+        if permanent:
+            cache.set(key, query, timeout=None)
+        else:
+            cache.add(key, query, timeout=getattr(
+                settings, 'GRAPHQL_PERSISTED_QUERY_TTL', DEFAULT_PERSISTED_QUERY_TTL
+            ))
+        return sha256_hash
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        extensions = data.get('extensions') or request.GET.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        persisted = (extensions or {}).get('persistedQuery')
+        persisted_only = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False)
+
+        if not persisted:
+            if persisted_only and query:
+                raise HttpError(HttpResponseBadRequest('Only persisted queries are allowed.'))
+            return query, variables, operation_name, id
+
+        sha256_hash = persisted.get('sha256Hash', '')
+        if query:
+            if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+                raise HttpError(HttpResponseBadRequest('provided sha does not match query'))
+            if persisted_only and cache.get(self.persisted_query_key(sha256_hash)) is None:
+                raise HttpError(HttpResponseBadRequest('Only persisted queries are allowed.'))
+            self.register(query)
+            return query, variables, operation_name, id
+
+        query = cache.get(self.persisted_query_key(sha256_hash))
+        if query is None:
+            # Apollo clients retry with the full query text on this message
+            raise HttpError(HttpResponseBadRequest('PersistedQueryNotFound'))
+        return query, variables, operation_name, id
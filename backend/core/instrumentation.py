@@ -0,0 +1,249 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` collects, for every request, the SQL queries run on
+any connection (through an execute wrapper), cache hits and misses reported by
+the backends in ``core.cache_backends`` (reads through other backends are not
+seen), time spent in DRF serializers' ``data`` and time spent in the view. The totals go out in a ``Server-Timing`` header
+(staff and DEBUG only unless SERVER_TIMING_PUBLIC is set).
+
+Requests slower than PERFORMANCE_SLOW_REQUEST_MS are candidates for the
+slow-request log: the slowest PERFORMANCE_SLOW_REQUEST_COUNT of them are kept
+in the cache with their queries and duplicated-query fingerprints, which is
+how N+1 regressions show up. Staff can read it through
+``core.views.slow_requests``.
+"""
+import contextvars
+import hashlib
+import re
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_SLOW_REQUEST_COUNT = 50
+DEFAULT_SLOW_REQUEST_TTL = 7 * 24 * 60 * 60
+MAX_RECORDED_QUERIES = 200
+MAX_SQL_LENGTH = 2000
+LOCK_TIMEOUT = 5
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    """Statement shape with literals and IN-list lengths removed"""
+    shape = _LITERAL.sub('?', _IN_LIST.sub('IN (...)', sql))
+    return hashlib.md5(' '.join(shape.split()).encode()).hexdigest()[:12]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_time = 0.0
+        self.view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.query_count += 1
+            self.sql_time += duration
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((sql, duration, context['connection'].alias))
+
+    def duplicates(self):
+        """``{fingerprint: {'count', 'sql'}}`` of statements run more than once"""
+        seen = {}
+        for sql, _duration, _alias in self.queries:
+            entry = seen.setdefault(fingerprint(sql), {'count': 0, 'sql': sql[:MAX_SQL_LENGTH]})
+            entry['count'] += 1
+        return {key: entry for key, entry in seen.items() if entry['count'] > 1}
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'serialize;dur={self.serializer_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_cache_access(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def _timed_data(prop):
+    def data(serializer):
+        metrics = _current.get()
+        if metrics is None:
+            return prop.fget(serializer)
+        # A serializer building another one's data inside its own is not
+        # counted twice
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return prop.fget(serializer)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+    data._timed = True
+    return property(data)
+
+
+def time_serializers():
+    """Time ``Serializer.data`` and ``ListSerializer.data`` for the current request"""
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not getattr(prop.fget, '_timed', False):
+            cls.data = _timed_data(prop)
+
+
+class SlowRequestLog:
+    @staticmethod
+    def cache_key():
+        return f"{getattr(settings, 'CACHE_KEY_PREFIX', '')}:perf:slow_requests"
+
+    @staticmethod
+    def threshold():
+        return getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+
+    @classmethod
+    def entries(cls):
+        """Slowest requests first"""
+        return cache.get(cls.cache_key()) or []
+
+    @classmethod
+    def record(cls, entry):
+        """
+        Keep ``entry`` if it is among the slowest PERFORMANCE_SLOW_REQUEST_COUNT.
+        Skipped when another worker holds the lock; losing an occasional
+        sample is cheaper than waiting for it.
+        """
+        key = cls.cache_key()
+        lock_key = f"{key}:lock"
+        if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            return False
+        try:
+            size = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_COUNT', DEFAULT_SLOW_REQUEST_COUNT)
+            entries = cache.get(key) or []
+            if len(entries) >= size and entries[-1]['duration_ms'] >= entry['duration_ms']:
+                return False
+            entries.append(entry)
+            entries.sort(key=lambda item: item['duration_ms'], reverse=True)
+            cache.set(
+                key,
+                entries[:size],
+                timeout=getattr(settings, 'PERFORMANCE_SLOW_REQUEST_TTL', DEFAULT_SLOW_REQUEST_TTL)
+            )
+            return True
+        finally:
+            cache.delete(lock_key)
+
+    @classmethod
+    def clear(cls):
+        cache.delete(cls.cache_key())
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if getattr(settings, 'PERFORMANCE_TIME_SERIALIZERS', True):
+            time_serializers()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+            # Responses without a render step stop the view timer here
+            self._stop_view_timer()
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - metrics.started
+
+        if self.show_timing(request):
+            response['Server-Timing'] = metrics.server_timing(total)
+        if total * 1000 >= SlowRequestLog.threshold():
+            SlowRequestLog.record(self.slow_request_entry(request, response, metrics, total))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this; the view time stops here
+        self._stop_view_timer()
+        return response
+
+    def process_exception(self, request, exception):
+        self._stop_view_timer()
+
+    @staticmethod
+    def _stop_view_timer():
+        metrics = _current.get()
+        if metrics is not None and metrics.view_started is not None:
+            metrics.view_time = time.perf_counter() - metrics.view_started
+            metrics.view_started = None
+
+    @staticmethod
+    def show_timing(request):
+        if settings.DEBUG or getattr(settings, 'SERVER_TIMING_PUBLIC', False):
+            return True
+        return getattr(getattr(request, 'user', None), 'is_staff', False)
+
+    @staticmethod
+    def slow_request_entry(request, response, metrics, total):
+        resolver_match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status_code': response.status_code,
+            'user': user.pk if getattr(user, 'is_authenticated', False) else None,
+            'duration_ms': round(total * 1000, 1),
+            'view_ms': round(metrics.view_time * 1000, 1),
+            'serializer_ms': round(metrics.serializer_time * 1000, 1),
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'query_count': metrics.query_count,
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'queries': [
+                {'sql': sql[:MAX_SQL_LENGTH], 'ms': round(duration * 1000, 2), 'db': alias}
+                for sql, duration, alias in metrics.queries
+            ],
+            'duplicates': metrics.duplicates(),
+        }
+
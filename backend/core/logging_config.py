@@ -30,6 +30,9 @@ LOGGING = {
             'format': '{asctime} {levelname} {message} - Method: {method} Path: {path} Status: {status_code} User: {user}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.request_logging.JSONFormatter',
+        },
     },
     'filters': {
         'require_debug_true': {
@@ -65,10 +68,11 @@ LOGGING = {
             'filters': ['require_debug_true'],
         },
         'api_file': {
+            # Written by a background thread; see core.request_logging
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.request_logging.BackgroundFileHandler',
             'filename': API_LOG,
-            'formatter': 'api',
+            'formatter': 'json',
         },
         'db_file': {
             'level': 'DEBUG',
@@ -0,0 +1,143 @@
+"""
+Prometheus metrics.
+
+Metrics are recorded by ``MetricsMiddleware`` (HTTP latency by resolved view
+and status, DB queries), the ``core.cache_backends`` backends (hits and
+misses by key prefix), the
+webhook tasks, Celery task signals and ``ChatConsumer`` (open WebSockets), and
+exposed in the text format by ``core.views.metrics``.
+
+Under gunicorn every worker is a separate process. Set
+PROMETHEUS_MULTIPROC_DIR to an empty directory before the server starts so
+that each process writes its samples to memory-mapped files there, which the
+metrics view aggregates; ``gunicorn.conf.py`` cleans the directory on start
+and drops the gauges of workers that exit. Every other process importing this
+module (Celery workers, the ASGI server, management commands) creates the
+directory if it is missing and writes its samples there too.
+"""
+import os
+import re
+import time
+from contextlib import ExitStack
+from celery.signals import task_postrun, task_prerun
+from django.db import connections
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+)
+
+DB_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5)
+UNRESOLVED_VIEW = '<unresolved>'
+
+_KEY_PREFIX = re.compile(r'[A-Za-z_\-]+(?::[A-Za-z_\-]+)?')
+
+# Metric values open their files in this directory as soon as they exist
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by resolved view',
+    ['view', 'method', 'status'],
+)
+db_query_duration = Histogram(
+    'db_query_duration_seconds',
+    'SQL statement latency during HTTP requests',
+    ['database'],
+    buckets=DB_BUCKETS,
+)
+cache_requests = Counter(
+    'cache_requests_total',
+    'Cache lookups by key prefix and result',
+    ['prefix', 'result'],
+)
+webhook_deliveries = Counter(
+    'webhook_deliveries_total',
+    'Webhook delivery attempts by outcome',
+    ['outcome'],
+)
+celery_task_duration = Histogram(
+    'celery_task_duration_seconds',
+    'Celery task run time by task and final state',
+    ['task', 'state'],
+)
+websocket_connections = Gauge(
+    'websocket_connections',
+    'Open WebSocket connections',
+    ['consumer'],
+    multiprocess_mode='livesum',
+)
+
+
+def registry():
+    """Registry to expose: the per-process files in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def key_prefix(key):
+    """Leading one or two ``:``-separated words of a cache key, without ids"""
+    match = _KEY_PREFIX.match(key)
+    return match.group(0) if match else 'other'
+
+
+def record_cache_lookups(hit_keys=(), miss_keys=()):
+    for key in hit_keys:
+        cache_requests.labels(key_prefix(key), 'hit').inc()
+    for key in miss_keys:
+        cache_requests.labels(key_prefix(key), 'miss').inc()
+
+
+def record_webhook_outcomes(stats):
+    """``stats`` as returned by ``WebhookDeliveryEngine.deliver``"""
+    for outcome, count in stats.items():
+        if count:
+            webhook_deliveries.labels(outcome).inc(count)
+
+
+def observe_query(execute, sql, params, many, context):
+    """connection.execute_wrapper timing every statement"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        db_query_duration.labels(context['connection'].alias).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(observe_query))
+            response = self.get_response(request)
+        resolver_match = getattr(request, 'resolver_match', None)
+        http_request_duration.labels(
+            resolver_match.view_name if resolver_match else UNRESOLVED_VIEW,
+            request.method,
+            str(response.status_code)
+        ).observe(time.perf_counter() - started)
+        return response
+
+
+_task_started = {}
+
+
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        celery_task_duration.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+def connect_celery_signals():
+    task_prerun.connect(task_started, weak=False, dispatch_uid='metrics_task_started')
+    task_postrun.connect(task_finished, weak=False, dispatch_uid='metrics_task_finished')
@@ -0,0 +1,128 @@
+import base64
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on ``(created_at, id)``.
+
+    Without a cursor the newest page is returned. ``?before=<cursor>`` returns
+    the page of rows older than the cursor and ``?after=<cursor>`` the page of
+    rows newer than it, so scrollback and polling both cost one indexed range
+    scan regardless of how deep the client has scrolled. Cursors are opaque
+    tokens taken from the ``before``/``after`` fields of a previous response.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    before_query_param = 'before'
+    after_query_param = 'after'
+    timestamp_field = 'created_at'
+    # Order of ``results`` in the response: 'asc' for chat-style scrollback,
+    # 'desc' for feeds
+    results_order = 'desc'
+
+    @staticmethod
+    def encode_cursor(timestamp, pk):
+        raw = f'{timestamp.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            parsed = parse_datetime(timestamp)
+            if parsed is None:
+                raise ValueError(timestamp)
+            return parsed, int(pk)
+        except (ValueError, UnicodeDecodeError, DjangoValidationError):
+            raise ValidationError({'cursor': 'Invalid cursor'})
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        field = self.timestamp_field
+        page_size = self.get_page_size(request)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+
+        if after:
+            timestamp, pk = self.decode_cursor(after)
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+        else:
+            if before:
+                timestamp, pk = self.decode_cursor(before)
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{field}', '-pk')
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # Rows are fetched in scan order; flip them into newest-first order
+        if after:
+            rows.reverse()
+            self.has_before = True
+            self.has_after = has_more
+        else:
+            self.has_before = has_more
+            self.has_after = bool(before)
+
+        if rows:
+            newest, oldest = rows[0], rows[-1]
+            self.before = self.encode_cursor(getattr(oldest, field), oldest.pk)
+            self.after = self.encode_cursor(getattr(newest, field), newest.pk)
+        else:
+            self.before = before or None
+            self.after = after or None
+
+        if self.results_order == 'asc':
+            rows.reverse()
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'before': self.before,
+            'after': self.after,
+            'has_before': self.has_before,
+            'has_after': self.has_after,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'before': {'type': 'string', 'nullable': True},
+                'after': {'type': 'string', 'nullable': True},
+                'has_before': {'type': 'boolean'},
+                'has_after': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+
+class MessageKeysetPagination(KeysetPagination):
+    """Chat history: oldest-first pages, walked backwards with ``before``"""
+    results_order = 'asc'
+
+
+class NotificationKeysetPagination(KeysetPagination):
+    """Notification feed: newest-first pages"""
+    page_size = 20
+    results_order = 'desc'
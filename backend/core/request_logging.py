@@ -0,0 +1,247 @@
+"""
+Sampled API request logging that stays off the request thread.
+
+``APILoggingMiddleware`` decides per request whether to log it (see
+``sample_rate``) and only then builds a record; bodies are captured, capped
+and redacted only for errors and a sampled fraction of requests. Records go
+to the ``api`` logger, whose ``BackgroundFileHandler`` hands them to a
+``QueueListener`` thread that formats them as JSON and writes the file.
+
+Settings:
+    API_LOG_SAMPLE_RATE         default fraction of requests logged (1.0)
+    API_LOG_PATH_SAMPLE_RATES   ``{path prefix: rate}``, longest prefix wins
+    API_LOG_STATUS_SAMPLE_RATES ``{500: rate, '4xx': rate}``, overrides paths
+    API_LOG_BODY_SAMPLE_RATE    fraction of logged successes with bodies (0.0)
+    API_LOG_MAX_BODY_BYTES      cap on each captured body (2048)
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+from django.conf import settings
+from django.http import QueryDict
+
+logger = logging.getLogger('api')
+
+DEFAULT_STATUS_SAMPLE_RATES = {'5xx': 1.0, '4xx': 1.0}
+DEFAULT_MAX_BODY_BYTES = 2048
+# Request bodies larger than this are never buffered for capture
+MAX_BODY_READ_BYTES = 64 * 1024
+DEFAULT_QUEUE_SIZE = 10000
+REDACTED = '[REDACTED]'
+REDACT_FIELDS = {
+    'password', 'password1', 'password2', 'old_password', 'new_password',
+    'token', 'access', 'refresh', 'secret', 'secret_key', 'authorization',
+}
+BODY_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+CAPTURABLE_CONTENT_TYPES = ('application/json', 'application/x-www-form-urlencoded')
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the record's ``extra`` fields at top level"""
+
+    def format(self, record):
+        data = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class BackgroundFileHandler(QueueHandler):
+    """
+    Appends to ``filename`` from a writer thread. The request thread only puts
+    the record on a bounded queue; when the queue is full the record is
+    dropped and counted rather than blocking the request.
+    """
+
+    def __init__(self, filename, max_queue_size=DEFAULT_QUEUE_SIZE, encoding='utf-8'):
+        self.target = logging.FileHandler(filename, encoding=encoding, delay=True)
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._pid = None
+        self.listener = None
+        super().__init__(queue.Queue(max_queue_size))
+        self._start()
+        atexit.register(self.stop)
+
+    def _start(self):
+        # A worker forked from a process that had started the listener gets a
+        # fresh queue and thread; the parent's thread does not survive the fork
+        if self._pid is not None:
+            self.queue = queue.Queue(self.max_queue_size)
+        self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the writer thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def _status_rate(status_code, rates):
+    for key in (status_code, str(status_code), f'{status_code // 100}xx'):
+        if key in rates:
+            return rates[key]
+    return None
+
+
+def sample_rate(path, status_code):
+    """Fraction of requests to ``path`` answered with ``status_code`` that are logged"""
+    rate = _status_rate(
+        status_code,
+        getattr(settings, 'API_LOG_STATUS_SAMPLE_RATES', DEFAULT_STATUS_SAMPLE_RATES)
+    )
+    if rate is not None:
+        return rate
+    path_rates = getattr(settings, 'API_LOG_PATH_SAMPLE_RATES', {})
+    matches = [prefix for prefix in path_rates if path.startswith(prefix)]
+    if matches:
+        return path_rates[max(matches, key=len)]
+    return getattr(settings, 'API_LOG_SAMPLE_RATE', 1.0)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in REDACT_FIELDS else _redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def _omitted(body, content_type):
+    return f'[{len(body)} bytes of {content_type} not logged]'
+
+
+def capture_body(body, content_type):
+    """
+    ``body`` as text with sensitive fields redacted, cut to
+    API_LOG_MAX_BODY_BYTES. JSON that cannot be redacted (too large to parse,
+    or invalid) is replaced by its size and type.
+    """
+    if not body:
+        return None
+    limit = getattr(settings, 'API_LOG_MAX_BODY_BYTES', DEFAULT_MAX_BODY_BYTES)
+    if content_type.startswith('application/json'):
+        if len(body) > MAX_BODY_READ_BYTES:
+            return _omitted(body, content_type)
+        try:
+            body = json.dumps(_redact(json.loads(body))).encode()
+        except ValueError:
+            return _omitted(body, content_type)
+    elif content_type.startswith('application/x-www-form-urlencoded'):
+        form = QueryDict(body)
+        body = '&'.join(
+            f'{key}={REDACTED if key.lower() in REDACT_FIELDS else value}'
+            for key, value in form.items()
+        ).encode()
+    text = body[:limit].decode('utf-8', errors='replace')
+    if len(body) > limit:
+        text += f'... [{len(body) - limit} more bytes]'
+    return text
+
+
+class APILoggingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        request_body = self._buffer_body(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if random.random() >= sample_rate(request.path, response.status_code):
+            return response
+
+        user = getattr(request, 'user', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'query_string': request.META.get('QUERY_STRING', ''),
+            'status_code': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'user': user.pk if getattr(user, 'is_authenticated', False) else None,
+            'remote_addr': request.META.get('REMOTE_ADDR'),
+            'response_size': None if response.streaming else len(response.content),
+        }
+        if response.status_code >= 400 or random.random() < getattr(settings, 'API_LOG_BODY_SAMPLE_RATE', 0.0):
+            record['request_body'] = capture_body(request_body, request.content_type or '')
+            if not response.streaming:
+                record['response_body'] = capture_body(
+                    response.content, response.get('Content-Type', '')
+                )
+
+        if response.status_code >= 500:
+            level = logging.ERROR
+        elif response.status_code >= 400:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(level, f'{request.method} {request.path} {response.status_code}', extra=record)
+        return response
+
+    @staticmethod
+    def _buffer_body(request):
+        """Keep small form/JSON request bodies so they can be logged if needed"""
+        if request.method not in BODY_METHODS:
+            return None
+        if not (request.content_type or '').startswith(CAPTURABLE_CONTENT_TYPES):
+            return None
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if not 0 < length <= MAX_BODY_READ_BYTES:
+            return None
+        return request.body
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.test import force_authenticate
+from apps.companies.models import Organization
+from core.instrumentation import (
+    PerformanceMiddleware, SlowRequestLog, fingerprint, record_cache_access
+)
+from core.views import slow_requests
+
+User = get_user_model()
+
+
+class OrganizationNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Organization
+        fields = ('id', 'name')
+
+
+@override_settings(DEBUG=False, SERVER_TIMING_PUBLIC=False, PERFORMANCE_SLOW_REQUEST_MS=0)
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.staff = User.objects.create_user(username='admin', password='x', is_staff=True)
+        Organization.objects.create(name='Acme')
+        Organization.objects.create(name='Globex')
+
+    def view(self, request):
+        # An N+1 shaped view
+        for organization in Organization.objects.all():
+            Organization.objects.filter(pk=organization.pk).exists()
+        record_cache_access(hits=2, misses=1)
+        data = OrganizationNameSerializer(Organization.objects.all(), many=True).data
+        return HttpResponse(str(data))
+
+    def call(self, user=None):
+        request = self.factory.get('/api/companies/')
+        request.user = user or self.staff
+        return PerformanceMiddleware(self.view)(request)
+
+    def test_server_timing_for_staff(self):
+        response = self.call()
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="4 queries"', timing)
+        self.assertIn('cache;desc="2 hits, 1 misses"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_no_server_timing_for_other_users(self):
+        user = User.objects.create_user(username='student', password='x')
+        self.assertNotIn('Server-Timing', self.call(user))
+
+    def test_slow_requests_keep_queries_and_duplicates(self):
+        self.call()
+        entry = SlowRequestLog.entries()[0]
+        self.assertEqual(entry['path'], '/api/companies/')
+        self.assertEqual(entry['query_count'], 4)
+        self.assertEqual(len(entry['queries']), 4)
+        duplicates = list(entry['duplicates'].values())
+        self.assertEqual(len(duplicates), 2)
+        self.assertIn(2, [duplicate['count'] for duplicate in duplicates])
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_COUNT=2)
+    def test_log_keeps_only_the_slowest(self):
+        for duration in (10, 30, 20, 5):
+            SlowRequestLog.record({'duration_ms': duration})
+        self.assertEqual([entry['duration_ms'] for entry in SlowRequestLog.entries()], [30, 20])
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND a = 1'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)  AND a = 2')
+        )
+        self.assertNotEqual(fingerprint('SELECT a FROM t'), fingerprint('SELECT b FROM t'))
+
+    def test_slow_requests_view_is_staff_only(self):
+        SlowRequestLog.record({'duration_ms': 900})
+        request = self.factory.get('/api/performance/slow-requests/')
+        force_authenticate(request, user=self.staff)
+        self.assertEqual(slow_requests(request).data['results'], [{'duration_ms': 900}])
+
+        request = self.factory.get('/api/performance/slow-requests/')
+        force_authenticate(request, user=User.objects.create_user(username='student', password='x'))
+        self.assertEqual(slow_requests(request).status_code, 403)
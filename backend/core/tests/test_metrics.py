@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import ResolverMatch
+from prometheus_client import REGISTRY
+import core
+from apps.companies.tasks import send_webhook_batch
+from core.metrics import MetricsMiddleware, key_prefix
+from core.views import metrics
+
+User = get_user_model()
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_requests_are_timed_by_resolved_view(self):
+        labels = {'view': 'organization-list', 'method': 'GET', 'status': '200'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        queries_before = sample('db_query_duration_seconds_count', database='default')
+
+        def view(request):
+            request.resolver_match = ResolverMatch(view, (), {}, url_name='organization-list')
+            User.objects.count()
+            return HttpResponse('ok')
+
+        MetricsMiddleware(view)(self.factory.get('/api/organizations/'))
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(sample('db_query_duration_seconds_count', database='default'), queries_before + 1)
+
+    def test_webhook_outcomes_are_counted(self):
+        before = sample('webhook_deliveries_total', outcome='delivered')
+        stats = {'delivered': 3, 'retrying': 0, 'failed': 0, 'parked': 0}
+        with patch('apps.companies.tasks.delivery_engine.deliver', return_value=stats):
+            send_webhook_batch([1, 2, 3])
+        self.assertEqual(sample('webhook_deliveries_total', outcome='delivered'), before + 3)
+
+    def test_metrics_failure_does_not_resend_the_batch(self):
+        stats = {'delivered': 3, 'retrying': 0, 'failed': 0, 'parked': 0}
+        with patch('apps.companies.tasks.delivery_engine.deliver', return_value=stats), \
+                patch('apps.companies.tasks.record_webhook_outcomes', side_effect=OSError), \
+                patch.object(send_webhook_batch, 'retry') as retry:
+            with self.assertRaises(OSError):
+                send_webhook_batch([1, 2, 3])
+        retry.assert_not_called()
+
+    def test_multiprocess_directory_is_created_on_import(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'prometheus-metrics')
+            subprocess.run(
+                [sys.executable, '-c', 'import core.metrics; core.metrics.webhook_deliveries.labels("delivered").inc()'],
+                env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': path},
+                cwd=os.path.dirname(os.path.dirname(core.__file__)),
+                check=True,
+            )
+            self.assertTrue(os.listdir(path))
+
+    def test_cache_key_prefixes_drop_ids(self):
+        self.assertEqual(key_prefix('ims:org:g1700000000000:list'), 'ims:org')
+        self.assertEqual(key_prefix('evaluation_criteria'), 'evaluation_criteria')
+        self.assertEqual(key_prefix('user_42_profile'), 'user_')
+
+    @override_settings(METRICS_TOKEN='scrape', METRICS_ALLOWED_IPS=('10.0.0.1',))
+    def test_endpoint_requires_allowed_ip_or_token(self):
+        self.assertEqual(metrics(self.factory.get('/metrics')).status_code, 403)
+
+        response = metrics(self.factory.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds', response.content)
+        self.assertIn(b'websocket_connections', response.content)
+
+        response = metrics(self.factory.get('/metrics', REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import tempfile
+from unittest.mock import patch
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from core.request_logging import (
+    MAX_BODY_READ_BYTES, APILoggingMiddleware, BackgroundFileHandler, JSONFormatter, capture_body,
+    sample_rate
+)
+
+
+class RequestLoggingHelpersTest(SimpleTestCase):
+    @override_settings(
+        API_LOG_SAMPLE_RATE=0.1,
+        API_LOG_PATH_SAMPLE_RATES={'/api/': 0.5, '/api/health/': 0.0},
+        API_LOG_STATUS_SAMPLE_RATES={'5xx': 1.0, 404: 0.2},
+    )
+    def test_status_overrides_longest_path_prefix(self):
+        self.assertEqual(sample_rate('/api/health/', 200), 0.0)
+        self.assertEqual(sample_rate('/api/companies/', 200), 0.5)
+        self.assertEqual(sample_rate('/admin/', 200), 0.1)
+        self.assertEqual(sample_rate('/api/health/', 503), 1.0)
+        self.assertEqual(sample_rate('/api/companies/', 404), 0.2)
+
+    @override_settings(API_LOG_MAX_BODY_BYTES=60)
+    def test_captured_bodies_are_redacted_and_capped(self):
+        body = json.dumps({'username': 'alice', 'password': 'hunter2', 'notes': 'x' * 100}).encode()
+        captured = capture_body(body, 'application/json')
+        self.assertNotIn('hunter2', captured)
+        self.assertIn('[REDACTED]', captured)
+        self.assertTrue(captured.endswith('more bytes]'))
+
+        form = capture_body(b'username=alice&password=hunter2', 'application/x-www-form-urlencoded')
+        self.assertEqual(form, 'username=alice&password=[REDACTED]')
+
+    def test_json_that_cannot_be_redacted_is_not_logged(self):
+        invalid = b'{"password": "hunter2",'
+        self.assertEqual(
+            capture_body(invalid, 'application/json'),
+            f'[{len(invalid)} bytes of application/json not logged]'
+        )
+        large = json.dumps({'password': 'hunter2', 'notes': 'x' * MAX_BODY_READ_BYTES}).encode()
+        self.assertNotIn('hunter2', capture_body(large, 'application/json'))
+
+
+@override_settings(API_LOG_SAMPLE_RATE=1.0, API_LOG_BODY_SAMPLE_RATE=0.0)
+class APILoggingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def call(self, request, response):
+        return APILoggingMiddleware(lambda request: response)(request)
+
+    def test_successes_are_logged_without_bodies(self):
+        request = self.factory.get('/api/companies/', {'page': 2})
+        with self.assertLogs('api', level='INFO') as logs:
+            self.call(request, JsonResponse({'results': [1, 2, 3]}))
+        record = logs.records[0]
+        self.assertEqual((record.method, record.path, record.status_code), ('GET', '/api/companies/', 200))
+        self.assertEqual(record.query_string, 'page=2')
+        self.assertFalse(hasattr(record, 'response_body'))
+
+    def test_errors_capture_bodies(self):
+        request = self.factory.post(
+            '/api/auth/login/', {'username': 'alice', 'password': 'hunter2'}, content_type='application/json'
+        )
+        with self.assertLogs('api', level='WARNING') as logs:
+            self.call(request, JsonResponse({'detail': 'Invalid credentials'}, status=400))
+        record = logs.records[0]
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertIn('[REDACTED]', record.request_body)
+        self.assertIn('Invalid credentials', record.response_body)
+
+    @override_settings(API_LOG_PATH_SAMPLE_RATES={'/api/health/': 0.0})
+    def test_unsampled_requests_are_not_logged(self):
+        with patch('core.request_logging.logger.log') as log:
+            self.call(self.factory.get('/api/health/'), HttpResponse('ok'))
+            self.call(self.factory.get('/static/app.js'), HttpResponse('ok'))
+        log.assert_not_called()
+
+
+class BackgroundFileHandlerTest(SimpleTestCase):
+    def test_writes_json_lines_from_the_listener_thread(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'api.log')
+            handler = BackgroundFileHandler(path)
+            handler.setFormatter(JSONFormatter())
+            log = logging.getLogger('test.background')
+            log.addHandler(handler)
+            log.propagate = False
+            try:
+                log.warning('GET /api/ 404', extra={'status_code': 404})
+            finally:
+                log.removeHandler(handler)
+                handler.close()
+            with open(path) as f:
+                line = json.loads(f.readline())
+        self.assertEqual(line['message'], 'GET /api/ 404')
+        self.assertEqual(line['status_code'], 404)
+        self.assertEqual(line['level'], 'WARNING')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = BackgroundFileHandler(os.path.join(directory, 'api.log'), max_queue_size=1)
+            handler.listener.stop()
+            try:
+                record = logging.makeLogRecord({'msg': 'x'})
+                handler.handle(record)
+                handler.handle(record)
+                self.assertEqual(handler.dropped, 1)
+            finally:
+                handler.listener = None
+                handler.close()
@@ -0,0 +1,181 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.decorators import method_decorator
+from rest_framework.decorators import api_view
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+from core.authentication import CustomJWTAuthentication
+from core.cache import cache_response, response_cache
+
+User = get_user_model()
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='alice', password='x')
+        self.other = User.objects.create_user(username='bob', password='x')
+        self.calls = 0
+
+    def view(self, **options):
+        @cache_response(timeout=60, key_prefix='test', **options)
+        @api_view(['GET', 'POST'])
+        def dashboard(request, pk=None):
+            self.calls += 1
+            return Response({'calls': self.calls, 'pk': pk})
+        return dashboard
+
+    def key(self):
+        request = self.factory.get('/dashboard/', {'page': 1})
+        request.user = self.user
+        return response_cache.key(request, 'test', {})
+
+    def get(self, view, user=None, **kwargs):
+        request = self.factory.get('/dashboard/', {'page': 1})
+        request.user = user or self.user
+        return view(request, **kwargs)
+
+    def test_stores_rendered_body_and_headers(self):
+        view = self.view()
+        first = self.get(view)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        second = self.get(view)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        self.assertEqual(self.calls, 1)
+        entry = cache.get(self.key())
+        self.assertIsInstance(entry['content'], bytes)
+
+    def test_entries_are_per_user_unless_shared(self):
+        view = self.view()
+        self.get(view)
+        self.get(view, user=self.other)
+        self.assertEqual(self.calls, 2)
+
+        shared = self.view(shared=True)
+        self.get(shared)
+        self.assertEqual(self.get(shared, user=self.other)['X-Cache'], 'HIT')
+        self.assertEqual(self.calls, 3)
+
+    def test_stale_entry_is_served_while_another_worker_rebuilds(self):
+        view = self.view()
+        with patch('core.cache.time.time', return_value=1000.0):
+            self.get(view)
+        key = self.key()
+        cache.add(f'{key}:lock', 1)
+
+        with patch('core.cache.time.time', return_value=1061.0):
+            response = self.get(view)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(f'{key}:lock')
+        with patch('core.cache.time.time', return_value=1061.0):
+            self.assertEqual(self.get(view)['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 2)
+
+    def test_cold_miss_waits_for_the_lock_holder(self):
+        view = self.view()
+        key = self.key()
+        cache.add(f'{key}:lock', 1)
+
+        def lock_holder_finishes(_seconds):
+            response_cache.store(key, HttpResponse(b'built elsewhere'), {}, 60, 60, 0.01)
+
+        with patch('core.cache.time.sleep', side_effect=lock_holder_finishes):
+            response = self.get(view)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertIn(b'built elsewhere', response.content)
+        self.assertEqual(self.calls, 0)
+
+    def test_early_refresh_probability_rises_towards_expiry(self):
+        entry = {'expires': 1000.0, 'delta': 1.0}
+        with patch('core.cache.random.random', return_value=0.5):
+            with patch('core.cache.time.time', return_value=900.0):
+                self.assertFalse(response_cache.refresh_early(entry))
+            with patch('core.cache.time.time', return_value=999.5):
+                self.assertTrue(response_cache.refresh_early(entry))
+
+    def test_tags_invalidate_entries(self):
+        view = self.view(tags=['organization:{pk}'])
+        self.get(view, pk=1)
+        self.get(view, pk=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            response_cache.invalidate('organization:1')
+
+        self.assertEqual(self.get(view, pk=1)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(view, pk=2)['X-Cache'], 'HIT')
+        self.assertEqual(self.calls, 3)
+
+    def test_unsafe_methods_are_not_cached(self):
+        view = self.view()
+        request = self.factory.post('/dashboard/')
+        request.user = self.user
+        request._dont_enforce_csrf_checks = True
+        view(request)
+        self.assertNotIn('X-Cache', view(request))
+        self.assertEqual(self.calls, 2)
+
+
+class JWTProfileView(APIView):
+    authentication_classes = [CustomJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'username': request.user.username})
+
+
+class CachedJWTProfileView(JWTProfileView):
+    @method_decorator(cache_response(timeout=60, key_prefix='profile-method'))
+    def get(self, request):
+        return super().get(request)
+
+
+@override_settings(SIMPLE_JWT={})
+class JWTResponseCacheTest(TestCase):
+    """Clients authenticated by DRF only, not on the Django request"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.alice = User.objects.create_user(username='alice', password='x')
+        self.bob = User.objects.create_user(username='bob', password='x')
+
+    def get(self, view, user=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        return view(self.factory.get('/profile/', **headers))
+
+    def check_per_user(self, view):
+        first = self.get(view, self.alice)
+        first.render()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.get(view, self.alice)['X-Cache'], 'HIT')
+
+        other = self.get(view, self.bob)
+        other.render()
+        self.assertEqual(other['X-Cache'], 'MISS')
+        self.assertIn(b'bob', other.content)
+        anonymous = self.get(view)
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertNotIn('X-Cache', anonymous)
+
+    def test_whole_view(self):
+        self.check_per_user(cache_response(timeout=60, key_prefix='profile')(JWTProfileView.as_view()))
+
+    def test_handler_method(self):
+        self.check_per_user(CachedJWTProfileView.as_view())
+
+    def test_rejected_token_is_not_cached(self):
+        view = cache_response(timeout=60, key_prefix='profile')(JWTProfileView.as_view())
+        response = view(self.factory.get('/profile/', HTTP_AUTHORIZATION='Bearer nonsense'))
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Cache', response)
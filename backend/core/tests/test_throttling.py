@@ -0,0 +1,152 @@
+import os
+import time
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+import redis
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework.response import Response
+from rest_framework.test import force_authenticate
+from rest_framework.views import APIView
+from core.throttling import (
+    BurstSustainedUserRateThrottle, DefaultRateThrottle, RateLimitHeadersMiddleware,
+    TOKEN_BUCKET_SCRIPT, TokenBucketThrottle, rate_limiter
+)
+
+User = get_user_model()
+
+
+class TwoPerMinuteThrottle(TokenBucketThrottle):
+    rates = (('test_burst', '2/minute', 'any'), ('test_sustained', '100/day', 'any'))
+
+
+class ThrottledView(APIView):
+    throttle_classes = [TwoPerMinuteThrottle]
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='alice', password='x')
+        self.view = RateLimitHeadersMiddleware(ThrottledView.as_view())
+
+    def get(self):
+        request = self.factory.get('/api/organizations/')
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_bucket_empties_then_refills(self):
+        buckets = [('burst', 2, 60)]
+        with patch('core.throttling.time.time', return_value=1000.0):
+            self.assertTrue(rate_limiter.consume('user:1', buckets)[0])
+            self.assertTrue(rate_limiter.consume('user:1', buckets)[0])
+            allowed, states = rate_limiter.consume('user:1', buckets)
+        self.assertFalse(allowed)
+        self.assertEqual(states[0].remaining, 0)
+        self.assertEqual(states[0].retry_after, 30)
+
+        with patch('core.throttling.time.time', return_value=1030.0):
+            self.assertTrue(rate_limiter.consume('user:1', buckets)[0])
+
+    def test_refused_requests_are_not_charged_to_other_buckets(self):
+        buckets = [('burst', 1, 60), ('sustained', 10, 86400)]
+        with patch('core.throttling.time.time', return_value=1000.0):
+            rate_limiter.consume('ip:10.0.0.1', buckets)
+            for _ in range(3):
+                allowed, states = rate_limiter.consume('ip:10.0.0.1', buckets)
+        self.assertFalse(allowed)
+        self.assertEqual(states[1].remaining, 9)
+
+    def test_headers_and_retry_after(self):
+        first = self.get()
+        self.assertEqual(first['RateLimit-Limit'], '2')
+        self.assertEqual(first['RateLimit-Remaining'], '1')
+        self.assertEqual(first['RateLimit-Policy'], '2;w=60, 100;w=86400')
+
+        self.get()
+        refused = self.get()
+        self.assertEqual(refused.status_code, 429)
+        self.assertEqual(refused['RateLimit-Remaining'], '0')
+        self.assertEqual(refused['Retry-After'], refused['RateLimit-Reset'])
+
+    def test_scopes_follow_authentication(self):
+        request = self.factory.get('/api/')
+        request.user = AnonymousUser()
+        self.assertEqual(
+            [scope for scope, _limit, _window in DefaultRateThrottle().get_buckets(request)],
+            ['burst_anon', 'sustained_anon']
+        )
+        request.user = self.user
+        self.assertEqual(
+            [scope for scope, _limit, _window in DefaultRateThrottle().get_buckets(request)],
+            ['burst_user', 'sustained_user']
+        )
+        self.assertEqual(len(BurstSustainedUserRateThrottle().get_buckets(request)), 2)
+
+    def test_redis_evaluates_all_buckets_in_one_script_call(self):
+        script = MagicMock(return_value=[1, 59, 0, 1000, 9999, 0, 8640])
+        with patch.object(rate_limiter, 'redis', return_value=script):
+            allowed, states = rate_limiter.consume('user:7', [('burst', 60, 60), ('sustained', 10000, 86400)])
+
+        script.assert_called_once()
+        keys = script.call_args.kwargs['keys']
+        self.assertTrue(all('{user:7}' in key for key in keys))
+        self.assertEqual(script.call_args.kwargs['args'][0], 60)
+        self.assertTrue(allowed)
+        self.assertEqual([state.remaining for state in states], [59, 9999])
+        self.assertEqual(states[0].reset, 1.0)
+
+
+class TokenBucketScriptTest(SimpleTestCase):
+    """The Lua script itself, against the Redis at REDIS_URL"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.connection = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/15'))
+        try:
+            cls.connection.ping()
+        except redis.RedisError:
+            raise unittest.SkipTest('Redis is not available')
+
+    def setUp(self):
+        self.ident = f'test:{uuid.uuid4().hex}'
+        patcher = patch.object(
+            rate_limiter, 'redis', return_value=self.connection.register_script(TOKEN_BUCKET_SCRIPT)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def consume(self, *buckets):
+        for scope, _limit, _window in buckets:
+            self.addCleanup(self.connection.delete, f'{rate_limiter.prefix}:{{{self.ident}}}:{scope}')
+        return rate_limiter.consume(self.ident, list(buckets))
+
+    def test_refused_request_charges_no_bucket(self):
+        buckets = [('burst', 2, 60), ('sustained', 100, 86400)]
+        self.assertTrue(self.consume(*buckets)[0])
+        self.assertTrue(self.consume(*buckets)[0])
+        allowed, states = self.consume(*buckets)
+
+        self.assertFalse(allowed)
+        self.assertEqual([state.remaining for state in states], [0, 98])
+        self.assertTrue(0 < states[0].retry_after <= 30)
+        key = f'{rate_limiter.prefix}:{{{self.ident}}}:burst'
+        self.assertGreater(self.connection.pttl(key), 0)
+
+    def test_tokens_refill_with_the_redis_clock(self):
+        # One token every 200ms
+        bucket = ('fast', 5, 1)
+        for _ in range(5):
+            self.assertTrue(self.consume(bucket)[0])
+        allowed, states = self.consume(bucket)
+        self.assertFalse(allowed)
+        time.sleep(states[0].retry_after + 0.05)
+        self.assertTrue(self.consume(bucket)[0])
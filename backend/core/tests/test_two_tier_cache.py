@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import time
+from unittest.mock import MagicMock, patch
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+from core.cache_backends import InstrumentedRedisCache
+from core.instrumentation import RequestMetrics, _current
+
+
+
+class TTLLocMemCache(LocMemCache):
+    """LocMemCache reporting remaining timeouts like django_redis' ttl()"""
+
+    def ttl(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        with self._lock:
+            if self._has_expired(key):
+                return 0
+            expires = self._expire_info[key]
+        return None if expires is None else math.ceil(expires - time.time())
+
+
+CACHES = {
+    'l2': {'BACKEND': 'core.tests.test_two_tier_cache.TTLLocMemCache', 'LOCATION': 'two-tier-l2'},
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'l2',
+        'OPTIONS': {
+            'CHANNEL': 'test-invalidation',
+            'L1_MAX_ENTRIES': 2,
+            'L1_TIMEOUT': 10,
+            'L1_KEY_PREFIXES': ['hot:'],
+        },
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.l2 = caches['l2']
+        self.tier = self.cache._tier
+        self.redis = MagicMock()
+        self.tier._redis = self.redis
+        # Listening is covered by handle(); no listener thread in tests
+        self.tier._pid = os.getpid()
+        self.tier.node = 'this-node'
+        self.cache.clear()
+        self.redis.reset_mock()
+
+    def delta(self, before):
+        after = self.cache.stats()
+        return {tier: {name: after[tier][name] - before[tier][name] for name in ('hits', 'misses')}
+                for tier in ('l1', 'l2')}
+
+    def test_reads_are_served_locally_after_the_first(self):
+        self.l2.set('hot:criteria', ['a', 'b'])
+        before = self.cache.stats()
+
+        self.assertEqual(self.cache.get('hot:criteria'), ['a', 'b'])
+        with patch.object(self.l2, 'get') as l2_get:
+            value = self.cache.get('hot:criteria')
+            value.append('mutated')
+            self.assertEqual(self.cache.get('hot:criteria'), ['a', 'b'])
+        l2_get.assert_not_called()
+        self.assertEqual(self.delta(before), {
+            'l1': {'hits': 2, 'misses': 1},
+            'l2': {'hits': 1, 'misses': 0},
+        })
+
+    def test_only_configured_prefixes_are_kept_locally(self):
+        self.cache.set('user:1', 'cold')
+        self.l2.set('user:1', 'changed')
+        self.assertEqual(self.cache.get('user:1'), 'changed')
+        self.redis.publish.assert_not_called()
+
+    def test_local_tier_is_bounded_and_expires(self):
+        with patch('core.cache_backends.time.monotonic', return_value=100.0):
+            for name in ('a', 'b', 'c'):
+                self.cache.set(f'hot:{name}', name)
+        self.assertEqual(len(self.tier.lru), 2)
+
+        self.l2.set('hot:c', 'changed')
+        with patch('core.cache_backends.time.monotonic', return_value=105.0):
+            self.assertEqual(self.cache.get('hot:c'), 'c')
+        with patch('core.cache_backends.time.monotonic', return_value=111.0):
+            self.assertEqual(self.cache.get('hot:c'), 'changed')
+
+    def test_local_copy_expires_with_the_shared_entry(self):
+        self.l2.set('hot:short', 'old', timeout=3)
+        self.l2.set('hot:long', 'old', timeout=None)
+        with patch('core.cache_backends.time.monotonic', return_value=100.0):
+            self.cache.get('hot:short')
+            self.cache.get_many(['hot:long'])
+        # Rewritten without an invalidation reaching this process
+        self.l2.set('hot:short', 'new', timeout=3)
+        self.l2.set('hot:long', 'new', timeout=None)
+
+        with patch('core.cache_backends.time.monotonic', return_value=102.0):
+            self.assertEqual(self.cache.get_many(['hot:short', 'hot:long']), {'hot:short': 'old', 'hot:long': 'old'})
+        with patch('core.cache_backends.time.monotonic', return_value=104.0):
+            self.assertEqual(self.cache.get_many(['hot:short', 'hot:long']), {'hot:short': 'new', 'hot:long': 'old'})
+        with patch('core.cache_backends.time.monotonic', return_value=111.0):
+            self.assertEqual(self.cache.get('hot:long'), 'new')
+
+    def test_reads_are_not_kept_locally_without_a_known_timeout(self):
+        plain_l2 = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-tier-plain'}
+        with self.settings(CACHES={**CACHES, 'l2': plain_l2}):
+            caches['l2'].set('hot:a', 1)
+            self.assertEqual(caches['default'].get('hot:a'), 1)
+            self.assertEqual(caches['default'].get_many(['hot:a']), {'hot:a': 1})
+        self.assertEqual(len(self.tier.lru), 0)
+
+    def test_invalidation_during_a_read_is_not_overwritten(self):
+        self.l2.set('hot:a', 'old')
+        read = self.l2.get
+
+        def get_then_invalidate(*args, **kwargs):
+            value = read(*args, **kwargs)
+            # Another process writes while the old value is in flight
+            self.l2.set('hot:a', 'new')
+            self.tier.handle(json.dumps({'node': 'other', 'keys': [':1:hot:a']}))
+            return value
+
+        with patch.object(self.l2, 'get', side_effect=get_then_invalidate):
+            self.assertEqual(self.cache.get('hot:a'), 'old')
+        self.assertEqual(self.cache.get('hot:a'), 'new')
+
+    def test_writes_publish_invalidations(self):
+        self.cache.set('hot:a', 1)
+        self.cache.incr('hot:a')
+        self.cache.delete_many(['hot:a', 'user:1'])
+
+        published = [json.loads(call.args[1]) for call in self.redis.publish.call_args_list]
+        self.assertEqual({call.args[0] for call in self.redis.publish.call_args_list}, {'test-invalidation'})
+        self.assertEqual([message['keys'] for message in published], [[':1:hot:a']] * 3)
+        self.assertEqual({message['node'] for message in published}, {self.tier.node})
+
+    def test_invalidations_from_other_nodes_drop_local_entries(self):
+        self.cache.set('hot:a', 1)
+        self.cache.set('hot:b', 2)
+        self.l2.set('hot:a', 10)
+        self.l2.set('hot:b', 20)
+
+        self.tier.handle(json.dumps({'node': self.tier.node, 'keys': [':1:hot:a']}))
+        self.assertEqual(self.cache.get('hot:a'), 1)
+
+        self.tier.handle(json.dumps({'node': 'other', 'keys': [':1:hot:a']}))
+        self.assertEqual(self.cache.get_many(['hot:a', 'hot:b']), {'hot:a': 10, 'hot:b': 2})
+
+        self.tier.handle(json.dumps({'node': 'other', 'keys': None}))
+        self.assertEqual(self.cache.get('hot:b'), 20)
+
+
+class InstrumentedRedisCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = InstrumentedRedisCache('redis://localhost:6379/0', {})
+        stored = {'org:1': {'name': 'Acme'}}
+        self.cache._client = MagicMock()
+        self.cache._client.get.side_effect = (
+            lambda key, default=None, version=None, client=None: stored.get(key, default)
+        )
+        self.cache._client.get_many.side_effect = (
+            lambda keys, version=None, client=None: {key: stored[key] for key in keys if key in stored}
+        )
+        self.metrics = RequestMetrics()
+        token = _current.set(self.metrics)
+        self.addCleanup(_current.reset, token)
+
+    def test_reads_are_counted_for_the_request(self):
+        self.assertEqual(self.cache.get('org:1'), {'name': 'Acme'})
+        self.assertEqual(self.cache.get('org:2', 'default'), 'default')
+        self.assertEqual(self.cache.get_many(['org:1', 'org:3']), {'org:1': {'name': 'Acme'}})
+        self.assertEqual((self.metrics.cache_hits, self.metrics.cache_misses), (2, 2))
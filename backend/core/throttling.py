@@ -1,31 +1,265 @@
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+"""
+Token-bucket throttling.
 
-class BurstAnonRateThrottle(AnonRateThrottle):
+Every scope of a throttle class is a token bucket holding up to ``num``
+tokens and refilled at ``num`` per period, so ``60/minute`` allows a burst of
+60 and then one request a second. All buckets that apply to a request are
+checked and charged in a single Lua script call against Redis, using the
+Redis clock, so the limits hold across any number of workers; a request that
+any bucket refuses is charged to none of them.
+
+Caches that are not django_redis (tests, local development) get the same
+algorithm in Python, without the atomicity.
+
+The bucket states are kept on the request, and ``RateLimitHeadersMiddleware``
+adds ``RateLimit-*`` headers for the tightest one to the response.
+"""
+import math
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+ANON = 'anon'
+USER = 'user'
+ANY = 'any'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+BucketState = namedtuple('BucketState', 'scope limit window remaining retry_after reset')
+
+# KEYS: one per bucket; ARGV: capacity and refill per millisecond per bucket.
+# Returns the decision followed by remaining, ms until a token, ms until full
+# for each bucket.
+TOKEN_BUCKET_SCRIPT = """
+-- Redis < 5 must replicate effects to write after a non-deterministic TIME
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local levels = {}
+local allowed = 1
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local refill = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1])
+    local updated = tonumber(state[2])
+    if level == nil or updated == nil then
+        level = capacity
+        updated = now
+    end
+    level = math.min(capacity, level + math.max(0, now - updated) * refill)
+    levels[i] = level
+    if level < 1 then
+        allowed = 0
+    end
+end
+local result = {allowed}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local refill = tonumber(ARGV[2 * i])
+    local level = levels[i]
+    if allowed == 1 then
+        level = level - 1
+        redis.call('HSET', KEYS[i], 'tokens', tostring(level), 'ts', tostring(now))
+        redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - level) / refill) + 1000)
+    end
+    local retry_after = 0
+    if level < 1 then
+        retry_after = math.ceil((1 - level) / refill)
+    end
+    table.insert(result, math.floor(level))
+    table.insert(result, retry_after)
+    table.insert(result, math.ceil((capacity - level) / refill))
+end
+return result
+"""
+
+
+def parse_rate(rate):
+    """``'60/minute'`` -> ``(60, 60)``"""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class TokenBucketLimiter:
+    """Checks and charges a set of buckets at once"""
+
+    def __init__(self):
+        self._scripts = {}
+
+    @property
+    def prefix(self):
+        return f"{getattr(settings, 'CACHE_KEY_PREFIX', '')}:throttle"
+
+    def redis(self):
+        """Redis client of THROTTLE_REDIS_ALIAS, or None for other caches"""
+        alias = getattr(settings, 'THROTTLE_REDIS_ALIAS', 'default')
+        if alias not in self._scripts:
+            try:
+                from django_redis import get_redis_connection
+                client = get_redis_connection(alias)
+                self._scripts[alias] = client.register_script(TOKEN_BUCKET_SCRIPT)
+            except (ImportError, NotImplementedError):
+                self._scripts[alias] = None
+        return self._scripts[alias]
+
+    def consume(self, ident, buckets):
+        """
+        Take one token from each of ``buckets`` (``(scope, limit, window)``)
+        of ``ident`` if all of them have one. Returns ``(allowed, states)``.
+        """
+        # The hash tag keeps all of a client's buckets in one cluster slot
+        keys = [f"{self.prefix}:{{{ident}}}:{scope}" for scope, _limit, _window in buckets]
+        script = self.redis()
+        if script is not None:
+            args = []
+            for _scope, limit, window in buckets:
+                args += [limit, repr(limit / (window * 1000))]
+            reply = script(keys=keys, args=args)
+            allowed, values = bool(reply[0]), reply[1:]
+        else:
+            allowed, values = self._consume_locally(keys, buckets)
+
+        states = []
+        for i, (scope, limit, window) in enumerate(buckets):
+            remaining, retry_after_ms, reset_ms = values[3 * i:3 * i + 3]
+            states.append(BucketState(
+                scope, limit, window, max(int(remaining), 0), retry_after_ms / 1000, reset_ms / 1000
+            ))
+        return allowed, states
+
+    @staticmethod
+    def _consume_locally(keys, buckets):
+        now = time.time() * 1000
+        stored = cache.get_many(keys)
+        levels = []
+        for key, (_scope, limit, window) in zip(keys, buckets):
+            refill = limit / (window * 1000)
+            level, updated = stored.get(key, (limit, now))
+            levels.append(min(limit, level + max(0, now - updated) * refill))
+        allowed = all(level >= 1 for level in levels)
+
+        values = []
+        for i, (key, (_scope, limit, window)) in enumerate(zip(keys, buckets)):
+            refill = limit / (window * 1000)
+            level = levels[i]
+            if allowed:
+                level -= 1
+                cache.set(key, (level, now), timeout=math.ceil((limit - level) / refill / 1000) + 1)
+            retry_after = math.ceil((1 - level) / refill) if level < 1 else 0
+            values += [math.floor(level), retry_after, math.ceil((limit - level) / refill)]
+        return allowed, values
+
+
+rate_limiter = TokenBucketLimiter()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle checking all of its ``rates`` in one limiter call. Each rate is
+    ``(scope, rate, applies_to)``, where ``applies_to`` is ``'anon'``
+    (by client IP), ``'user'`` (authenticated users) or ``'any'`` (users by
+    id, anonymous clients by IP).
+    """
+    rates = ()
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def get_buckets(self, request):
+        authenticated = bool(request.user and request.user.is_authenticated)
+        applicable = {ANY, USER if authenticated else ANON}
+        return [
+            (scope, *parse_rate(rate))
+            for scope, rate, applies_to in self.rates
+            if applies_to in applicable
+        ]
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request)
+        if not buckets:
+            return True
+        allowed, states = rate_limiter.consume(self.get_ident_key(request), buckets)
+        record_rate_limit(request, states)
+        if not allowed:
+            self.retry_after = max(state.retry_after for state in states)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+def record_rate_limit(request, states):
+    """Keep the bucket states on the Django request for the response headers"""
+    django_request = getattr(request, '_request', request)
+    known = getattr(django_request, 'rate_limit_states', [])
+    django_request.rate_limit_states = known + list(states)
+
+
+class RateLimitHeadersMiddleware:
+    """``RateLimit-*`` headers (IETF draft) for the tightest bucket of the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        states = getattr(request, 'rate_limit_states', None)
+        if states:
+            tightest = min(states, key=lambda state: (state.remaining, -state.reset))
+            response['RateLimit-Limit'] = str(tightest.limit)
+            response['RateLimit-Remaining'] = str(tightest.remaining)
+            response['RateLimit-Reset'] = str(math.ceil(
+                tightest.retry_after if tightest.remaining == 0 else tightest.reset
+            ))
+            response['RateLimit-Policy'] = ', '.join(
+                f'{state.limit};w={state.window}' for state in states
+            )
+        return response
+
+
+class DefaultRateThrottle(TokenBucketThrottle):
+    """Burst and sustained limits for anonymous and authenticated clients in one call"""
+    rates = (
+        ('burst_anon', '20/minute', ANON),
+        ('sustained_anon', '1000/day', ANON),
+        ('burst_user', '60/minute', USER),
+        ('sustained_user', '10000/day', USER),
+    )
+
+class BurstAnonRateThrottle(TokenBucketThrottle):
     """Throttle for anonymous users - burst rate (short time window)"""
-    rate = '20/minute'  # 20 requests per minute
-    scope = 'burst_anon'
+    rates = (('burst_anon', '20/minute', ANON),)  # 20 requests per minute
 
-class SustainedAnonRateThrottle(AnonRateThrottle):
+class SustainedAnonRateThrottle(TokenBucketThrottle):
     """Throttle for anonymous users - sustained rate (longer time window)"""
-    rate = '1000/day'  # 1000 requests per day
-    scope = 'sustained_anon'
+    rates = (('sustained_anon', '1000/day', ANON),)  # 1000 requests per day
 
-class BurstUserRateThrottle(UserRateThrottle):
+class BurstUserRateThrottle(TokenBucketThrottle):
     """Throttle for authenticated users - burst rate (short time window)"""
-    rate = '60/minute'  # 60 requests per minute
-    scope = 'burst_user'
+    rates = (('burst_user', '60/minute', ANY),)  # 60 requests per minute
 
-class SustainedUserRateThrottle(UserRateThrottle):
+class SustainedUserRateThrottle(TokenBucketThrottle):
     """Throttle for authenticated users - sustained rate (longer time window)"""
-    rate = '10000/day'  # 10000 requests per day
-    scope = 'sustained_user'
+    rates = (('sustained_user', '10000/day', ANY),)  # 10000 requests per day
+
+class BurstSustainedUserRateThrottle(TokenBucketThrottle):
+    """Burst and sustained rates for authenticated users in one call"""
+    rates = BurstUserRateThrottle.rates + SustainedUserRateThrottle.rates
 
-class HighBurstUserRateThrottle(UserRateThrottle):
+class HighBurstUserRateThrottle(TokenBucketThrottle):
     """Throttle for special endpoints that need higher burst rates"""
-    rate = '200/minute'  # 200 requests per minute
-    scope = 'high_burst_user'
+    rates = (('high_burst_user', '200/minute', ANY),)  # 200 requests per minute
 
-class CriticalEndpointRateThrottle(UserRateThrottle):
+class CriticalEndpointRateThrottle(TokenBucketThrottle):
     """Throttle for critical endpoints that need extra protection"""
-    rate = '3/minute'  # 3 requests per minute
-    scope = 'critical_endpoint' 
\ No newline at end of file
+    rates = (('critical_endpoint', '3/minute', ANY),)  # 3 requests per minute
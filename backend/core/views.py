@@ -1,6 +1,12 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from core.instrumentation import SlowRequestLog
+from core.metrics import registry
 
 @api_view(['GET'])
 def api_root(request):
@@ -15,4 +21,34 @@ def health_check(request):
     return Response({
         'status': 'healthy',
         'user': request.user.username
-    }) 
\ No newline at end of file
+    }) 
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def slow_requests(request):
+    """Slowest recent requests with their queries; DELETE clears the log"""
+    if request.method == 'DELETE':
+        SlowRequestLog.clear()
+        return Response(status=204)
+    return Response({
+        'threshold_ms': SlowRequestLog.threshold(),
+        'results': SlowRequestLog.entries(),
+    })
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Open to METRICS_ALLOWED_IPS, or to any client
+    sending ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = request.META.get('REMOTE_ADDR') in getattr(
+        settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')
+    )
+    if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+        allowed = True
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
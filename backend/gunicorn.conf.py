@@ -0,0 +1,16 @@
+import os
+import shutil
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # Metric files of a previous run would be added to this one's
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
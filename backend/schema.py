@@ -0,0 +1,2 @@
+"""Top-level import path for the project GraphQL schema"""
+from core.schema import schema  # noqa: F401
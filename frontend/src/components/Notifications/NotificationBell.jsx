@@ -30,9 +30,14 @@ const NotificationBell = () => {
 
   const fetchNotifications = async () => {
     try {
-      const response = await api.get('/api/notifications/');
-      setNotifications(response.data);
-      setUnreadCount(response.data.filter(n => !n.is_read).length);
+      // The feed is paginated (newest page first); the unread total comes
+      // from its own endpoint
+      const [response, unread] = await Promise.all([
+        api.get('/api/notifications/'),
+        api.get('/api/notifications/unread_count/')
+      ]);
+      setNotifications(response.data.results);
+      setUnreadCount(unread.data.count);
     } catch (error) {
       console.error('Error fetching notifications:', error);
     }